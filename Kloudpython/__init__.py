@@ -17,26 +17,144 @@ def create_app():
     app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
     app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_USERNAME')
 
+    # SMTP connection pool (intervals in seconds)
+    app.config['SMTP_POOL_SIZE'] = int(os.getenv('SMTP_POOL_SIZE', 2))
+    app.config['SMTP_MAX_MESSAGES_PER_CONNECTION'] = int(os.getenv('SMTP_MAX_MESSAGES_PER_CONNECTION', 100))
+    app.config['SMTP_KEEPALIVE_INTERVAL'] = int(os.getenv('SMTP_KEEPALIVE_INTERVAL', 30))
+    app.config['SMTP_MAX_IDLE'] = int(os.getenv('SMTP_MAX_IDLE', 300))
+
+    # Static files: max-age of versioned URLs (.gz/.br siblings come from flask build-static-assets)
+    app.config['STATIC_IMMUTABLE_MAX_AGE'] = int(os.getenv('STATIC_IMMUTABLE_MAX_AGE', 31536000))
+
+    # MongoDB client (timeouts in milliseconds; 0 or unset keeps the driver default)
+    app.config['MONGO_APP_NAME'] = os.getenv('MONGO_APP_NAME', 'kloudcart')
+    app.config['MONGO_MAX_POOL_SIZE'] = int(os.getenv('MONGO_MAX_POOL_SIZE', 50))
+    app.config['MONGO_MIN_POOL_SIZE'] = int(os.getenv('MONGO_MIN_POOL_SIZE', 0))
+    app.config['MONGO_MAX_IDLE_TIME_MS'] = int(os.getenv('MONGO_MAX_IDLE_TIME_MS', 300000)) or None
+    app.config['MONGO_CONNECT_TIMEOUT_MS'] = int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', 5000)) or None
+    app.config['MONGO_SERVER_SELECTION_TIMEOUT_MS'] = int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000)) or None
+    app.config['MONGO_SOCKET_TIMEOUT_MS'] = int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', 0)) or None
+    app.config['MONGO_WAIT_QUEUE_TIMEOUT_MS'] = int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', 0)) or None
+    # Wire compression, e.g. "zstd,snappy,zlib" (zstd/snappy need extra packages)
+    app.config['MONGO_COMPRESSORS'] = os.getenv('MONGO_COMPRESSORS', '') or None
+
+    # Development query profiler: per-request MongoDB command counts, N+1 and
+    # slow-command warnings, per-route budgets (utils/query_profiler.py)
+    app.config['QUERY_PROFILER_ENABLED'] = os.getenv('QUERY_PROFILER_ENABLED', 'False').lower() in ['true', '1', 'yes']
+    app.config['QUERY_PROFILER_SLOW_MS'] = float(os.getenv('QUERY_PROFILER_SLOW_MS', 100))
+    app.config['QUERY_PROFILER_REPEAT_THRESHOLD'] = int(os.getenv('QUERY_PROFILER_REPEAT_THRESHOLD', 3))
+    # Fail requests over their query budget instead of logging a warning (for tests)
+    app.config['QUERY_BUDGET_STRICT'] = os.getenv('QUERY_BUDGET_STRICT', 'False').lower() in ['true', '1', 'yes']
+
+    # Create the declared MongoDB indexes at startup
+    app.config['MONGO_ENSURE_INDEXES'] = os.getenv('MONGO_ENSURE_INDEXES', 'True').lower() in ['true', '1', 'yes']
+
+    # Catalog cache configuration (ages and intervals in seconds)
+    app.config['CATALOG_CACHE_MAX_AGE'] = int(os.getenv('CATALOG_CACHE_MAX_AGE', 300))
+    app.config['CATALOG_VERSION_CHECK_INTERVAL'] = float(os.getenv('CATALOG_VERSION_CHECK_INTERVAL', 1))
+    app.config['CATALOG_CACHE_MAX_ENTRIES'] = int(os.getenv('CATALOG_CACHE_MAX_ENTRIES', 256))
+    app.config['CATALOG_CACHE_WARM'] = os.getenv('CATALOG_CACHE_WARM', 'True').lower() in ['true', '1', 'yes']
+
+    # Product grid pagination
+    app.config['PRODUCTS_PAGE_SIZE'] = int(os.getenv('PRODUCTS_PAGE_SIZE', 24))
+    app.config['PRODUCTS_MAX_PAGE_SIZE'] = int(os.getenv('PRODUCTS_MAX_PAGE_SIZE', 100))
+
+    # Product search: "text" (MongoDB text index), "memory" (in-process index) or "auto"
+    app.config['PRODUCT_SEARCH_BACKEND'] = os.getenv('PRODUCT_SEARCH_BACKEND', 'auto')
+    app.config['PRODUCT_SEARCH_MAX_RESULTS'] = int(os.getenv('PRODUCT_SEARCH_MAX_RESULTS', 1000))
+    app.config['PRODUCT_SEARCH_TEXT_RETRY_SECONDS'] = float(os.getenv('PRODUCT_SEARCH_TEXT_RETRY_SECONDS', 300))
+
+    # Admin product import/export: products per bulk_write (import) and per page (export)
+    app.config['PRODUCT_IMPORT_BATCH_SIZE'] = int(os.getenv('PRODUCT_IMPORT_BATCH_SIZE', 1000))
+
+    # Cart storage: "lines" (document per cart line) or "embedded" (document per user)
+    app.config['CART_STORAGE'] = os.getenv('CART_STORAGE', 'lines')
+    app.config['CART_MIGRATION_FALLBACK'] = os.getenv('CART_MIGRATION_FALLBACK', 'True').lower() in ['true', '1', 'yes']
+
+    # Background job queue (receipt PDF rendering and email, image derivatives)
+    app.config['RECEIPT_QUEUE_ENABLED'] = os.getenv('RECEIPT_QUEUE_ENABLED', 'True').lower() in ['true', '1', 'yes']
+    app.config['IMAGE_QUEUE_ENABLED'] = os.getenv('IMAGE_QUEUE_ENABLED', 'True').lower() in ['true', '1', 'yes']
+    app.config['JOB_POLL_INTERVAL'] = float(os.getenv('JOB_POLL_INTERVAL', 1))
+    app.config['JOB_LOCK_TIMEOUT'] = int(os.getenv('JOB_LOCK_TIMEOUT', 300))
+    app.config['JOB_MAX_ATTEMPTS'] = int(os.getenv('JOB_MAX_ATTEMPTS', 5))
+    app.config['JOB_RETRY_BASE_DELAY'] = int(os.getenv('JOB_RETRY_BASE_DELAY', 5))
+    # Port the job worker serves its Prometheus metrics on (0 disables)
+    app.config['WORKER_METRICS_PORT'] = int(os.getenv('WORKER_METRICS_PORT', 0))
+
+    # Admin receipt log pagination
+    app.config['RECEIPTS_PAGE_SIZE'] = int(os.getenv('RECEIPTS_PAGE_SIZE', 50))
+    app.config['RECEIPTS_MAX_PAGE_SIZE'] = int(os.getenv('RECEIPTS_MAX_PAGE_SIZE', 200))
+    # Receipts per cursor batch (and per streamed chunk) in the CSV/JSONL export
+    app.config['RECEIPTS_EXPORT_BATCH_SIZE'] = int(os.getenv('RECEIPTS_EXPORT_BATCH_SIZE', 1000))
+
+    # Receipt PDF store and archives; never under static/, which anyone can fetch
+    app.config['RECEIPT_STORE_DIR'] = os.getenv('RECEIPT_STORE_DIR') or os.path.join(app.instance_path, 'receipts')
+
+    # Receipt PDF archiving (flask compact-receipts)
+    app.config['RECEIPT_ARCHIVE_AFTER_DAYS'] = int(os.getenv('RECEIPT_ARCHIVE_AFTER_DAYS', 30))
+    app.config['RECEIPT_ARCHIVE_MAX_PACK_MB'] = int(os.getenv('RECEIPT_ARCHIVE_MAX_PACK_MB', 256))
+    # Delete archived receipts older than this many days (0 keeps them forever)
+    app.config['RECEIPT_RETENTION_DAYS'] = int(os.getenv('RECEIPT_RETENTION_DAYS', 0))
+
     # Initialize Flask-Mail
     mail = Mail(app)
 
-    # Initialize MongoDB connection
-    from .db import db
-    try:
-        db.connect()
-        print("MongoDB connection initialized successfully!")
-    except Exception as e:
-        print(f"Failed to initialize MongoDB connection: {e}")
+    # Configure the MongoDB client; it connects on first use in each process
+    from .db import db, ensure_indexes
+    db.configure(
+        appname=app.config['MONGO_APP_NAME'],
+        maxPoolSize=app.config['MONGO_MAX_POOL_SIZE'],
+        minPoolSize=app.config['MONGO_MIN_POOL_SIZE'],
+        maxIdleTimeMS=app.config['MONGO_MAX_IDLE_TIME_MS'],
+        connectTimeoutMS=app.config['MONGO_CONNECT_TIMEOUT_MS'],
+        serverSelectionTimeoutMS=app.config['MONGO_SERVER_SELECTION_TIMEOUT_MS'],
+        socketTimeoutMS=app.config['MONGO_SOCKET_TIMEOUT_MS'],
+        waitQueueTimeoutMS=app.config['MONGO_WAIT_QUEUE_TIMEOUT_MS'],
+        compressors=app.config['MONGO_COMPRESSORS']
+    )
+    if app.config['QUERY_PROFILER_ENABLED']:
+        from .utils.query_profiler import init_query_profiler
+        init_query_profiler(app)
+    if app.config['MONGO_ENSURE_INDEXES']:
+        try:
+            if not ensure_indexes():
+                print("MongoDB indexes are in place")
+        except Exception as e:
+            print(f"Failed to ensure MongoDB indexes: {e}")
 
     # Import blueprints
     from .routes.auth import auth
     from .routes.products import products
     from .routes.admin import admin
+    from .routes.health import health
     
     # Register blueprints
     app.register_blueprint(auth)
     app.register_blueprint(products)
     app.register_blueprint(admin)
+    app.register_blueprint(health)
+
+    # Request latency and status metrics, exported on /metrics
+    from .utils.metrics import init_request_metrics
+    init_request_metrics(app)
+
+    # Fingerprint static files, serve them (and their precompressed siblings) with long-lived caching
+    from .utils.static_assets import init_static_assets
+    init_static_assets(app)
+
+    # Register CLI commands
+    from .commands import register_commands
+    register_commands(app)
+
+    # Warm the product catalog cache for this worker
+    if app.config['CATALOG_CACHE_WARM']:
+        from .utils.catalog_cache import catalog_cache
+        try:
+            with app.app_context():
+                count = catalog_cache.warm(app.config['PRODUCTS_PAGE_SIZE'])
+            print(f"Catalog cache warmed with {count} products")
+        except Exception as e:
+            print(f"Failed to warm catalog cache: {e}")
     
     return app
 
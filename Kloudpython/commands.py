@@ -0,0 +1,147 @@
+import click
+import sys
+
+
+def register_commands(app):
+    """Register the KloudCart maintenance commands with the Flask CLI"""
+
+    @app.cli.command("ensure-indexes")
+    def ensure_indexes_command():
+        """Create the MongoDB indexes declared in db.INDEXES."""
+        from .db import ensure_indexes
+
+        errors = ensure_indexes()
+        if errors:
+            sys.exit(1)
+        click.echo("All indexes are in place.")
+
+    @app.cli.command("check-query-plans")
+    def check_query_plans_command():
+        """Fail if any route query shape is answered by a COLLSCAN."""
+        from .db import check_query_plans
+
+        failed = 0
+        for collection_name, query, sort, stages, ok in check_query_plans():
+            status = "ok  " if ok else "FAIL"
+            click.echo(f"{status} {collection_name} {query} sort={sort} -> {' > '.join(stages)}")
+            if not ok:
+                failed += 1
+
+        if failed:
+            click.echo(f"{failed} query shape(s) fall back to a collection scan.")
+            sys.exit(1)
+        click.echo("All query shapes use an index.")
+
+    @app.cli.command("migrate-carts")
+    @click.option("--batch-size", default=500, show_default=True, help="Users fetched per cursor batch.")
+    def migrate_carts_command(batch_size):
+        """Move line-per-document carts into the embedded carts layout."""
+        from .utils.cart_ops import migrate_line_carts
+
+        users = lines = 0
+        for _, migrated in migrate_line_carts(batch_size):
+            users += 1
+            lines += migrated
+            if users % 1000 == 0:
+                click.echo(f"{users} carts migrated...")
+        click.echo(f"Migrated {lines} cart lines for {users} users.")
+
+    @app.cli.command("rebuild-sales-rollups")
+    @click.option("--batch-size", default=1000, show_default=True, help="Receipts fetched per cursor batch.")
+    def rebuild_sales_rollups_command(batch_size):
+        """Recompute the sales rollups behind /admin/analytics from the receipts."""
+        from .utils.sales_rollups import rebuild_sales_rollups
+
+        processed = rebuild_sales_rollups(batch_size)
+        click.echo(f"Rebuilt sales rollups from {processed} receipts.")
+
+    @app.cli.command("backfill-image-derivatives")
+    @click.option("--force", is_flag=True, help="Regenerate products that already have derivatives.")
+    def backfill_image_derivatives_command(force):
+        """Generate resized WebP/JPEG copies of existing product images in static/uploads."""
+        from .utils.catalog_cache import bump_catalog_version
+        from .utils.image_derivatives import backfill_image_derivatives
+
+        processed = skipped = 0
+        for _, image_url, updated in backfill_image_derivatives(force):
+            if updated:
+                processed += 1
+            else:
+                skipped += 1
+                click.echo(f"Skipped {image_url} (missing file or image changed)")
+        if processed:
+            bump_catalog_version()
+        click.echo(f"Generated derivatives for {processed} products, skipped {skipped}.")
+
+    @app.cli.command("import-products")
+    @click.argument("source", type=click.File("rb"))
+    @click.option("--format", "file_format", type=click.Choice(["csv", "jsonl"]), help="File format (default: from the file extension).")
+    @click.option("--batch-size", type=int, help="Products per bulk write (default PRODUCT_IMPORT_BATCH_SIZE).")
+    def import_products_command(source, file_format, batch_size):
+        """Create or update products from a CSV or JSONL file (- reads stdin)."""
+        from .utils.product_io import import_products, detect_format
+
+        summary = import_products(
+            source,
+            file_format or detect_format(source.name),
+            batch_size=batch_size or app.config['PRODUCT_IMPORT_BATCH_SIZE'],
+            max_errors=1000
+        )
+        for line_number, message in summary["errors"]:
+            click.echo(f"line {line_number}: {message}", err=True)
+        click.echo(f"{summary['rows']} rows: {summary['created']} created, {summary['updated']} updated, "
+                   f"{summary['error_count']} errors.")
+        if summary["error_count"]:
+            sys.exit(1)
+
+    @app.cli.command("export-products")
+    @click.argument("destination", type=click.File("w", encoding="utf-8"))
+    @click.option("--format", "file_format", type=click.Choice(["csv", "jsonl"]), default="csv", show_default=True)
+    def export_products_command(destination, file_format):
+        """Write the catalog as CSV or JSONL, readable by import-products."""
+        from .utils.product_io import export_products
+
+        for chunk in export_products(file_format, batch_size=app.config['PRODUCT_IMPORT_BATCH_SIZE']):
+            destination.write(chunk)
+
+    @app.cli.command("build-static-assets")
+    def build_static_assets_command():
+        """Hash the static files and write their gzip/brotli siblings."""
+        from .utils.static_assets import build_asset_manifest, brotli
+
+        manifest = build_asset_manifest(app.static_folder, compress=True)
+        for filename, version in sorted(manifest.items()):
+            click.echo(f"{version}  {filename}")
+        if brotli is None:
+            click.echo("brotli is not installed - only gzip siblings were written.")
+        click.echo(f"{len(manifest)} static files fingerprinted.")
+
+    @app.cli.command("compact-receipts")
+    @click.option("--older-than-days", type=int, help="Archive receipts of orders older than this (default RECEIPT_ARCHIVE_AFTER_DAYS).")
+    @click.option("--batch-size", default=1000, show_default=True, help="Orders fetched per cursor batch.")
+    def compact_receipts_command(older_than_days, batch_size):
+        """Pack old receipt PDFs into indexed archives and apply the retention policy."""
+        from .utils.receipt_archive import compact_receipts, apply_receipt_retention, sweep_legacy_receipts
+
+        if older_than_days is None:
+            older_than_days = app.config['RECEIPT_ARCHIVE_AFTER_DAYS']
+        summary = compact_receipts(
+            older_than_days,
+            max_pack_bytes=app.config['RECEIPT_ARCHIVE_MAX_PACK_MB'] * 1024 * 1024,
+            batch_size=batch_size
+        )
+        if summary["migrated"]:
+            click.echo(f"Moved {summary['migrated']} legacy receipts out of static/receipts.")
+        for name in summary["archives"]:
+            click.echo(f"Wrote archive {name}")
+        click.echo(f"Archived {summary['archived']} receipts, deleted {summary['deleted']} loose PDFs.")
+
+        retention_days = app.config['RECEIPT_RETENTION_DAYS']
+        if retention_days:
+            expired = apply_receipt_retention(retention_days)
+            for name in expired:
+                click.echo(f"Deleted expired archive {name}")
+            click.echo(f"{len(expired)} archives past the {retention_days}-day retention deleted.")
+            legacy = sweep_legacy_receipts(retention_days)
+            if legacy:
+                click.echo(f"{legacy} legacy receipts past the retention deleted.")
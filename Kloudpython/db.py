@@ -1,30 +1,107 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, IndexModel, ASCENDING, DESCENDING, TEXT, monitoring
+from pymongo.errors import ConnectionFailure
 from bson import ObjectId
+from datetime import datetime
 import os
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Imported after load_dotenv: PROMETHEUS_MULTIPROC_DIR may be set in .env
+from .utils.metrics import MONGO_COMMAND_SECONDS, MONGO_COMMAND_FAILURES
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """
+    Record the count and duration of every MongoDB command per collection
+
+    The collection is only named in the started event, so it is remembered
+    until the command's succeeded or failed event arrives.
+    """
+
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            target = event.command.get("collection")
+        self._collections[(event.connection_id, event.request_id)] = target if isinstance(target, str) else "none"
+
+    def _collection(self, event):
+        return self._collections.pop((event.connection_id, event.request_id), "none")
+
+    def succeeded(self, event):
+        MONGO_COMMAND_SECONDS.labels(event.command_name, self._collection(event)).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        collection = self._collection(event)
+        MONGO_COMMAND_SECONDS.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+        MONGO_COMMAND_FAILURES.labels(event.command_name, collection).inc()
+
+
+command_metrics = CommandMetrics()
+
 class MongoDB:
+    """
+    Process-wide MongoDB client, created on first use.
+
+    The client is never shared across a fork: if the process id changed
+    since it was created (e.g. a gunicorn worker forked from a preloaded
+    master), a new client and connection pool are built for this process.
+    The inherited client is dropped without closing it, as its sockets
+    still belong to the parent.
+    """
+
     def __init__(self):
-        self.client = None
-        self.db = None
-        self.connect()
-    
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.database_name = "kloudcart"
+        self.client_options = {"appname": "kloudcart", "event_listeners": [command_metrics]}
+
+    def configure(self, **client_options):
+        """
+        Set MongoClient options (pool size, timeouts, compressors, appname)
+
+        Takes effect for clients created afterwards; call before first use.
+        """
+        self.client_options = dict(self.client_options, **{
+            key: value for key, value in client_options.items() if value is not None
+        })
+
+    def add_listener(self, listener):
+        """
+        Attach a pymongo event listener (e.g. a CommandListener)
+
+        Takes effect for clients created afterwards; call before first use.
+        """
+        self.client_options["event_listeners"] = self.client_options.get("event_listeners", []) + [listener]
+
+    @property
+    def client(self):
+        """The MongoClient of the current process"""
+        if self._client is None or self._pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._pid != os.getpid():
+                    mongo_uri = os.getenv("MONGO_URI")
+                    if not mongo_uri:
+                        raise ValueError("MONGO_URI environment variable is required")
+                    # Connecting happens in the background; the first operation waits for it
+                    self._client = MongoClient(mongo_uri, **self.client_options)
+                    self._pid = os.getpid()
+        return self._client
+
+    @property
+    def db(self):
+        return self.client[self.database_name]
+
     def connect(self):
-        """Connect to MongoDB Atlas"""
+        """Connect to MongoDB Atlas and check the connection with a ping"""
         try:
-            mongo_uri = os.getenv("MONGO_URI")
-            if not mongo_uri:
-                raise ValueError("MONGO_URI environment variable is required")
-            
-            self.client = MongoClient(mongo_uri)
-            self.db = self.client.kloudcart
-            
-            # Test the connection
             self.client.admin.command('ping')
             print("Successfully connected to MongoDB Atlas!")
-            
         except Exception as e:
             print(f"Error connecting to MongoDB: {e}")
             raise
@@ -34,11 +111,14 @@ class MongoDB:
         return self.db[collection_name]
     
     def close(self):
-        """Close the MongoDB connection"""
-        if self.client:
-            self.client.close()
+        """Close the MongoDB connection of this process"""
+        with self._lock:
+            if self._client is not None and self._pid == os.getpid():
+                self._client.close()
+            self._client = None
+            self._pid = None
 
-# Global database instance
+# Global database instance (connects lazily)
 db = MongoDB()
 
 # Helper functions for ObjectId handling
@@ -63,5 +143,195 @@ def get_products_collection():
 def get_cart_collection():
     return db.get_collection("cart")
 
+def get_carts_collection():
+    return db.get_collection("carts")
+
 def get_receipts_collection():
-    return db.get_collection("receipts")
\ No newline at end of file
+    return db.get_collection("receipts")
+
+def get_meta_collection():
+    return db.get_collection("meta")
+
+def get_jobs_collection():
+    return db.get_collection("jobs")
+
+def get_orders_collection():
+    return db.get_collection("orders")
+
+def get_sales_daily_collection():
+    return db.get_collection("sales_daily")
+
+def get_sales_by_category_collection():
+    return db.get_collection("sales_by_category")
+
+def get_sales_by_product_collection():
+    return db.get_collection("sales_by_product")
+
+
+# Seconds a finished job is kept before MongoDB's TTL monitor deletes it.
+# Only done jobs expire; failed ones stay for inspection.
+DONE_JOB_RETENTION_SECONDS = 7 * 24 * 3600
+
+# Index registry: collection -> indexes every query shape below relies on
+INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], unique=True, name="email_unique")
+    ],
+    "cart": [
+        IndexModel([("user_email", ASCENDING), ("product_id", ASCENDING)], unique=True, name="user_product_unique")
+    ],
+    "products": [
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at_id"),
+        IndexModel([("price", ASCENDING), ("_id", ASCENDING)], name="price_id"),
+        IndexModel([("category", ASCENDING), ("_id", ASCENDING)], name="category_id"),
+        # Live stock of the stock-tracked products (inventory.stock_levels)
+        IndexModel([("stock", ASCENDING)], partialFilterExpression={"stock": {"$exists": True}}, name="stock_tracked"),
+        IndexModel([("category", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="category_created_at_id"),
+        IndexModel([("category", ASCENDING), ("price", ASCENDING), ("_id", ASCENDING)], name="category_price_id"),
+        # Relevance-ranked search (weights match product_search.FIELD_WEIGHTS)
+        IndexModel(
+            [("name", TEXT), ("category", TEXT), ("description", TEXT)],
+            weights={"name": 10, "category": 5, "description": 1},
+            default_language="english",
+            name="product_text"
+        )
+    ],
+    "receipts": [
+        IndexModel([("timestamp", DESCENDING)], name="timestamp_desc"),
+        IndexModel([("user_email", ASCENDING), ("timestamp", DESCENDING)], name="user_email_timestamp"),
+        IndexModel([("email_status", ASCENDING), ("timestamp", DESCENDING)], name="email_status_timestamp")
+    ],
+    "orders": [
+        # Receipt compaction (receipt_archive.compact_receipts)
+        IndexModel([("receipt_archive", ASCENDING), ("created_at", ASCENDING)], name="receipt_archive_created_at"),
+        IndexModel([("receipt_sha256", ASCENDING)], name="receipt_sha256")
+    ],
+    "jobs": [
+        IndexModel([("status", ASCENDING), ("run_at", ASCENDING)], name="status_run_at"),
+        IndexModel([("status", ASCENDING), ("locked_at", ASCENDING)], name="status_locked_at"),
+        IndexModel(
+            [("finished_at", ASCENDING)],
+            expireAfterSeconds=DONE_JOB_RETENTION_SECONDS,
+            partialFilterExpression={"status": "done"},
+            name="done_finished_at_ttl"
+        )
+    ],
+    "sales_by_category": [
+        IndexModel([("revenue", DESCENDING)], name="revenue_desc")
+    ],
+    "sales_by_product": [
+        IndexModel([("units", DESCENDING)], name="units_desc")
+    ]
+}
+
+# Query shapes issued by the routes: (collection, filter, sort)
+# Each one must be answered from an index, never a COLLSCAN. Filters include
+# those of updates and deletes. benchmarks/query_budget_check.py fails on any
+# filter the routes issue that is missing here.
+_probe_id = ObjectId()
+QUERY_SHAPES = [
+    ("users", {"email": "probe@example.com"}, None),
+    ("cart", {"user_email": "probe@example.com"}, None),
+    ("cart", {"user_email": "probe@example.com", "product_id": _probe_id}, None),
+    ("cart", {"user_email": "probe@example.com", "product_id": _probe_id, "quantity": {"$gt": 1}}, None),
+    ("cart", {"user_email": "probe@example.com", "product_id": _probe_id, "quantity": {"$lte": 1}}, None),
+    ("carts", {"_id": "probe@example.com"}, None),
+    ("carts", {"_id": "probe@example.com", "migrated": True}, None),
+    ("carts", {"_id": "probe@example.com", "items.product_id": _probe_id}, None),
+    ("carts", {"_id": "probe@example.com", "items.product_id": {"$ne": _probe_id}}, None),
+    ("carts", {"_id": "probe@example.com", "items.product_id": {"$ne": _probe_id}, "migrated": True}, None),
+    ("carts", {"_id": "probe@example.com", "items": {"$elemMatch": {"product_id": _probe_id, "quantity": {"$gt": 1}}}}, None),
+    ("carts", {"_id": "probe@example.com", "items": {"$elemMatch": {"product_id": _probe_id, "quantity": {"$lte": 1}}}}, None),
+    ("products", {"_id": _probe_id}, None),
+    ("products", {"_id": {"$gt": _probe_id}}, [("_id", ASCENDING)]),
+    ("products", {"stock": {"$exists": True}}, None),
+    ("products", {"_id": _probe_id, "stock": {"$gte": 1}}, None),
+    ("products", {"_id": _probe_id, "stock": 0, "sold_out": {"$ne": True}}, None),
+    ("products", {"_id": _probe_id, "stock": {"$exists": True}}, None),
+    ("products", {"_id": {"$in": [_probe_id]}, "sold_out": True, "stock": {"$gt": 0}}, None),
+    ("products", {}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ("products", {"$or": [{"price": {"$gt": 10}}, {"price": 10, "_id": {"$gt": _probe_id}}]}, [("price", ASCENDING), ("_id", ASCENDING)]),
+    ("products", {"$or": [{"price": {"$lt": 10}}, {"price": 10, "_id": {"$lt": _probe_id}}]}, [("price", DESCENDING), ("_id", DESCENDING)]),
+    ("products", {"category": "probe"}, [("_id", ASCENDING)]),
+    ("products", {"category": "probe"}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ("products", {"$and": [{"category": "probe"}, {"$or": [{"price": {"$gt": 10}}, {"price": 10, "_id": {"$gt": _probe_id}}]}]}, [("price", ASCENDING), ("_id", ASCENDING)]),
+    ("products", {"$text": {"$search": "probe"}, "category": "probe"}, [("score", {"$meta": "textScore"})]),
+    ("receipts", {"_id": _probe_id}, None),
+    ("receipts", {}, [("timestamp", DESCENDING)]),
+    ("receipts", {"user_email": "probe@example.com"}, [("timestamp", DESCENDING), ("_id", DESCENDING)]),
+    ("receipts", {"email_status": "failed", "timestamp": {"$gte": datetime(2025, 1, 1)}}, [("timestamp", DESCENDING), ("_id", DESCENDING)]),
+    ("receipts", {"timestamp": {"$gte": datetime(2025, 1, 1), "$lt": datetime(2025, 2, 1)}}, [("timestamp", ASCENDING)]),
+    ("orders", {"_id": "probe"}, None),
+    ("orders", {"_id": "probe", "user_email": "probe@example.com"}, None),
+    ("orders", {"receipt_archive": None, "created_at": {"$lt": datetime(2025, 1, 1)}, "receipt_sha256": {"$type": "string"}}, [("created_at", ASCENDING)]),
+    ("orders", {"receipt_sha256": {"$in": ["probe"]}, "receipt_archive": None}, None),
+    ("orders", {"receipt_archive": "probe"}, None),
+    ("meta", {"_id": "catalog"}, None),
+    ("jobs", {"$or": [
+        {"status": "queued", "run_at": {"$lte": datetime.utcnow()}},
+        {"status": "running", "locked_at": {"$lt": datetime.utcnow()}}
+    ]}, [("run_at", ASCENDING)]),
+    ("jobs", {"_id": _probe_id}, None),
+    ("sales_daily", {"_id": "2025-01-01"}, None),
+    ("sales_daily", {}, [("_id", DESCENDING)]),
+    ("sales_by_category", {"_id": "probe"}, None),
+    ("sales_by_category", {}, [("revenue", DESCENDING)]),
+    ("sales_by_product", {"_id": "probe"}, None),
+    ("sales_by_product", {}, [("units", DESCENDING)])
+]
+
+
+def ensure_indexes():
+    """
+    Create every index in the registry (no-op for existing ones)
+
+    Returns:
+        list: (collection, error) for each collection whose indexes could
+            not be created, e.g. because existing data violates a unique index
+
+    Raises:
+        ConnectionFailure: If MongoDB is unreachable (not retried per collection)
+    """
+    errors = []
+    for collection_name, indexes in INDEXES.items():
+        try:
+            db.get_collection(collection_name).create_indexes(indexes)
+        except ConnectionFailure:
+            raise
+        except Exception as e:
+            print(f"Failed to create indexes on {collection_name}: {e}")
+            errors.append((collection_name, str(e)))
+    return errors
+
+
+def _plan_stages(plan):
+    """Collect every stage name in an explain() plan tree"""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(_plan_stages(value))
+    return stages
+
+
+def check_query_plans():
+    """
+    Run explain() on every registered query shape
+
+    Returns:
+        list: (collection, filter, sort, stages, ok) per shape, where ok is
+            False if the winning plan contains a COLLSCAN
+    """
+    results = []
+    for collection_name, query, sort in QUERY_SHAPES:
+        cursor = db.get_collection(collection_name).find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        winning_plan = cursor.explain().get("queryPlanner", {}).get("winningPlan", {})
+        stages = _plan_stages(winning_plan)
+        results.append((collection_name, query, sort, stages, "COLLSCAN" not in stages))
+    return results
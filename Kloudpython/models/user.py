@@ -25,18 +25,20 @@ class User:
         return user
 
 class Product:
-    def __init__(self, name, price, category="", description="", image_url="", _id=None):
+    def __init__(self, name, price, category="", description="", image_url="", _id=None, stock=None):
         self._id = _id or ObjectId()
         self.name = name
         self.price = price
         self.category = category
         self.description = description
         self.image_url = image_url
+        # Units available; None means stock is not tracked (unlimited)
+        self.stock = stock
         self.created_at = datetime.utcnow()
     
     def to_dict(self):
         """Convert product to dictionary for MongoDB storage"""
-        return {
+        product = {
             "_id": self._id,
             "name": self.name,
             "price": self.price,
@@ -45,6 +47,9 @@ class Product:
             "image_url": self.image_url,
             "created_at": self.created_at
         }
+        if self.stock is not None:
+            product["stock"] = self.stock
+        return product
     
     @classmethod
     def from_dict(cls, data):
@@ -55,7 +60,8 @@ class Product:
             data.get("category", ""),
             data.get("description", ""),
             data.get("image_url", ""),
-            data["_id"]
+            data["_id"],
+            data.get("stock")
         )
         product.created_at = data.get("created_at", datetime.utcnow())
         return product
@@ -82,3 +88,47 @@ class CartItem:
         cart_item = cls(data["user_email"], data["product_id"], data["quantity"])
         cart_item.updated_at = data.get("updated_at", datetime.utcnow())
         return cart_item
+
+class Order:
+    def __init__(self, order_id, user_email, items, total, current_date):
+        self.order_id = order_id
+        self.user_email = user_email
+        self.items = items
+        self.total = total
+        self.current_date = current_date
+        self.created_at = datetime.utcnow()
+        self.receipt_sha256 = None
+        # Name of the archive the receipt was packed into (see receipt_archive)
+        self.receipt_archive = None
+    
+    def to_dict(self):
+        """Convert order to dictionary for MongoDB storage"""
+        return {
+            "_id": self.order_id,
+            "user_email": self.user_email,
+            "items": self.items,
+            "total": self.total,
+            "current_date": self.current_date,
+            "created_at": self.created_at,
+            "receipt_sha256": self.receipt_sha256,
+            "receipt_archive": self.receipt_archive
+        }
+    
+    def to_order_data(self):
+        """Convert order to the order_data dict used by receipts and emails"""
+        return {
+            "order_id": self.order_id,
+            "user_email": self.user_email,
+            "items": self.items,
+            "total": self.total,
+            "current_date": self.current_date
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        """Create order from MongoDB document"""
+        order = cls(data["_id"], data["user_email"], data.get("items", []), data.get("total", 0), data.get("current_date", ""))
+        order.created_at = data.get("created_at", datetime.utcnow())
+        order.receipt_sha256 = data.get("receipt_sha256")
+        order.receipt_archive = data.get("receipt_archive")
+        return order
@@ -1,8 +1,18 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app, stream_with_context
 from werkzeug.utils import secure_filename
 from ..db import get_products_collection, get_receipts_collection, str_to_objectid, objectid_to_str
 from ..models.user import Product
+from ..utils.catalog_cache import catalog_cache, bump_catalog_version
+from ..utils.pagination import keyset_page, clamp_page_size
+from ..utils.conditional import page_etag, not_modified, tag_page
+from ..utils.sales_rollups import get_sales_analytics
+from ..utils.image_derivatives import queue_image_derivatives
+from ..utils.receipt_export import export_receipts, receipt_export_filename, RECEIPT_EXPORT_FORMATS
+from ..utils.inventory import stock_levels
+from ..utils.product_io import parse_stock, detect_format, import_products, export_products, export_filename, PRODUCT_FORMATS
+from datetime import datetime, timedelta
 import os
+import pytz
 import uuid
 
 admin = Blueprint("admin", __name__)
@@ -34,45 +44,119 @@ def save_uploaded_file(file):
         return f"/static/uploads/{unique_filename}"
     return None
 
-
 # Admin Dashboard
 @admin.route("/admin/dashboard")
 def admin_dashboard():
     if session.get("user") != "niteshyrai43@gmail.com":
         flash("Access denied. Admins only!")
         return redirect(url_for("products.list_products"))
+
+    # Stock is read live: checkouts change it without a catalog version bump
+    stock = stock_levels()
+    etag = page_etag(catalog_cache.current_version(), sorted(stock.items()))
+    response = not_modified(etag)
+    if response is not None:
+        return response
     
-    products_collection = get_products_collection()
-    products_data = list(products_collection.find())
+    products_list = [dict(product, stock=stock.get(product["id"])) for product in catalog_cache.get_products()]
     
-    # Convert ObjectIds to strings for template compatibility
-    products_list = []
-    for product in products_data:
-        products_list.append({
-            "id": str(product["_id"]),
-            "name": product["name"],
-            "price": product["price"],
-            "category": product.get("category", ""),
-            "description": product.get("description", ""),
-            "image_url": product.get("image_url", "")
-        })
-    
-    return render_template("admin_dashboard.html", products=products_list)
+    return tag_page(render_template("admin_dashboard.html", products=products_list), etag)
 
 
 # Admin Receipts Logs
+RECEIPT_EMAIL_STATUSES = ["queued", "sent", "failed"]
+
+
+def parse_filter_date(value, end_of_day=False):
+    """Parse a YYYY-MM-DD filter value as an IST day boundary (None if invalid)"""
+    try:
+        day = datetime.strptime(value, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None
+    if end_of_day:
+        day += timedelta(days=1)
+    return pytz.timezone('Asia/Kolkata').localize(day)
+
+
+def build_receipt_filter(args):
+    """
+    Build the receipts query from request arguments
+
+    Args:
+        args: Request args with optional user_email, date_from, date_to
+            (inclusive, YYYY-MM-DD in IST) and email_status
+
+    Returns:
+        tuple: (query dict, filters dict of the accepted values)
+    """
+    query = {}
+    filters = {}
+
+    user_email = args.get("user_email", "").strip()
+    if user_email:
+        query["user_email"] = user_email
+        filters["user_email"] = user_email
+
+    email_status = args.get("email_status", "")
+    if email_status in RECEIPT_EMAIL_STATUSES:
+        query["email_status"] = email_status
+        filters["email_status"] = email_status
+
+    date_from = parse_filter_date(args.get("date_from"))
+    date_to = parse_filter_date(args.get("date_to"), end_of_day=True)
+    if date_from or date_to:
+        query["timestamp"] = {}
+        if date_from:
+            query["timestamp"]["$gte"] = date_from
+            filters["date_from"] = args.get("date_from")
+        if date_to:
+            query["timestamp"]["$lt"] = date_to
+            filters["date_to"] = args.get("date_to")
+
+    return query, filters
+
+
+def receipt_summary(query):
+    """Revenue, order count and failed-email count of the matching receipts"""
+    pipeline = [
+        {"$match": query},
+        {"$group": {
+            "_id": None,
+            "revenue": {"$sum": "$total_amount"},
+            "order_count": {"$sum": 1},
+            "failed_count": {"$sum": {"$cond": [{"$eq": ["$email_status", "failed"]}, 1, 0]}}
+        }}
+    ]
+    result = list(get_receipts_collection().aggregate(pipeline))
+    if not result:
+        return {"revenue": 0, "order_count": 0, "failed_count": 0}
+    return {key: result[0][key] for key in ("revenue", "order_count", "failed_count")}
+
+
 @admin.route("/admin/receipts")
 def admin_receipts():
     if session.get("user") != "niteshyrai43@gmail.com":
         flash("Access denied. Admins only!")
         return redirect(url_for("products.list_products"))
 
+    query, filters = build_receipt_filter(request.args)
+    per_page = clamp_page_size(
+        request.args.get("per_page"),
+        current_app.config.get('RECEIPTS_PAGE_SIZE', 50),
+        current_app.config.get('RECEIPTS_MAX_PAGE_SIZE', 200)
+    )
+
     receipts_collection = get_receipts_collection()
-    logs = list(receipts_collection.find().sort("timestamp", -1))
+    page = keyset_page(
+        receipts_collection, query, "timestamp", -1,
+        after=request.args.get("after"),
+        before=request.args.get("before"),
+        limit=per_page
+    )
 
     # Transform for template
     entries = []
-    for doc in logs:
+    for doc in page["items"]:
         entries.append({
             "id": str(doc.get("_id")),
             "username": doc.get("username", ""),
@@ -84,7 +168,59 @@ def admin_receipts():
             "receipt_filename": doc.get("receipt_filename", "")
         })
 
-    return render_template("admin_receipts.html", entries=entries)
+    return render_template(
+        "admin_receipts.html",
+        entries=entries,
+        summary=receipt_summary(query),
+        filters=filters,
+        statuses=RECEIPT_EMAIL_STATUSES,
+        per_page=per_page,
+        next_cursor=page["next_cursor"],
+        prev_cursor=page["prev_cursor"]
+    )
+
+
+@admin.route("/admin/receipts/export")
+def export_receipts_file():
+    if session.get("user") != "niteshyrai43@gmail.com":
+        flash("Access denied. Admins only!")
+        return redirect(url_for("products.list_products"))
+
+    # Same filters as the receipt log, e.g. ?date_from=2026-09-01&date_to=2026-09-30
+    query, filters = build_receipt_filter(request.args)
+    file_format = request.args.get("format", "csv")
+    if file_format not in RECEIPT_EXPORT_FORMATS:
+        file_format = "csv"
+
+    response = current_app.response_class(
+        stream_with_context(export_receipts(query, file_format, batch_size=current_app.config['RECEIPTS_EXPORT_BATCH_SIZE'])),
+        mimetype="text/csv" if file_format == "csv" else "application/x-ndjson"
+    )
+    response.headers.set("Content-Disposition", "attachment", filename=receipt_export_filename(filters, file_format))
+    return response
+
+
+@admin.route("/admin/analytics")
+def admin_analytics():
+    if session.get("user") != "niteshyrai43@gmail.com":
+        flash("Access denied. Admins only!")
+        return redirect(url_for("products.list_products"))
+
+    # Reads only the rollup collections, never the receipts themselves
+    analytics = get_sales_analytics(days=30, top=10)
+    totals = {
+        "revenue": sum(day.get("revenue", 0) for day in analytics["daily"]),
+        "orders": sum(day.get("orders", 0) for day in analytics["daily"]),
+        "units": sum(day.get("units", 0) for day in analytics["daily"])
+    }
+
+    return render_template(
+        "admin_analytics.html",
+        daily=analytics["daily"],
+        categories=analytics["categories"],
+        top_products=analytics["top_products"],
+        totals=totals
+    )
 
 
 # Add Product
@@ -99,6 +235,11 @@ def add_product():
         price = int(request.form["price"])
         category = request.form.get("category", "")
         description = request.form.get("description", "")
+        try:
+            stock = parse_stock(request.form.get("stock"))
+        except ValueError:
+            flash("⚠️ Stock must be a whole number of 0 or more, or empty.")
+            return render_template("add_product.html")
         
         # Handle file upload
         image_file = request.files.get("image")
@@ -116,8 +257,11 @@ def add_product():
             image_url = "/static/images/placeholder.svg"
         
         products_collection = get_products_collection()
-        product = Product(name, price, category, description, image_url)
-        products_collection.insert_one(product.to_dict())
+        product = Product(name, price, category, description, image_url, stock=stock)
+        result = products_collection.insert_one(product.to_dict())
+        bump_catalog_version()
+        # Thumbnails and WebP copies are generated by the worker
+        queue_image_derivatives(result.inserted_id, image_url)
         
         flash("✅ Product added successfully!")
         return redirect(url_for("admin.admin_dashboard"))
@@ -125,6 +269,53 @@ def add_product():
     return render_template("add_product.html")
 
 
+# Bulk import / export
+@admin.route("/admin/products/import", methods=["GET", "POST"])
+def import_products_page():
+    if session.get("user") != "niteshyrai43@gmail.com":
+        flash("Access denied.")
+        return redirect(url_for("products.list_products"))
+
+    if request.method == "GET":
+        return render_template("import_products.html", formats=PRODUCT_FORMATS)
+
+    upload = request.files.get("file")
+    if not upload or not upload.filename:
+        flash("⚠️ Choose a CSV or JSONL file to import.")
+        return redirect(url_for("admin.import_products_page"))
+
+    file_format = request.form.get("format")
+    if file_format not in PRODUCT_FORMATS:
+        file_format = detect_format(upload.filename)
+
+    # Parsed straight from the upload's stream, a batch of rows at a time
+    try:
+        summary = import_products(upload.stream, file_format, batch_size=current_app.config['PRODUCT_IMPORT_BATCH_SIZE'])
+    except UnicodeDecodeError:
+        flash("⚠️ The file is not UTF-8 text. Rows before the error were imported.")
+        return redirect(url_for("admin.import_products_page"))
+
+    return render_template("import_products.html", formats=PRODUCT_FORMATS, summary=summary, filename=upload.filename)
+
+
+@admin.route("/admin/products/export")
+def export_products_file():
+    if session.get("user") != "niteshyrai43@gmail.com":
+        flash("Access denied.")
+        return redirect(url_for("products.list_products"))
+
+    file_format = request.args.get("format", "csv")
+    if file_format not in PRODUCT_FORMATS:
+        file_format = "csv"
+
+    response = current_app.response_class(
+        stream_with_context(export_products(file_format, batch_size=current_app.config['PRODUCT_IMPORT_BATCH_SIZE'])),
+        mimetype="text/csv" if file_format == "csv" else "application/x-ndjson"
+    )
+    response.headers.set("Content-Disposition", "attachment", filename=export_filename(file_format))
+    return response
+
+
 # Edit Product
 @admin.route("/admin/edit/<product_id>", methods=["GET", "POST"])
 def edit_product(product_id):
@@ -149,6 +340,11 @@ def edit_product(product_id):
         price = int(request.form["price"])
         category = request.form.get("category", "")
         description = request.form.get("description", "")
+        try:
+            stock = parse_stock(request.form.get("stock"))
+        except ValueError:
+            flash("⚠️ Stock must be a whole number of 0 or more, or empty.")
+            return redirect(url_for("admin.edit_product", product_id=product_id))
         
         # Handle file upload - only update if new image is uploaded
         image_file = request.files.get("image")
@@ -167,10 +363,20 @@ def edit_product(product_id):
                 flash("⚠️ Invalid image file. Please upload a valid image (PNG, JPG, JPEG, GIF, WebP).")
                 return render_template("edit_product.html", product=product)
         
-        products_collection.update_one(
-            {"_id": product_object_id},
-            {"$set": update_data}
-        )
+        unset = {"sold_out": ""}
+        if stock is None:
+            unset["stock"] = ""
+        else:
+            # Overwrites the count, including units reserved by checkouts meanwhile
+            update_data["stock"] = stock
+        if "image_url" in update_data:
+            # Variants of the old image must not be served for the new one
+            unset["image_variants"] = ""
+        update = {"$set": update_data, "$unset": unset}
+        products_collection.update_one({"_id": product_object_id}, update)
+        bump_catalog_version()
+        if "image_url" in update_data:
+            queue_image_derivatives(product_object_id, update_data["image_url"])
         
         flash("✅ Product updated successfully!")
         return redirect(url_for("admin.admin_dashboard"))
@@ -182,7 +388,8 @@ def edit_product(product_id):
         "price": product_data["price"],
         "category": product_data.get("category", ""),
         "description": product_data.get("description", ""),
-        "image_url": product_data.get("image_url", "")
+        "image_url": product_data.get("image_url", ""),
+        "stock": product_data.get("stock")
     }
     
     return render_template("edit_product.html", product=product)
@@ -210,6 +417,7 @@ def delete_product(product_id):
     
     # Delete the product
     products_collection.delete_one({"_id": product_object_id})
+    bump_catalog_version()
     
     flash("🗑️ Product deleted successfully!")
     return redirect(url_for("admin.admin_dashboard"))
@@ -0,0 +1,36 @@
+from flask import Blueprint, Response, jsonify
+from ..db import db
+from ..utils.metrics import render_metrics
+
+health = Blueprint("health", __name__)
+
+
+@health.route("/healthz")
+def healthz():
+    """Liveness: the process serves requests (no dependency checks)"""
+    return jsonify(status="ok")
+
+
+@health.route("/readyz")
+def readyz():
+    """
+    Readiness: this process's MongoDB pool can reach a writable server
+
+    Reads the topology the pool's monitors already maintain instead of
+    opening a connection or sending a ping, so probes add no database load.
+    """
+    try:
+        topology = db.client.topology_description
+    except Exception as e:
+        return jsonify(status="unavailable", error=str(e)), 503
+
+    if not topology.has_writable_server():
+        return jsonify(status="unavailable", mongo=topology.topology_type_name), 503
+    return jsonify(status="ready", mongo=topology.topology_type_name)
+
+
+@health.route("/metrics")
+def metrics():
+    """Prometheus metrics of every worker process (see utils/metrics.py)"""
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
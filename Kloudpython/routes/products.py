@@ -1,47 +1,123 @@
-from flask import Blueprint, render_template, session, redirect, url_for, flash, request, send_file, current_app
-from ..db import get_products_collection, get_cart_collection, get_users_collection, get_receipts_collection, str_to_objectid, objectid_to_str
-from ..models.user import Product, CartItem
+from flask import Blueprint, render_template, session, redirect, url_for, flash, request, current_app
+from werkzeug.wsgi import wrap_file
+from ..db import get_users_collection, get_receipts_collection, get_orders_collection, str_to_objectid
+from ..models.user import Order
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime
-import os
 import pytz
-from ..utils.pdf_generator import generate_receipt_pdf, create_receipts_directory
-from ..utils.email_helper import send_receipt_email, get_user_email_from_db, cleanup_pdf_file
+import secrets
+from ..utils.catalog_cache import catalog_cache, bump_catalog_version
+from ..utils.cart_pricing import price_cart
+from ..utils.cart_ops import add_cart_item, remove_cart_item, clear_cart, get_cart_state
+from ..utils.conditional import page_etag, not_modified, tag_page
+from ..utils.receipt_jobs import queue_receipt
+from ..utils.receipt_store import open_order_receipt
+from ..utils.sales_rollups import record_order_sales
+from ..utils.pagination import clamp_page_size
+from ..utils.product_search import search_products
+from ..utils.inventory import reserve_stock, release_stock, mark_sold_out, OutOfStock
 
 products = Blueprint("products", __name__)  # previously "products"
 
 
+# Sort options for the product grid: name -> (field, direction)
+PRODUCT_SORTS = {
+    "default": ("_id", 1),
+    "newest": ("created_at", -1),
+    "price_asc": ("price", 1),
+    "price_desc": ("price", -1)
+}
+
+
 def get_ist_time():
     """Get current time in Indian Standard Time (IST)"""
     ist = pytz.timezone('Asia/Kolkata')
     return datetime.now(ist)
 
 
+def generate_order_id():
+    """Order ID: IST timestamp plus a random suffix so concurrent orders don't collide"""
+    return get_ist_time().strftime("%Y%m%d%H%M%S") + f"{secrets.randbelow(10000):04d}"
+
+
+def insert_new_order(user_email, items, total, current_date, attempts=3):
+    """
+    Persist an order under a fresh order ID
+
+    IDs are per-second timestamps with a random suffix, so under heavy
+    checkout load two orders can draw the same one; the later insert then
+    draws a new ID.
+
+    Returns:
+        str: The order ID
+    """
+    for attempt in range(attempts):
+        order = Order(generate_order_id(), user_email, items, total, current_date)
+        try:
+            get_orders_collection().insert_one(order.to_dict())
+            return order.order_id
+        except DuplicateKeyError:
+            if attempt == attempts - 1:
+                raise
+
+
 @products.route("/products")
 def list_products():
-    products_collection = get_products_collection()
-    products_data = list(products_collection.find())
-    
-    # Convert ObjectIds to strings for template compatibility
-    products_list = []
-    for product in products_data:
-        products_list.append({
-            "id": str(product["_id"]),
-            "name": product["name"],
-            "price": product["price"],
-            "category": product.get("category", ""),
-            "description": product.get("description", ""),
-            "image_url": product.get("image_url", "")
-        })
-    
-    if "user" in session:
-        user_email = session["user"]
-        cart_collection = get_cart_collection()
-        cart_items = cart_collection.find({"user_email": user_email})
-        cart = {str(item["product_id"]): item["quantity"] for item in cart_items}
+    sort = request.args.get("sort", "default")
+    if sort not in PRODUCT_SORTS:
+        sort = "default"
+    sort_field, direction = PRODUCT_SORTS[sort]
+    per_page = clamp_page_size(
+        request.args.get("per_page"),
+        current_app.config.get('PRODUCTS_PAGE_SIZE', 24),
+        current_app.config.get('PRODUCTS_MAX_PAGE_SIZE', 100)
+    )
+
+    # Answer revalidations before touching the catalog; the cart read is the
+    # one the page renders from
+    user_email = session.get("user")
+    cart, cart_version = get_cart_state(user_email) if user_email else ({}, "")
+    etag = page_etag(catalog_cache.current_version(), cart_version)
+    response = not_modified(etag)
+    if response is not None:
+        return response
+
+    q = request.args.get("q", "").strip()
+    category = request.args.get("category", "").strip()
+
+    if q:
+        # Relevance-ranked search, paged by number
+        max_results = current_app.config.get('PRODUCT_SEARCH_MAX_RESULTS', 1000)
+        page_number = clamp_page_size(request.args.get("page"), 1, max(1, max_results // per_page))
+        results = search_products(q, category or None, page_number, per_page)
+        products_list = results["items"]
+        next_cursor = prev_cursor = None
     else:
-        cart = {}
-    
-    return render_template("products.html", products=products_list, cart=cart)
+        page = catalog_cache.get_page(
+            sort_field, direction,
+            after=request.args.get("after"),
+            before=request.args.get("before"),
+            limit=per_page,
+            category=category or None
+        )
+        products_list = page["items"]
+        next_cursor, prev_cursor = page["next_cursor"], page["prev_cursor"]
+        results = None
+
+    return tag_page(render_template(
+        "products.html",
+        products=products_list,
+        cart=cart,
+        sort=sort,
+        per_page=per_page,
+        q=q,
+        category=category,
+        categories=catalog_cache.get_categories(),
+        search_page=results["page"] if results else None,
+        search_has_next=results["has_next"] if results else False,
+        next_cursor=next_cursor,
+        prev_cursor=prev_cursor
+    ), etag)
 
 
 @products.route("/cart")
@@ -51,37 +127,15 @@ def cart():
         return redirect(url_for("auth.login"))
 
     user_email = session["user"]
-    products_collection = get_products_collection()
-    cart_collection = get_cart_collection()
-    
-    # Get user's cart items
-    cart_items = cart_collection.find({"user_email": user_email})
-    
-    # Build a list of items with quantity
-    items = []
-    total = 0
-    
-    for cart_item in cart_items:
-        product_id = cart_item["product_id"]
-        quantity = cart_item["quantity"]
-        
-        # Find the product
-        product = products_collection.find_one({"_id": product_id})
-        if product:
-            subtotal = product["price"] * quantity
-            items.append({
-                "id": str(product["_id"]),
-                "name": product["name"],
-                "price": product["price"],
-                "category": product.get("category", ""),
-                "description": product.get("description", ""),
-                "image_url": product.get("image_url", ""),
-                "quantity": quantity,
-                "subtotal": subtotal
-            })
-            total += subtotal
+    _, cart_version = get_cart_state(user_email)
+    etag = page_etag(catalog_cache.current_version(), cart_version)
+    response = not_modified(etag)
+    if response is not None:
+        return response
+
+    items, total = price_cart(user_email)
 
-    return render_template("cart.html", items=items, total=total)
+    return tag_page(render_template("cart.html", items=items, total=total), etag)
 
 
 @products.route("/add-to-cart/<product_id>", methods=["POST"])
@@ -91,7 +145,6 @@ def add_to_cart(product_id):
         return redirect(url_for("auth.login"))
 
     user_email = session["user"]
-    cart_collection = get_cart_collection()
     
     # Convert string product_id to ObjectId
     product_object_id = str_to_objectid(product_id)
@@ -99,22 +152,7 @@ def add_to_cart(product_id):
         flash("Invalid product ID.")
         return redirect(url_for("products.list_products"))
     
-    # Check if item already exists in cart
-    existing_item = cart_collection.find_one({
-        "user_email": user_email,
-        "product_id": product_object_id
-    })
-    
-    if existing_item:
-        # Update quantity
-        cart_collection.update_one(
-            {"_id": existing_item["_id"]},
-            {"$inc": {"quantity": 1}}
-        )
-    else:
-        # Add new item
-        cart_item = CartItem(user_email, product_object_id, 1)
-        cart_collection.insert_one(cart_item.to_dict())
+    add_cart_item(user_email, product_object_id)
     
     flash("Item added to cart!")
     return redirect(url_for("products.list_products"))
@@ -127,28 +165,13 @@ def increase_quantity(product_id):
         return redirect(url_for("auth.login"))
 
     user_email = session["user"]
-    cart_collection = get_cart_collection()
     
     # Convert string product_id to ObjectId
     product_object_id = str_to_objectid(product_id)
     if not product_object_id:
         return redirect(url_for("products.list_products"))
     
-    # Find existing cart item
-    existing_item = cart_collection.find_one({
-        "user_email": user_email,
-        "product_id": product_object_id
-    })
-    
-    if existing_item:
-        cart_collection.update_one(
-            {"_id": existing_item["_id"]},
-            {"$inc": {"quantity": 1}}
-        )
-    else:
-        # Add new item if it doesn't exist
-        cart_item = CartItem(user_email, product_object_id, 1)
-        cart_collection.insert_one(cart_item.to_dict())
+    add_cart_item(user_email, product_object_id)
 
     return redirect(url_for("products.list_products"))
 
@@ -159,28 +182,13 @@ def decrease_quantity(product_id):
         return redirect(url_for("auth.login"))
 
     user_email = session["user"]
-    cart_collection = get_cart_collection()
     
     # Convert string product_id to ObjectId
     product_object_id = str_to_objectid(product_id)
     if not product_object_id:
         return redirect(url_for("products.list_products"))
     
-    # Find existing cart item
-    existing_item = cart_collection.find_one({
-        "user_email": user_email,
-        "product_id": product_object_id
-    })
-    
-    if existing_item:
-        if existing_item["quantity"] > 1:
-            cart_collection.update_one(
-                {"_id": existing_item["_id"]},
-                {"$inc": {"quantity": -1}}
-            )
-        else:
-            # Remove item if quantity becomes 0
-            cart_collection.delete_one({"_id": existing_item["_id"]})
+    remove_cart_item(user_email, product_object_id)
 
     return redirect(url_for("products.list_products"))
 
@@ -193,35 +201,7 @@ def checkout():
         return redirect(url_for("auth.login"))
 
     user_email = session["user"]
-    products_collection = get_products_collection()
-    cart_collection = get_cart_collection()
-    
-    # Get user's cart items
-    cart_items = cart_collection.find({"user_email": user_email})
-    
-    # Build a list of items with quantity
-    items = []
-    total = 0
-    
-    for cart_item in cart_items:
-        product_id = cart_item["product_id"]
-        quantity = cart_item["quantity"]
-        
-        # Find the product
-        product = products_collection.find_one({"_id": product_id})
-        if product:
-            subtotal = product["price"] * quantity
-            items.append({
-                "id": str(product["_id"]),
-                "name": product["name"],
-                "price": product["price"],
-                "category": product.get("category", ""),
-                "description": product.get("description", ""),
-                "image_url": product.get("image_url", ""),
-                "quantity": quantity,
-                "subtotal": subtotal
-            })
-            total += subtotal
+    items, total = price_cart(user_email)
 
     if not items:
         flash("Your cart is empty. Add some products first!")
@@ -239,81 +219,49 @@ def confirm_order():
         return redirect(url_for("auth.login"))
 
     user_email = session["user"]
-    products_collection = get_products_collection()
-    cart_collection = get_cart_collection()
-    
-    # Get user's cart items
-    cart_items = cart_collection.find({"user_email": user_email})
     
     # Build order summary
-    items = []
-    total = 0
-    order_id = get_ist_time().strftime("%Y%m%d%H%M%S")
-    
-    for cart_item in cart_items:
-        product_id = cart_item["product_id"]
-        quantity = cart_item["quantity"]
-        
-        # Find the product
-        product = products_collection.find_one({"_id": product_id})
-        if product:
-            subtotal = product["price"] * quantity
-            items.append({
-                "id": str(product["_id"]),
-                "name": product["name"],
-                "price": product["price"],
-                "category": product.get("category", ""),
-                "description": product.get("description", ""),
-                "image_url": product.get("image_url", ""),
-                "quantity": quantity,
-                "subtotal": subtotal
-            })
-            total += subtotal
+    items, total = price_cart(user_email)
 
     if not items:
         flash("Your cart is empty. Add some products first!")
         return redirect(url_for("products.cart"))
 
-    # Clear the cart after order confirmation
-    cart_collection.delete_many({"user_email": user_email})
-    
+    # Take the items out of stock first; nothing is written if one is short
+    try:
+        reserved = reserve_stock(items)
+    except OutOfStock as e:
+        name = next((item["name"] for item in items if item["id"] == str(e.product_id)), "An item")
+        if mark_sold_out(e.product_id):
+            # Show it as out of stock on the product grid
+            bump_catalog_version()
+        flash(f"Sorry, {name} does not have {e.quantity} left in stock. Please update your cart.")
+        return redirect(url_for("products.cart"))
+
     current_date = get_ist_time().strftime("%B %d, %Y at %I:%M %p")
     
-    # Prepare order data for email
-    order_data = {
-        'order_id': order_id,
-        'user_email': user_email,
-        'items': items,
-        'total': total,
-        'current_date': current_date
-    }
-    
-    # Generate PDF receipt and send email
-    email_sent = False
+    # Persist the order so receipts can be served without re-rendering
+    order_items = []
+    for item in items:
+        order_items.append({
+            "product_id": item["id"],
+            "name": item["name"],
+            "category": item["category"],
+            "quantity": item["quantity"],
+            "price": item["price"],
+            "subtotal": item["subtotal"]
+        })
     try:
-        # Create receipts directory
-        receipts_dir = create_receipts_directory()
-        
-        # Generate filename
-        timestamp = get_ist_time().strftime("%Y%m%d_%H%M%S")
-        username_clean = user_email.replace("@", "_").replace(".", "_")
-        filename = f"receipt_{username_clean}_{timestamp}.pdf"
-        pdf_path = os.path.join(receipts_dir, filename)
-        
-        # Generate PDF
-        generate_receipt_pdf(order_data, pdf_path)
-        
-        # Send email with PDF attachment
-        email_sent = send_receipt_email(user_email, order_data, pdf_path)
-        
-        # Optionally cleanup PDF file after sending (uncomment if you want to delete)
-        # cleanup_pdf_file(pdf_path)
-        
-    except Exception as e:
-        current_app.logger.error(f"Failed to send email receipt: {str(e)}")
-        email_sent = False
+        order_id = insert_new_order(user_email, order_items, total, current_date)
+    except Exception:
+        release_stock(reserved)
+        raise
+
+    # Clear the cart after order confirmation
+    clear_cart(user_email)
     
-    # Log receipt to MongoDB
+    # Log receipt to MongoDB and queue the PDF/email job
+    email_status = "failed"
     try:
         receipts_collection = get_receipts_collection()
         users_collection = get_users_collection()
@@ -324,147 +272,108 @@ def confirm_order():
         items_for_log = []
         for item in items:
             items_for_log.append({
+                "product_id": item.get("id"),
                 "name": item.get("name"),
+                "category": item.get("category"),
                 "quantity": item.get("quantity"),
                 "price": item.get("price"),
                 "subtotal": item.get("subtotal")
             })
 
-        receipts_collection.insert_one({
+        logged_at = get_ist_time()
+        result = receipts_collection.insert_one({
             "user_email": user_email,
             "username": username,
             "items": items_for_log,
             "total_amount": total,
-            "timestamp": get_ist_time(),
-            "receipt_filename": filename,
-            "email_status": "sent" if email_sent else "failed"
+            "timestamp": logged_at,
+            "order_id": order_id,
+            "receipt_filename": "",
+            "email_status": "queued"
         })
+        email_status = queue_receipt(result.inserted_id, order_id)
     except Exception as e:
         current_app.logger.error(f"Failed to log receipt: {str(e)}")
+    else:
+        try:
+            record_order_sales(items_for_log, total, logged_at)
+        except Exception as e:
+            # The rollups can be recomputed with "flask rebuild-sales-rollups"
+            current_app.logger.error(f"Failed to update sales rollups: {str(e)}")
 
     # Flash message with email status
-    if email_sent:
+    if email_status == "sent":
         flash(f"Order #{order_id} confirmed successfully! Total amount: ₹{total}. A copy of your receipt has been sent to your email.")
+    elif email_status == "queued":
+        flash(f"Order #{order_id} confirmed successfully! Total amount: ₹{total}. A copy of your receipt will be emailed to you shortly.")
     else:
         flash(f"Order #{order_id} confirmed successfully! Total amount: ₹{total}. Note: Email receipt could not be sent.")
     
-    return render_template("order_confirmed.html", items=items, total=total, order_id=order_id, user_email=user_email, current_date=current_date, email_sent=email_sent)
+    return render_template("order_confirmed.html", items=items, total=total, order_id=order_id, user_email=user_email, current_date=current_date, email_status=email_status)
+
+
+def send_order_receipt(order_id, user_email):
+    """
+    Stream the stored receipt PDF of an order
+
+    The PDF is rendered at most once per order and stored under its content
+    hash, which doubles as the ETag; conditional and Range requests are
+    answered from the stored file, or straight out of its archive pack.
+    """
+    order_doc = get_orders_collection().find_one({"_id": order_id, "user_email": user_email})
+    if not order_doc:
+        flash("Order not found.")
+        return redirect(url_for("products.list_products"))
+
+    try:
+        order = Order.from_dict(order_doc)
+        receipt_file, size = open_order_receipt(order)
+    except Exception as e:
+        flash(f"Error generating receipt: {str(e)}")
+        return redirect(url_for("products.list_products"))
+
+    response = current_app.response_class(
+        wrap_file(request.environ, receipt_file),
+        mimetype='application/pdf',
+        direct_passthrough=True
+    )
+    response.content_length = size
+    response.headers.set("Content-Disposition", "attachment", filename=f"KloudCart_Receipt_{order_id}.pdf")
+    response.set_etag(order.receipt_sha256)
+    # Receipts never change once stored, but they are private to the user
+    response.cache_control.private = True
+    response.cache_control.max_age = 31536000
+    return response.make_conditional(request, accept_ranges=True, complete_length=size)
 
 
 @products.route("/download-receipt")
 def download_receipt():
-    """Generate and download PDF receipt for the last order"""
+    """Download the PDF receipt of one of the user's orders"""
     if "user" not in session:
         flash("Please log in to download your receipt.")
         return redirect(url_for("auth.login"))
 
-    user_email = session["user"]
-    
-    # Get order data from session or request parameters
     order_id = request.args.get('order_id')
     if not order_id:
         flash("No order ID provided.")
         return redirect(url_for("products.list_products"))
-    
-    # For this implementation, we'll recreate the order data from the order_id
-    # In a real application, you might want to store order data in a separate orders collection
-    try:
-        # Create receipts directory
-        receipts_dir = create_receipts_directory()
-        
-        # Generate filename
-        timestamp = get_ist_time().strftime("%Y%m%d_%H%M%S")
-        username_clean = user_email.replace("@", "_").replace(".", "_")
-        filename = f"receipt_{username_clean}_{timestamp}.pdf"
-        file_path = os.path.join(receipts_dir, filename)
-        
-        # For this demo, we'll create a sample order data
-        # In a real app, you'd fetch this from an orders collection
-        order_data = {
-            'order_id': order_id,
-            'user_email': user_email,
-            'items': [],  # This would be fetched from orders collection
-            'total': 0,   # This would be fetched from orders collection
-            'current_date': get_ist_time().strftime("%B %d, %Y at %I:%M %p")
-        }
-        
-        # Generate PDF
-        generate_receipt_pdf(order_data, file_path)
-        
-        # Send file for download
-        return send_file(
-            file_path,
-            as_attachment=True,
-            download_name=f"KloudCart_Receipt_{order_id}.pdf",
-            mimetype='application/pdf'
-        )
-        
-    except Exception as e:
-        flash(f"Error generating receipt: {str(e)}")
-        return redirect(url_for("products.list_products"))
+
+    return send_order_receipt(order_id, session["user"])
 
 
 @products.route("/download-receipt-with-data", methods=["POST"])
 def download_receipt_with_data():
-    """Generate and download PDF receipt with order data from form"""
+    """
+    Download the PDF receipt of an order posted from the confirmation page.
+    Only the order_id is used; the order itself is read from storage.
+    """
     if "user" not in session:
         flash("Please log in to download your receipt.")
         return redirect(url_for("auth.login"))
 
-    user_email = session["user"]
-    
-    try:
-        # Get order data from form
-        order_id = request.form.get('order_id')
-        total = float(request.form.get('total', 0))
-        current_date = request.form.get('current_date', get_ist_time().strftime("%B %d, %Y at %I:%M %p"))
-        
-        # Parse items from form data
-        items = []
-        item_count = int(request.form.get('item_count', 0))
-        
-        for i in range(item_count):
-            item = {
-                'name': request.form.get(f'item_{i}_name', ''),
-                'category': request.form.get(f'item_{i}_category', ''),
-                'quantity': int(request.form.get(f'item_{i}_quantity', 0)),
-                'price': float(request.form.get(f'item_{i}_price', 0)),
-                'subtotal': float(request.form.get(f'item_{i}_subtotal', 0))
-            }
-            items.append(item)
-        
-        # Create receipts directory
-        receipts_dir = create_receipts_directory()
-        
-        # Generate filename
-        timestamp = get_ist_time().strftime("%Y%m%d_%H%M%S")
-        username_clean = user_email.replace("@", "_").replace(".", "_")
-        filename = f"receipt_{username_clean}_{timestamp}.pdf"
-        file_path = os.path.join(receipts_dir, filename)
-        
-        # Prepare order data
-        order_data = {
-            'order_id': order_id,
-            'user_email': user_email,
-            'items': items,
-            'total': total,
-            'current_date': current_date
-        }
-        
-        # Generate PDF
-        generate_receipt_pdf(order_data, file_path)
-        
-        # Send file for download
-        return send_file(
-            file_path,
-            as_attachment=True,
-            download_name=f"KloudCart_Receipt_{order_id}.pdf",
-            mimetype='application/pdf'
-        )
-        
-    except Exception as e:
-        flash(f"Error generating receipt: {str(e)}")
+    order_id = request.form.get('order_id')
+    if not order_id:
+        flash("No order ID provided.")
         return redirect(url_for("products.list_products"))
 
-
-
+    return send_order_receipt(order_id, session["user"])
@@ -0,0 +1,413 @@
+from flask import current_app
+from datetime import datetime
+from pymongo.errors import DuplicateKeyError
+from .image_derivatives import thumbnail_url
+
+
+# Stages that join cart lines ({product_id, quantity}) to their products
+PRODUCT_LOOKUP_STAGES = [
+    {"$lookup": {
+        "from": "products",
+        "localField": "product_id",
+        "foreignField": "_id",
+        "as": "product"
+    }},
+    {"$unwind": "$product"},
+    {"$project": {
+        "quantity": 1,
+        "product._id": 1,
+        "product.name": 1,
+        "product.price": 1,
+        "product.category": 1,
+        "product.image_url": 1,
+        "product.image_variants": 1,
+        "product.stock": 1
+    }}
+]
+
+
+def priced_items(lines):
+    """
+    Turn joined cart lines into template items and a total
+
+    Args:
+        lines (iterable): Documents with quantity and the joined product
+
+    Returns:
+        tuple: (items, total)
+    """
+    items = []
+    total = 0
+    for line in lines:
+        product = line["product"]
+        quantity = line["quantity"]
+        subtotal = product["price"] * quantity
+        items.append({
+            "id": str(product["_id"]),
+            "name": product["name"],
+            "price": product["price"],
+            "category": product.get("category", ""),
+            "image_url": thumbnail_url(product),
+            "stock": product.get("stock"),
+            "quantity": quantity,
+            "subtotal": subtotal
+        })
+        total += subtotal
+    return items, total
+
+
+class LineCartStore:
+    """
+    One document per (user, product) in the cart collection.
+
+    Relies on the unique (user_email, product_id) index.
+    """
+
+    def add(self, user_email, product_id, quantity=1):
+        """
+        Add a product to a cart in one atomic upsert
+
+        Two concurrent first adds cannot both insert; the loser retries as
+        an increment.
+        """
+        from ..db import get_cart_collection
+
+        cart_collection = get_cart_collection()
+        line = {"user_email": user_email, "product_id": product_id}
+        update = {"$inc": {"quantity": quantity}, "$set": {"updated_at": datetime.utcnow()}}
+        try:
+            cart_collection.update_one(line, update, upsert=True)
+        except DuplicateKeyError:
+            # Another request inserted the line first - it exists now
+            cart_collection.update_one(line, update)
+
+    def remove(self, user_email, product_id):
+        """
+        Remove one unit of a product from a cart
+
+        The decrement only applies while more than one unit is left; otherwise
+        the line is deleted, guarded on the quantity so a concurrent add is not
+        lost. Normally a single round trip, two when the last unit goes.
+
+        Returns:
+            bool: True if a unit was removed
+        """
+        from ..db import get_cart_collection
+
+        cart_collection = get_cart_collection()
+        line = {"user_email": user_email, "product_id": product_id}
+
+        while True:
+            decremented = cart_collection.find_one_and_update(
+                dict(line, quantity={"$gt": 1}),
+                {"$inc": {"quantity": -1}, "$set": {"updated_at": datetime.utcnow()}},
+                projection={"_id": 1}
+            )
+            if decremented:
+                return True
+
+            if cart_collection.delete_one(dict(line, quantity={"$lte": 1})).deleted_count:
+                return True
+
+            # Neither matched: the line is gone, or a concurrent add raised the
+            # quantity between the two operations and the decrement can retry
+            if not cart_collection.count_documents(line, limit=1):
+                return False
+
+    def quantities(self, user_email):
+        """Map of product id (str) -> quantity"""
+        from ..db import get_cart_collection
+
+        cart_items = get_cart_collection().find({"user_email": user_email}, {"product_id": 1, "quantity": 1})
+        return {str(item["product_id"]): item["quantity"] for item in cart_items}
+
+    def state(self, user_email):
+        """
+        Quantities and a version of the cart, from one read
+
+        There is no cart document to keep a counter on, so the version is
+        the cart content itself.
+        """
+        quantities = self.quantities(user_email)
+        return quantities, ";".join(f"{product_id}={quantity}" for product_id, quantity in sorted(quantities.items()))
+
+    def price(self, user_email):
+        """Join the cart to its products in one aggregation"""
+        from ..db import get_cart_collection
+
+        pipeline = [{"$match": {"user_email": user_email}}] + PRODUCT_LOOKUP_STAGES
+        return priced_items(get_cart_collection().aggregate(pipeline))
+
+    def clear(self, user_email):
+        """Empty the cart"""
+        from ..db import get_cart_collection
+
+        get_cart_collection().delete_many({"user_email": user_email})
+
+
+class EmbeddedCartStore:
+    """
+    One document per user in the carts collection, keyed by email, with the
+    lines in an embedded items array.
+
+    Reading a cart is a single point lookup and clearing it is one write.
+    While CART_MIGRATION_FALLBACK is on, a user's leftover line documents are
+    migrated the first time their cart is read or gains a line; the cart then
+    carries a migrated marker and is not checked again. This lets the switch
+    from LineCartStore happen while the backfill (flask migrate-carts) runs.
+    Turn it off once the backfill is done.
+    """
+
+    def add(self, user_email, product_id, quantity=1):
+        """Add a product: positional $inc, or $push if the line is new"""
+        fallback = _migration_fallback()
+        while not self._add(user_email, product_id, quantity, migrated_only=fallback):
+            # No migrated cart yet - move the user's line documents over first
+            migrate_user_cart(user_email)
+
+    def _add(self, user_email, product_id, quantity, migrated_only=False, updated_at=None):
+        """
+        Add units of a product to the embedded cart
+
+        Args:
+            migrated_only (bool): Only $push into a cart that has the migrated
+                marker, never create one
+            updated_at (datetime): Timestamp of the line, if not now
+
+        Returns:
+            bool: False if migrated_only and there was no migrated cart to push to
+        """
+        from ..db import get_carts_collection
+
+        carts_collection = get_carts_collection()
+        now = datetime.utcnow()
+        push = {
+            "$push": {"items": {"product_id": product_id, "quantity": quantity, "updated_at": updated_at or now}},
+            "$set": {"updated_at": now},
+            "$inc": {"version": 1}
+        }
+        while True:
+            result = carts_collection.update_one(
+                {"_id": user_email, "items.product_id": product_id},
+                {
+                    "$inc": {"items.$.quantity": quantity, "version": 1},
+                    "$set": {"items.$.updated_at": updated_at or now, "updated_at": now}
+                }
+            )
+            if result.matched_count:
+                return True
+
+            if migrated_only:
+                result = carts_collection.update_one(
+                    {"_id": user_email, "items.product_id": {"$ne": product_id}, "migrated": True}, push
+                )
+                # A miss can also be a concurrent $push of this line; the caller's
+                # migration is then a no-op and the retried $inc matches
+                return bool(result.matched_count)
+
+            try:
+                result = carts_collection.update_one(
+                    {"_id": user_email, "items.product_id": {"$ne": product_id}}, push, upsert=True
+                )
+                if result.matched_count or result.upserted_id is not None:
+                    return True
+            except DuplicateKeyError:
+                # The cart exists and a concurrent add pushed this line - increment it
+                pass
+
+    def remove(self, user_email, product_id):
+        """
+        Remove one unit: positional decrement, or $pull of the last unit
+
+        Returns:
+            bool: True if a unit was removed
+        """
+        from ..db import get_carts_collection
+
+        carts_collection = get_carts_collection()
+        now = datetime.utcnow()
+        fallback = _migration_fallback()
+        while True:
+            result = carts_collection.update_one(
+                {"_id": user_email, "items": {"$elemMatch": {"product_id": product_id, "quantity": {"$gt": 1}}}},
+                {"$inc": {"items.$.quantity": -1, "version": 1}, "$set": {"items.$.updated_at": now, "updated_at": now}}
+            )
+            if result.modified_count:
+                return True
+
+            result = carts_collection.update_one(
+                {"_id": user_email, "items": {"$elemMatch": {"product_id": product_id, "quantity": {"$lte": 1}}}},
+                {"$pull": {"items": {"product_id": product_id}}, "$set": {"updated_at": now}, "$inc": {"version": 1}}
+            )
+            if result.modified_count:
+                return True
+
+            if not carts_collection.count_documents({"_id": user_email, "items.product_id": product_id}, limit=1):
+                # The line may still be a line document: migrate once and retry
+                if fallback and not _is_migrated(user_email) and migrate_user_cart(user_email):
+                    fallback = False
+                    continue
+                return False
+
+    def _load(self, user_email):
+        from ..db import get_carts_collection
+
+        projection = {"items.product_id": 1, "items.quantity": 1, "migrated": 1, "version": 1}
+        cart = get_carts_collection().find_one({"_id": user_email}, projection)
+        if _migration_fallback() and not (cart or {}).get("migrated") and migrate_user_cart(user_email):
+            cart = get_carts_collection().find_one({"_id": user_email}, projection)
+        return cart
+
+    def quantities(self, user_email):
+        """Map of product id (str) -> quantity"""
+        return self.state(user_email)[0]
+
+    def state(self, user_email):
+        """Quantities and the version counter every cart write increments, from one read"""
+        cart = self._load(user_email) or {}
+        quantities = {str(item["product_id"]): item["quantity"] for item in cart.get("items", [])}
+        return quantities, cart.get("version", 0)
+
+    def price(self, user_email):
+        """Unwind the embedded lines and join them to their products"""
+        from ..db import get_carts_collection
+
+        pipeline = [
+            {"$match": {"_id": user_email}},
+            {"$unwind": "$items"},
+            {"$replaceRoot": {"newRoot": "$items"}}
+        ] + PRODUCT_LOOKUP_STAGES
+        items, total = priced_items(get_carts_collection().aggregate(pipeline))
+        if not items and _migration_fallback() and not _is_migrated(user_email) and migrate_user_cart(user_email):
+            items, total = priced_items(get_carts_collection().aggregate(pipeline))
+        return items, total
+
+    def clear(self, user_email):
+        """Empty the cart (the document is kept so later reads stay point lookups)"""
+        from ..db import get_carts_collection
+
+        get_carts_collection().update_one(
+            {"_id": user_email},
+            {"$set": {"items": [], "updated_at": datetime.utcnow()}, "$inc": {"version": 1}}
+        )
+
+
+CART_STORES = {
+    "lines": LineCartStore(),
+    "embedded": EmbeddedCartStore()
+}
+
+
+def _config(key, default):
+    try:
+        return current_app.config.get(key, default)
+    except RuntimeError:
+        # Outside an application context (e.g. benchmark scripts)
+        return default
+
+
+def _migration_fallback():
+    return _config('CART_MIGRATION_FALLBACK', True)
+
+
+def _is_migrated(user_email):
+    """True if the user's embedded cart has the migrated marker"""
+    from ..db import get_carts_collection
+
+    return get_carts_collection().count_documents({"_id": user_email, "migrated": True}, limit=1) > 0
+
+
+def get_cart_store():
+    """Get the cart store selected by CART_STORAGE ("lines" or "embedded")"""
+    return CART_STORES[_config('CART_STORAGE', 'lines')]
+
+
+def get_cart_state(user_email):
+    """
+    A user's cart quantities and its version, in one read of the cart
+
+    The version changes whenever the cart does, for use in page ETags.
+
+    Returns:
+        tuple: (map of product id (str) -> quantity, version)
+    """
+    return get_cart_store().state(user_email)
+
+
+def add_cart_item(user_email, product_id, quantity=1):
+    """Add units of a product to a user's cart"""
+    get_cart_store().add(user_email, product_id, quantity)
+
+
+def remove_cart_item(user_email, product_id):
+    """Remove one unit of a product from a user's cart; True if one was removed"""
+    return get_cart_store().remove(user_email, product_id)
+
+
+def get_cart_quantities(user_email):
+    """Map of product id (str) -> quantity in a user's cart"""
+    return get_cart_store().quantities(user_email)
+
+
+def clear_cart(user_email):
+    """Empty a user's cart"""
+    get_cart_store().clear(user_email)
+
+
+def migrate_user_cart(user_email):
+    """
+    Move one user's line documents into their embedded cart document
+
+    Quantities are added to any lines already in the embedded cart. Each
+    line document is claimed with find_one_and_delete before it is added,
+    so concurrent migrations of the same user (the backfill and the fallback
+    in several workers) never add a line twice; if the process dies between
+    the claim and the add, that one line is lost rather than doubled. The
+    embedded cart is then marked as migrated.
+
+    Returns:
+        int: Number of lines migrated
+    """
+    from ..db import get_cart_collection, get_carts_collection
+
+    cart_collection = get_cart_collection()
+    carts_collection = get_carts_collection()
+    embedded = CART_STORES["embedded"]
+    migrated = 0
+    while True:
+        line = cart_collection.find_one_and_delete(
+            {"user_email": user_email},
+            projection={"product_id": 1, "quantity": 1, "updated_at": 1}
+        )
+        if line is None:
+            break
+        embedded._add(user_email, line["product_id"], line["quantity"], updated_at=line.get("updated_at"))
+        migrated += 1
+
+    try:
+        carts_collection.update_one(
+            {"_id": user_email},
+            {"$set": {"migrated": True}, "$setOnInsert": {"items": [], "updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # A concurrent add or migration created the cart first
+        carts_collection.update_one({"_id": user_email}, {"$set": {"migrated": True}})
+    return migrated
+
+
+def migrate_line_carts(batch_size=500):
+    """
+    Backfill every line-per-document cart into the embedded layout
+
+    Safe to run while the app serves traffic with CART_STORAGE=embedded
+    and CART_MIGRATION_FALLBACK on.
+
+    Yields:
+        tuple: (user_email, lines migrated) per user
+    """
+    from ..db import get_cart_collection
+
+    pipeline = [{"$group": {"_id": "$user_email"}}]
+    for group in get_cart_collection().aggregate(pipeline, allowDiskUse=True, batchSize=batch_size):
+        yield group["_id"], migrate_user_cart(group["_id"])
@@ -0,0 +1,19 @@
+from .cart_ops import get_cart_store
+
+
+def price_cart(user_email):
+    """
+    Resolve a user's cart against the products collection in one query
+
+    The cart lines are joined to their products with a $lookup aggregation,
+    so the cost is a single round trip regardless of the number of lines.
+    Lines whose product no longer exists are dropped.
+
+    Args:
+        user_email (str): Email of the cart owner
+
+    Returns:
+        tuple: (items, total) where items is a list of dicts with product
+            fields, quantity and subtotal, and total is the cart total
+    """
+    return get_cart_store().price(user_email)
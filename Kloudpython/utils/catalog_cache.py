@@ -0,0 +1,238 @@
+from flask import current_app
+from collections import OrderedDict
+import threading
+import time
+from .image_derivatives import srcset, thumbnail_url
+
+
+CATALOG_META_ID = "catalog"
+
+# Characters of the description rendered on the product grid (plus one so
+# the template can tell whether to add an ellipsis)
+DESCRIPTION_PREVIEW_LENGTH = 80
+
+# Fields rendered by the product grid
+PRODUCT_GRID_PROJECTION = {
+    "name": 1,
+    "price": 1,
+    "category": 1,
+    "image_url": 1,
+    "image_variants": 1,
+    "stock": 1,
+    "description": {"$substrCP": ["$description", 0, DESCRIPTION_PREVIEW_LENGTH + 1]}
+}
+
+
+def serialize_product(product):
+    """
+    Convert a product document to the dict shape used by the templates
+
+    Args:
+        product (dict): Product document from MongoDB
+
+    Returns:
+        dict: Product with a string id and defaulted optional fields
+    """
+    variants = product.get("image_variants") or {}
+    return {
+        "id": str(product["_id"]),
+        "name": product["name"],
+        "price": product["price"],
+        "category": product.get("category", ""),
+        "description": product.get("description", ""),
+        "image_url": product.get("image_url", ""),
+        "stock": product.get("stock"),
+        "image_thumbnail_url": thumbnail_url(product),
+        "image_webp_srcset": srcset(variants.get("webp", [])),
+        "image_jpeg_srcset": srcset(variants.get("jpeg", []))
+    }
+
+
+def get_catalog_version():
+    """
+    Read the current catalog version counter
+
+    Returns:
+        int: Catalog version, 0 if the catalog has never been written
+    """
+    from ..db import get_meta_collection
+
+    meta = get_meta_collection().find_one({"_id": CATALOG_META_ID}, {"version": 1})
+    return meta.get("version", 0) if meta else 0
+
+
+def bump_catalog_version():
+    """
+    Increment the catalog version so every worker reloads its cache.
+    Call this after any write to the products collection.
+
+    Returns:
+        int: The new catalog version
+    """
+    from ..db import get_meta_collection
+    from pymongo import ReturnDocument
+
+    meta = get_meta_collection().find_one_and_update(
+        {"_id": CATALOG_META_ID},
+        {"$inc": {"version": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    catalog_cache.invalidate()
+    return meta["version"]
+
+
+def load_full_catalog():
+    """Load every product from MongoDB"""
+    from ..db import get_products_collection
+
+    return [serialize_product(product) for product in get_products_collection().find()]
+
+
+def load_product_page(sort_field, direction, after, before, limit, category=None):
+    """Load one keyset page of the product grid (optionally one category) from MongoDB"""
+    from ..db import get_products_collection
+    from .pagination import keyset_page
+
+    query = {"category": category} if category else {}
+    page = keyset_page(
+        get_products_collection(), query, sort_field, direction,
+        after=after, before=before, limit=limit,
+        projection=PRODUCT_GRID_PROJECTION
+    )
+    page["items"] = [serialize_product(product) for product in page["items"]]
+    return page
+
+
+def load_categories():
+    """Distinct non-empty product categories, sorted"""
+    from ..db import get_products_collection
+
+    return sorted(category for category in get_products_collection().distinct("category") if category)
+
+
+class CatalogCache:
+    """
+    Per-process cache of catalog reads (the full catalog and grid pages).
+
+    Every entry is tied to the catalog version stored in the meta collection.
+    The version is re-read at most once per CATALOG_VERSION_CHECK_INTERVAL
+    seconds, and all entries are dropped when the version changes or they are
+    older than CATALOG_CACHE_MAX_AGE seconds. At most CATALOG_CACHE_MAX_ENTRIES
+    entries are kept, least recently used first out.
+    """
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.version = None
+        self.loaded_at = 0.0
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _config(self, key, default):
+        try:
+            return current_app.config.get(key, default)
+        except RuntimeError:
+            # Outside an application context (e.g. warm-up scripts)
+            return default
+
+    def _validate(self):
+        """Drop all entries if the catalog version changed or they expired"""
+        now = time.monotonic()
+        max_age = self._config('CATALOG_CACHE_MAX_AGE', 300)
+        check_interval = self._config('CATALOG_VERSION_CHECK_INTERVAL', 1.0)
+
+        if self.version is not None and now - self.loaded_at < max_age:
+            if now - self.checked_at < check_interval:
+                return
+            version = get_catalog_version()
+            self.checked_at = now
+            if version == self.version:
+                return
+        else:
+            version = get_catalog_version()
+
+        self.entries.clear()
+        self.version = version
+        self.loaded_at = self.checked_at = now
+
+    def get(self, key, loader):
+        """
+        Get a cached value, calling loader() to fill it on a miss
+
+        Args:
+            key: Hashable cache key
+            loader (callable): Function that loads the value from MongoDB
+
+        Returns:
+            The cached value (shared, do not mutate)
+        """
+        with self._lock:
+            self._validate()
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+            version = self.version
+
+        value = loader()
+
+        with self._lock:
+            if self.version == version:
+                self.entries[key] = value
+                max_entries = self._config('CATALOG_CACHE_MAX_ENTRIES', 256)
+                while len(self.entries) > max_entries:
+                    self.entries.popitem(last=False)
+        return value
+
+    def current_version(self):
+        """
+        Catalog version the cached entries belong to (re-read as in get)
+
+        Returns:
+            int: Catalog version
+        """
+        with self._lock:
+            self._validate()
+            return self.version
+
+    def get_products(self):
+        """
+        Get the full serialized catalog
+
+        Returns:
+            list: Serialized products (shared, do not mutate)
+        """
+        return self.get("all", load_full_catalog)
+
+    def get_page(self, sort_field="_id", direction=1, after=None, before=None, limit=24, category=None):
+        """
+        Get one keyset page of the product grid
+
+        Returns:
+            dict: items, next_cursor and prev_cursor
+        """
+        key = ("page", sort_field, direction, after, before, limit, category)
+        return self.get(key, lambda: load_product_page(sort_field, direction, after, before, limit, category))
+
+    def get_categories(self):
+        """
+        Get the product categories for the grid filter
+
+        Returns:
+            list: Category names (shared, do not mutate)
+        """
+        return self.get("categories", load_categories)
+
+    def warm(self, limit=24):
+        """Load the first page of the product grid eagerly, e.g. at worker startup"""
+        return len(self.get_page(limit=limit)["items"])
+
+    def invalidate(self):
+        """Drop every cached entry so the next read reloads it"""
+        with self._lock:
+            self.entries.clear()
+            self.version = None
+
+
+# Global catalog cache instance
+catalog_cache = CatalogCache()
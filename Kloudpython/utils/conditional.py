@@ -0,0 +1,85 @@
+from flask import current_app, request, session, g, make_response
+import hashlib
+import os
+
+
+def _page_salt():
+    """
+    Hash of the templates and static manifest, so a deploy changes every ETag
+
+    Computed once per process from file contents, so every worker of the
+    same deploy produces the same value.
+    """
+    salt = current_app.extensions.get('page_etag_salt')
+    if salt is None:
+        digest = hashlib.sha256()
+        for filename, version in sorted(current_app.extensions.get('static_assets', {}).items()):
+            digest.update(f"{filename}={version};".encode())
+        template_folder = os.path.join(current_app.root_path, current_app.template_folder)
+        for root, dirs, files in os.walk(template_folder):
+            dirs.sort()
+            for name in sorted(files):
+                with open(os.path.join(root, name), "rb") as template_file:
+                    digest.update(name.encode())
+                    digest.update(template_file.read())
+        salt = digest.hexdigest()
+        current_app.extensions['page_etag_salt'] = salt
+    return salt
+
+
+def page_etag(*versions):
+    """
+    ETag of a rendered page from the versions of the data it shows
+
+    The logged-in user is always part of the tag (the navbar depends on
+    it), as is the request URL with its query string.
+
+    Args:
+        *versions: Values that change whenever the page content changes
+
+    Returns:
+        str: Hex digest usable as a strong ETag
+    """
+    parts = [_page_salt(), session.get("user", ""), request.full_path] + [str(version) for version in versions]
+    return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()[:32]
+
+
+def not_modified(etag):
+    """
+    304 response if the client's copy of the page is current
+
+    Call before loading or rendering anything. Pages with pending flash
+    messages are never answered from the client's cache (the messages
+    would be lost), and are not tagged either.
+
+    Returns:
+        Response: 304 response, or None if the page must be rendered
+    """
+    if session.get("_flashes"):
+        g.skip_page_etag = True
+        return None
+    if request.if_none_match.contains(etag):
+        response = make_response("", 304)
+        return tag_page(response, etag)
+    return None
+
+
+def tag_page(response, etag):
+    """
+    Set the ETag and revalidation headers on a rendered page
+
+    Args:
+        response: Response or rendered template string
+        etag (str): Tag from page_etag
+
+    Returns:
+        Response: The response with the ETag set
+    """
+    response = make_response(response)
+    if g.get("skip_page_etag"):
+        return response
+    response.set_etag(etag)
+    # Per-user pages: only the browser may keep them, and must revalidate
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
@@ -0,0 +1,44 @@
+# Standard library modules the MongoDB driver and Flask-Mail block on
+REQUIRED_PATCHES = ("socket", "ssl", "select", "threading", "time")
+
+
+def _is_gevent_lock(lock):
+    return type(lock).__module__.startswith("gevent")
+
+
+def cooperative_problems():
+    """
+    Check that this process is safe to run under gevent workers
+
+    PyMongo and Flask-Mail (smtplib) only yield to other greenlets if the
+    standard library was monkey-patched before they, and the module-level
+    locks of this app, were imported. An unpatched lock held across a
+    MongoDB round trip would block the whole worker.
+
+    Returns:
+        list: Problems found (empty when the process is cooperative)
+    """
+    try:
+        from gevent import monkey
+    except ImportError:
+        return ["gevent is not installed"]
+
+    problems = [
+        f"{module} is not monkey-patched" for module in REQUIRED_PATCHES
+        if not monkey.is_module_patched(module)
+    ]
+
+    from ..db import db
+    from .catalog_cache import catalog_cache
+    from . import email_helper
+
+    # Created when db.py (which imports pymongo) and the caches were imported
+    locks = {
+        "MongoDB client": db._lock,
+        "catalog cache": catalog_cache._lock,
+        "SMTP pool": email_helper._pool_lock
+    }
+    for name, lock in locks.items():
+        if not _is_gevent_lock(lock):
+            problems.append(f"{name} lock was created before monkey-patching")
+    return problems
@@ -1,35 +1,61 @@
 from flask_mail import Mail, Message
 from flask import current_app
 import os
+import threading
 from datetime import datetime
+from .smtp_pool import SMTPConnectionPool
+from .metrics import SMTP_SEND_SECONDS, SMTP_MESSAGES
 
 
-def send_receipt_email(user_email, order_data, pdf_path):
+_pool_lock = threading.Lock()
+
+
+def get_smtp_pool():
+    """
+    Get the SMTP connection pool of the current app, creating it on first use
+
+    Returns:
+        SMTPConnectionPool: Pool bound to the app's Flask-Mail settings
+    """
+    pool = current_app.extensions.get('smtp_pool')
+    if pool is None:
+        with _pool_lock:
+            pool = current_app.extensions.get('smtp_pool')
+            if pool is None:
+                # Get initialized Flask-Mail instance (fallback to creating one if missing)
+                mail_state = current_app.extensions.get('mail') or Mail(current_app).state
+                pool = SMTPConnectionPool(
+                    mail_state,
+                    size=current_app.config.get('SMTP_POOL_SIZE', 2),
+                    max_messages=current_app.config.get('SMTP_MAX_MESSAGES_PER_CONNECTION', 100),
+                    keepalive_interval=current_app.config.get('SMTP_KEEPALIVE_INTERVAL', 30),
+                    max_idle=current_app.config.get('SMTP_MAX_IDLE', 300)
+                )
+                current_app.extensions['smtp_pool'] = pool
+    return pool
+
+
+def build_receipt_message(user_email, order_data, pdf_path):
     """
-    Send PDF receipt to user's email
+    Build the receipt email with the PDF attached
     
     Args:
-
         user_email (str): Recipient email address
         order_data (dict): Order information for email content
         pdf_path (str): Path to the PDF file to attach
     
     Returns:
-        bool: True if email sent successfully, False otherwise
+        Message: Flask-Mail message ready to send
     """
-    try:
-        # Get initialized Flask-Mail instance (fallback to creating one if missing)
-        mail = current_app.extensions.get('mail') or Mail(current_app)
-        
-        # Create message
-        msg = Message(
-            subject="Your KloudCart Order Receipt",
-            sender=current_app.config['MAIL_USERNAME'],
-            recipients=[user_email]
-        )
-        
-        # Email body
-        msg.body = f"""
+    # Create message
+    msg = Message(
+        subject="Your KloudCart Order Receipt",
+        sender=current_app.config['MAIL_USERNAME'],
+        recipients=[user_email]
+    )
+    
+    # Email body
+    msg.body = f"""
 Dear Valued Customer,
 
 Thank you for your order on KloudCart!
@@ -48,67 +74,124 @@ Thank you for shopping with KloudCart!
 Best regards,
 KloudCart Team
 support@kloudcart.com
-        """
-        
-        # HTML version of the email
-        msg.html = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                <h2 style="color: #2c3e50; border-bottom: 2px solid #3498db; padding-bottom: 10px;">
-                    Thank you for your order!
-                </h2>
-                
-                <p>Dear Valued Customer,</p>
-                
-                <p>Thank you for your order on <strong>KloudCart</strong>!</p>
-                
-                <div style="background-color: #f8f9fa; padding: 15px; border-radius: 5px; margin: 20px 0;">
-                    <h3 style="color: #2c3e50; margin-top: 0;">Order Details:</h3>
-                    <ul style="list-style: none; padding: 0;">
-                        <li><strong>Order ID:</strong> {order_data['order_id']}</li>
-                        <li><strong>Order Date:</strong> {order_data['current_date']}</li>
-                        <li><strong>Total Amount:</strong> ₹{order_data['total']:.2f}</li>
-                    </ul>
-                </div>
-                
-                <p>Your receipt is attached to this email. Please keep it for your records.</p>
-                
-                <p>If you have any questions about your order, please don't hesitate to contact our support team.</p>
-                
-                <p>Thank you for shopping with <strong>KloudCart</strong>!</p>
-                
-                <div style="margin-top: 30px; padding-top: 20px; border-top: 1px solid #eee;">
-                    <p style="color: #666; font-size: 14px;">
-                        Best regards,<br>
-                        <strong>KloudCart Team</strong><br>
-                        <a href="mailto:support@kloudcart.com" style="color: #3498db;">support@kloudcart.com</a>
-                    </p>
-                </div>
+    """
+    
+    # HTML version of the email
+    msg.html = f"""
+    <html>
+    <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+        <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+            <h2 style="color: #2c3e50; border-bottom: 2px solid #3498db; padding-bottom: 10px;">
+                Thank you for your order!
+            </h2>
+            
+            <p>Dear Valued Customer,</p>
+            
+            <p>Thank you for your order on <strong>KloudCart</strong>!</p>
+            
+            <div style="background-color: #f8f9fa; padding: 15px; border-radius: 5px; margin: 20px 0;">
+                <h3 style="color: #2c3e50; margin-top: 0;">Order Details:</h3>
+                <ul style="list-style: none; padding: 0;">
+                    <li><strong>Order ID:</strong> {order_data['order_id']}</li>
+                    <li><strong>Order Date:</strong> {order_data['current_date']}</li>
+                    <li><strong>Total Amount:</strong> ₹{order_data['total']:.2f}</li>
+                </ul>
             </div>
-        </body>
-        </html>
-        """
-        
-        # Attach PDF file (use direct filesystem open to support absolute paths in Docker)
-        if os.path.exists(pdf_path):
-            with open(pdf_path, 'rb') as pdf_file:
-                msg.attach(
-                    filename=f"KloudCart_Receipt_{order_data['order_id']}.pdf",
-                    content_type="application/pdf",
-                    data=pdf_file.read()
-                )
-        
-        # Send email
-        mail.send(msg)
-        
+            
+            <p>Your receipt is attached to this email. Please keep it for your records.</p>
+            
+            <p>If you have any questions about your order, please don't hesitate to contact our support team.</p>
+            
+            <p>Thank you for shopping with <strong>KloudCart</strong>!</p>
+            
+            <div style="margin-top: 30px; padding-top: 20px; border-top: 1px solid #eee;">
+                <p style="color: #666; font-size: 14px;">
+                    Best regards,<br>
+                    <strong>KloudCart Team</strong><br>
+                    <a href="mailto:support@kloudcart.com" style="color: #3498db;">support@kloudcart.com</a>
+                </p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """
+    
+    # Attach PDF file (use direct filesystem open to support absolute paths in Docker)
+    if os.path.exists(pdf_path):
+        with open(pdf_path, 'rb') as pdf_file:
+            msg.attach(
+                filename=f"KloudCart_Receipt_{order_data['order_id']}.pdf",
+                content_type="application/pdf",
+                data=pdf_file.read()
+            )
+    
+    return msg
+
+
+def send_receipt_email(user_email, order_data, pdf_path):
+    """
+    Send PDF receipt to user's email over a pooled SMTP connection
+    
+    Args:
+
+        user_email (str): Recipient email address
+        order_data (dict): Order information for email content
+        pdf_path (str): Path to the PDF file to attach
+    
+    Returns:
+        bool: True if email sent successfully, False otherwise
+    """
+    try:
+        msg = build_receipt_message(user_email, order_data, pdf_path)
+        with SMTP_SEND_SECONDS.labels("single").time():
+            get_smtp_pool().send(msg)
+        SMTP_MESSAGES.labels("sent").inc()
         return True
         
     except Exception as e:
+        SMTP_MESSAGES.labels("failed").inc()
         current_app.logger.error(f"Failed to send email to {user_email}: {str(e)}")
         return False
 
 
+def send_receipt_emails(receipts):
+    """
+    Send many PDF receipts over one pooled SMTP session
+    
+    Args:
+        receipts (list): (user_email, order_data, pdf_path) tuples
+    
+    Returns:
+        list: True/False per receipt, in the same order
+    """
+    messages = []
+    results = []
+    for user_email, order_data, pdf_path in receipts:
+        try:
+            messages.append(build_receipt_message(user_email, order_data, pdf_path))
+            results.append(None)
+        except Exception as e:
+            current_app.logger.error(f"Failed to build email for {user_email}: {str(e)}")
+            results.append(False)
+
+    try:
+        with SMTP_SEND_SECONDS.labels("batch").time():
+            errors = iter(get_smtp_pool().send_many(messages))
+    except Exception as e:
+        current_app.logger.error(f"Failed to send receipt batch: {str(e)}")
+        errors = iter([e] * len(messages))
+
+    for i, (user_email, _, _) in enumerate(receipts):
+        if results[i] is None:
+            error = next(errors)
+            if error is not None:
+                current_app.logger.error(f"Failed to send email to {user_email}: {str(error)}")
+            results[i] = error is None
+    SMTP_MESSAGES.labels("sent").inc(results.count(True))
+    SMTP_MESSAGES.labels("failed").inc(results.count(False))
+    return results
+
+
 def get_user_email_from_db(user_email):
     """
     Get user email from MongoDB users collection
@@ -0,0 +1,199 @@
+from flask import current_app
+import os
+import tempfile
+from PIL import Image, ImageOps
+from .job_queue import job_handler, enqueue_job
+
+
+IMAGE_JOB = "image_derivatives"
+
+UPLOADS_URL_PREFIX = "/static/uploads/"
+
+# Widths generated for every uploaded product image
+DERIVATIVE_WIDTHS = (320, 640, 1280)
+
+# Output format -> (file extension, Pillow save options)
+DERIVATIVE_FORMATS = {
+    "webp": ("webp", {"quality": 80, "method": 4}),
+    "jpeg": ("jpg", {"quality": 82, "optimize": True, "progressive": True})
+}
+
+
+def uploads_directory():
+    """Absolute path of static/uploads"""
+    return os.path.join(current_app.root_path, 'static', 'uploads')
+
+
+def upload_path(image_url):
+    """
+    Resolve an /static/uploads/ URL to a file path
+
+    Returns:
+        str: Absolute path, or None for images outside static/uploads
+    """
+    if not image_url or not image_url.startswith(UPLOADS_URL_PREFIX):
+        return None
+    filename = os.path.basename(image_url)
+    if not filename or filename != image_url[len(UPLOADS_URL_PREFIX):]:
+        return None
+    return os.path.join(uploads_directory(), filename)
+
+
+def derivative_widths(original_width):
+    """Target widths for an image, never upscaling past the original"""
+    widths = [width for width in DERIVATIVE_WIDTHS if width < original_width]
+    widths.append(min(original_width, DERIVATIVE_WIDTHS[-1]))
+    return sorted(set(widths))
+
+
+def _save_atomic(image, path, image_format, options):
+    """Write an image to a temporary name and rename it into place"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    os.close(fd)
+    try:
+        image.save(tmp_path, format=image_format, **options)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def generate_derivatives(source_path):
+    """
+    Write fixed-width WebP and JPEG copies of an uploaded image
+
+    Files go to static/uploads/derived/<name>-<width>w.<ext>.
+
+    Args:
+        source_path (str): Path of the original upload
+
+    Returns:
+        dict: format -> list of {"width", "url"}, smallest first
+    """
+    output_dir = os.path.join(uploads_directory(), "derived")
+    os.makedirs(output_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+
+    with Image.open(source_path) as original:
+        # Phone photos are often stored sideways with an EXIF rotation
+        image = ImageOps.exif_transpose(original)
+        image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+
+        variants = {name: [] for name in DERIVATIVE_FORMATS}
+        for width in derivative_widths(image.width):
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.LANCZOS) if width != image.width else image
+
+            for name, (extension, options) in DERIVATIVE_FORMATS.items():
+                output = resized
+                if name == "jpeg" and output.mode == "RGBA":
+                    # JPEG has no alpha channel - flatten onto white
+                    output = Image.new("RGB", resized.size, (255, 255, 255))
+                    output.paste(resized, mask=resized.getchannel("A"))
+                filename = f"{stem}-{width}w.{extension}"
+                _save_atomic(output, os.path.join(output_dir, filename), name.upper(), options)
+                variants[name].append({"width": width, "url": f"{UPLOADS_URL_PREFIX}derived/{filename}"})
+
+    return variants
+
+
+def srcset(variants):
+    """Format a list of {"width", "url"} as an HTML srcset value"""
+    return ", ".join(f"{variant['url']} {variant['width']}w" for variant in variants)
+
+
+def thumbnail_url(product):
+    """Smallest JPEG derivative of a product image, or the original"""
+    jpeg_variants = (product.get("image_variants") or {}).get("jpeg")
+    return jpeg_variants[0]["url"] if jpeg_variants else product.get("image_url", "")
+
+
+def build_product_image_variants(product_id, image_url):
+    """
+    Generate the derivatives of a product image and record them on the product
+
+    The product is only updated if it still points at image_url, so a
+    slow job cannot overwrite the variants of a newer upload.
+
+    Returns:
+        bool: True if the product document was updated
+    """
+    from ..db import get_products_collection
+
+    source_path = upload_path(image_url)
+    if not source_path or not os.path.exists(source_path):
+        return False
+
+    variants = generate_derivatives(source_path)
+    result = get_products_collection().update_one(
+        {"_id": product_id, "image_url": image_url},
+        {"$set": {"image_variants": variants}}
+    )
+    return result.modified_count > 0
+
+
+@job_handler(IMAGE_JOB)
+def process_product_image(payload, final_attempt=True):
+    """
+    Generate the derivatives of an uploaded product image
+
+    Args:
+        payload (dict): product_id and image_url
+        final_attempt (bool): Unused; a failed image keeps serving the original
+    """
+    from .catalog_cache import bump_catalog_version
+
+    if build_product_image_variants(payload["product_id"], payload["image_url"]):
+        bump_catalog_version()
+
+
+def queue_image_derivatives(product_id, image_url):
+    """
+    Schedule derivative generation for a newly uploaded product image
+
+    With IMAGE_QUEUE_ENABLED off the images are processed inline instead,
+    which is useful for development setups without a worker process.
+    """
+    if not upload_path(image_url):
+        return
+
+    payload = {
+        "product_id": product_id,
+        "image_url": image_url
+    }
+
+    if not current_app.config.get('IMAGE_QUEUE_ENABLED', True):
+        try:
+            process_product_image(payload)
+        except Exception as e:
+            current_app.logger.error(f"Failed to generate image derivatives: {str(e)}")
+        return
+
+    enqueue_job(IMAGE_JOB, payload, max_attempts=current_app.config.get('JOB_MAX_ATTEMPTS', 5))
+
+
+def backfill_image_derivatives(force=False):
+    """
+    Generate derivatives for products whose images were uploaded earlier
+
+    Args:
+        force (bool): Regenerate products that already have variants
+
+    Yields:
+        tuple: (product_id, image_url, updated) per product
+    """
+    from ..db import get_products_collection
+
+    query = {"image_url": {"$regex": f"^{UPLOADS_URL_PREFIX}"}}
+    if not force:
+        query["image_variants"] = {"$exists": False}
+
+    products = list(get_products_collection().find(query, {"image_url": 1}))
+    for product in products:
+        try:
+            updated = build_product_image_variants(product["_id"], product["image_url"])
+        except Exception as e:
+            print(f"Failed to process {product['image_url']}: {e}")
+            updated = False
+        yield product["_id"], product["image_url"], updated
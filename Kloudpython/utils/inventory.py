@@ -0,0 +1,151 @@
+from pymongo import UpdateOne, ReturnDocument
+from bson import ObjectId
+from flask import current_app
+
+
+class OutOfStock(Exception):
+    """A product has less stock than the quantity ordered"""
+
+    def __init__(self, product_id, quantity):
+        super().__init__(f"Product {product_id} has fewer than {quantity} in stock")
+        self.product_id = product_id
+        self.quantity = quantity
+
+
+def stock_lines(items):
+    """
+    Quantities to reserve per stock-tracked product
+
+    Products without a stock field are not tracked (unlimited) and are
+    left out.
+
+    Args:
+        items (list): Priced cart items (see cart_ops.priced_items)
+
+    Returns:
+        list: (product ObjectId, quantity) tuples in _id order
+    """
+    quantities = {}
+    for item in items:
+        if item.get("stock") is None:
+            continue
+        product_id = ObjectId(item["id"])
+        quantities[product_id] = quantities.get(product_id, 0) + item["quantity"]
+    return sorted(quantities.items())
+
+
+def reserve_stock(items):
+    """
+    Take the ordered quantities out of stock, all or nothing
+
+    Every line is a conditional decrement ({stock: {$gte: qty}}), so
+    concurrent checkouts of the same product never need a lock and stock
+    never goes below zero. Lines are applied one at a time (one round trip
+    per stock-tracked product); the first that matches nothing is short,
+    and the lines applied before it are put back. A product that reaches
+    zero is flagged sold out and the catalog version bumped, so the grid
+    stops offering it.
+
+    Args:
+        items (list): Priced cart items (see cart_ops.priced_items)
+
+    Returns:
+        list: The reserved (product ObjectId, quantity) lines, to pass to
+            release_stock if the order cannot be completed
+
+    Raises:
+        OutOfStock: For the first product that could not be reserved
+    """
+    from ..db import get_products_collection
+    from .catalog_cache import bump_catalog_version
+
+    products_collection = get_products_collection()
+    reserved = []
+    sold_out = []
+    try:
+        for product_id, quantity in stock_lines(items):
+            product = products_collection.find_one_and_update(
+                {"_id": product_id, "stock": {"$gte": quantity}},
+                {"$inc": {"stock": -quantity}},
+                projection={"stock": 1},
+                return_document=ReturnDocument.AFTER
+            )
+            if product is None:
+                # Too little stock, or the product was deleted after pricing
+                raise OutOfStock(product_id, quantity)
+            reserved.append((product_id, quantity))
+            if product["stock"] == 0:
+                sold_out.append(product_id)
+    except Exception:
+        release_stock(reserved)
+        raise
+
+    newly_sold_out = [product_id for product_id in sold_out if mark_sold_out(product_id)]
+    if newly_sold_out:
+        bump_catalog_version()
+    return reserved
+
+
+def mark_sold_out(product_id):
+    """
+    Record that a product ran out of stock
+
+    Returns:
+        bool: True for the one caller that saw it sell out (the flag is
+            cleared when an admin sets the stock again)
+    """
+    from ..db import get_products_collection
+
+    result = get_products_collection().update_one(
+        {"_id": product_id, "stock": 0, "sold_out": {"$ne": True}},
+        {"$set": {"sold_out": True}}
+    )
+    return result.modified_count == 1
+
+
+def release_stock(lines):
+    """
+    Put reserved quantities back in stock
+
+    Args:
+        lines (list): (product ObjectId, quantity) tuples from reserve_stock
+    """
+    from ..db import get_products_collection
+    from .catalog_cache import bump_catalog_version
+
+    if not lines:
+        return
+    products_collection = get_products_collection()
+    try:
+        products_collection.bulk_write([
+            UpdateOne({"_id": product_id, "stock": {"$exists": True}}, {"$inc": {"stock": quantity}})
+            for product_id, quantity in lines
+        ], ordered=False)
+        # Products this reservation sold out are back in stock
+        restocked = products_collection.update_many(
+            {"_id": {"$in": [product_id for product_id, _ in lines]}, "sold_out": True, "stock": {"$gt": 0}},
+            {"$unset": {"sold_out": ""}}
+        )
+    except Exception as e:
+        current_app.logger.error(f"Failed to release reserved stock {lines}: {str(e)}")
+        raise
+    if restocked.modified_count:
+        # Show them as available on the product grid again
+        bump_catalog_version()
+
+
+def stock_levels():
+    """
+    Live stock of every stock-tracked product
+
+    Checkouts change stock without bumping the catalog version (only a
+    product selling out does), so pages that show stock counts read them
+    here instead of from the catalog cache.
+
+    Returns:
+        dict: Product id (str) -> units in stock
+    """
+    from ..db import get_products_collection
+
+    products = get_products_collection().find({"stock": {"$exists": True}}, {"stock": 1})
+    return {str(product["_id"]): product["stock"] for product in products}
@@ -0,0 +1,192 @@
+from flask import current_app
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+import os
+import socket
+import time
+
+
+# Registered job handlers: job type -> callable(payload, final_attempt)
+JOB_HANDLERS = {}
+
+# Called when a job gives up: job type -> callable(payload, error)
+JOB_FAILURE_HANDLERS = {}
+
+
+def job_handler(job_type):
+    """
+    Register a function as the handler for a job type
+
+    The handler receives the job payload and a final_attempt flag, and
+    raises an exception to signal a failure that should be retried.
+    """
+    def decorator(func):
+        JOB_HANDLERS[job_type] = func
+        return func
+    return decorator
+
+
+def job_failure_handler(job_type):
+    """
+    Register a function to run once a job of this type has failed for good
+
+    It receives the job payload and the last error, whatever that error
+    was (including a missing job handler), so it can record the failure.
+    """
+    def decorator(func):
+        JOB_FAILURE_HANDLERS[job_type] = func
+        return func
+    return decorator
+
+
+def enqueue_job(job_type, payload, max_attempts=5):
+    """
+    Add a job to the durable jobs collection
+
+    Args:
+        job_type (str): Registered handler name
+        payload (dict): Data passed to the handler
+        max_attempts (int): Attempts before the job is marked failed
+
+    Returns:
+        ObjectId: Id of the queued job
+    """
+    from ..db import get_jobs_collection
+
+    now = datetime.utcnow()
+    result = get_jobs_collection().insert_one({
+        "type": job_type,
+        "payload": payload,
+        "status": "queued",
+        "attempts": 0,
+        "max_attempts": max_attempts,
+        "run_at": now,
+        "created_at": now,
+        "locked_by": None,
+        "locked_at": None,
+        "last_error": None
+    })
+    return result.inserted_id
+
+
+def claim_next_job(worker_id, lock_timeout=300):
+    """
+    Atomically claim the next due job
+
+    Jobs left in the running state by a crashed worker are reclaimed once
+    their lock is older than lock_timeout seconds.
+
+    Returns:
+        dict: The claimed job document, or None if nothing is due
+    """
+    from ..db import get_jobs_collection
+
+    now = datetime.utcnow()
+    return get_jobs_collection().find_one_and_update(
+        {"$or": [
+            {"status": "queued", "run_at": {"$lte": now}},
+            {"status": "running", "locked_at": {"$lt": now - timedelta(seconds=lock_timeout)}}
+        ]},
+        {
+            "$set": {"status": "running", "locked_by": worker_id, "locked_at": now},
+            "$inc": {"attempts": 1}
+        },
+        sort=[("run_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def retry_delay(attempts, base=5, cap=600):
+    """Exponential backoff in seconds for the given attempt number"""
+    return min(cap, base * 2 ** max(0, attempts - 1))
+
+
+def complete_job(job):
+    """Mark a claimed job as done (deleted after db.DONE_JOB_RETENTION_SECONDS)"""
+    from ..db import get_jobs_collection
+
+    get_jobs_collection().update_one(
+        {"_id": job["_id"]},
+        {"$set": {"status": "done", "finished_at": datetime.utcnow(), "locked_by": None, "locked_at": None}}
+    )
+
+
+def fail_job(job, error, base_delay=5):
+    """
+    Record a failed attempt, rescheduling the job with backoff or marking it
+    failed once max_attempts is reached
+
+    Returns:
+        bool: True if the job will be retried
+    """
+    from ..db import get_jobs_collection
+
+    retry = job["attempts"] < job.get("max_attempts", 5)
+    update = {
+        "status": "queued" if retry else "failed",
+        "last_error": str(error),
+        "locked_by": None,
+        "locked_at": None
+    }
+    if retry:
+        update["run_at"] = datetime.utcnow() + timedelta(seconds=retry_delay(job["attempts"], base_delay))
+    else:
+        update["finished_at"] = datetime.utcnow()
+
+    get_jobs_collection().update_one({"_id": job["_id"]}, {"$set": update})
+    return retry
+
+
+def run_job(job, retry_base_delay=5):
+    """
+    Run a claimed job through its handler and record the outcome
+
+    Returns:
+        bool: True if the handler succeeded
+    """
+    handler = JOB_HANDLERS.get(job["type"])
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for job type '{job['type']}'")
+        handler(job["payload"], final_attempt=job["attempts"] >= job.get("max_attempts", 5))
+    except Exception as e:
+        retry = fail_job(job, e, retry_base_delay)
+        log = current_app.logger.warning if retry else current_app.logger.error
+        log(f"Job {job['_id']} ({job['type']}) failed on attempt {job['attempts']}: {e}"
+            f"{' - will retry' if retry else ' - giving up'}")
+        on_failure = JOB_FAILURE_HANDLERS.get(job["type"])
+        if not retry and on_failure is not None:
+            try:
+                on_failure(job["payload"], e)
+            except Exception as failure_error:
+                current_app.logger.error(f"Failure handler of job {job['_id']} ({job['type']}) failed: {failure_error}")
+        return False
+
+    complete_job(job)
+    return True
+
+
+def run_worker(poll_interval=1.0, lock_timeout=300, retry_base_delay=5, once=False):
+    """
+    Process jobs until interrupted
+
+    Must be called inside an application context so handlers can use the
+    app configuration and extensions.
+
+    Args:
+        poll_interval (float): Seconds to sleep when no job is due
+        lock_timeout (int): Seconds after which a running job is reclaimed
+        retry_base_delay (int): Backoff in seconds after the first failure
+        once (bool): Return as soon as the queue has no due jobs
+    """
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    current_app.logger.info(f"Job worker {worker_id} started")
+
+    while True:
+        job = claim_next_job(worker_id, lock_timeout)
+        if job is None:
+            if once:
+                return
+            time.sleep(poll_interval)
+            continue
+        run_job(job, retry_base_delay)
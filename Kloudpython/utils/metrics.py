@@ -0,0 +1,91 @@
+from prometheus_client import (
+    CollectorRegistry, Counter, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, multiprocess
+)
+from flask import g, request
+import os
+import time
+
+# With PROMETHEUS_MULTIPROC_DIR set (before this module is imported), every
+# process writes its samples to files there and /metrics sums them, so a
+# scrape sees all gunicorn workers no matter which one answers it.
+
+REQUEST_SECONDS = Histogram(
+    "kloudcart_http_request_duration_seconds",
+    "Request latency by Flask endpoint",
+    ["endpoint", "method"]
+)
+REQUESTS = Counter(
+    "kloudcart_http_requests_total",
+    "Requests by Flask endpoint and status code",
+    ["endpoint", "method", "status"]
+)
+
+MONGO_COMMAND_SECONDS = Histogram(
+    "kloudcart_mongo_command_duration_seconds",
+    "MongoDB command round trips by collection (failed commands included)",
+    ["command", "collection"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+MONGO_COMMAND_FAILURES = Counter(
+    "kloudcart_mongo_command_failures_total",
+    "MongoDB commands that returned an error, by collection",
+    ["command", "collection"]
+)
+
+PDF_RENDER_SECONDS = Histogram(
+    "kloudcart_receipt_pdf_render_seconds",
+    "Time to render one receipt PDF",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+
+SMTP_SEND_SECONDS = Histogram(
+    "kloudcart_smtp_send_seconds",
+    "Time to hand receipt emails to the SMTP server, per call",
+    ["mode"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+SMTP_MESSAGES = Counter(
+    "kloudcart_smtp_messages_total",
+    "Receipt emails handed to the SMTP server",
+    ["outcome"]
+)
+
+
+def metrics_registry():
+    """
+    Registry to export: all processes' samples in multiprocess mode,
+    otherwise this process's default registry
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def render_metrics():
+    """
+    Current metrics in the Prometheus text format
+
+    Returns:
+        tuple: (body bytes, content type)
+    """
+    return generate_latest(metrics_registry()), CONTENT_TYPE_LATEST
+
+
+def init_request_metrics(app):
+    """Time every request and count it by endpoint and status"""
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.pop("request_started", None)
+        if started is not None:
+            # Unrouted requests (404s) share one label to keep cardinality bounded
+            endpoint = request.endpoint or "unmatched"
+            REQUEST_SECONDS.labels(endpoint, request.method).observe(time.perf_counter() - started)
+            REQUESTS.labels(endpoint, request.method, str(response.status_code)).inc()
+        return response
@@ -0,0 +1,119 @@
+from bson import json_util, ObjectId
+from bson.errors import BSONError
+from datetime import datetime
+import base64
+import binascii
+
+# Types a cursor position may hold; anything else (e.g. a {"$ne": ...}
+# document smuggled into a crafted token) is rejected
+CURSOR_VALUE_TYPES = (str, int, float, bool, ObjectId, datetime, type(None))
+
+
+def encode_cursor(doc, sort_field):
+    """
+    Encode the keyset position of a document as an opaque URL-safe token
+
+    Args:
+        doc (dict): Document at the page boundary
+        sort_field (str): Field the page is sorted on
+
+    Returns:
+        str: Cursor token
+    """
+    position = [doc.get(sort_field), doc["_id"]]
+    raw = json_util.dumps(position).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token):
+    """
+    Decode a cursor token produced by encode_cursor
+
+    Args:
+        token (str): Cursor token
+
+    Returns:
+        tuple: (sort value, _id), or None if the token is invalid (the
+            caller then serves the first page)
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        value, doc_id = json_util.loads(raw.decode("utf-8"))
+    except (ValueError, TypeError, binascii.Error, BSONError):
+        return None
+    if not isinstance(value, CURSOR_VALUE_TYPES) or not isinstance(doc_id, CURSOR_VALUE_TYPES):
+        return None
+    return value, doc_id
+
+
+def clamp_page_size(value, default, maximum):
+    """Parse a requested page size and clamp it to [1, maximum]"""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, maximum))
+
+
+def keyset_page(collection, query, sort_field, direction=1, after=None, before=None, limit=20, projection=None):
+    """
+    Fetch one page of documents using keyset (seek) pagination
+
+    Pages are ordered on (sort_field, _id) so ties on non-unique sort keys
+    are broken deterministically. The cost of a page depends only on the
+    page size, provided an index exists on the sort key.
+
+    Args:
+        collection: PyMongo collection to query
+        query (dict): Base filter
+        sort_field (str): Field to order on
+        direction (int): 1 for ascending, -1 for descending
+        after (str): Cursor of the last item of the previous page (next page)
+        before (str): Cursor of the first item of the following page (previous page)
+        limit (int): Page size
+        projection (dict): Fields to return; the sort field is always included
+
+    Returns:
+        dict: items, next_cursor and prev_cursor (None when there is no such page)
+    """
+    backwards = before is not None and after is None
+    token = before if backwards else after
+    position = decode_cursor(token) if token else None
+
+    sort_dir = -direction if backwards else direction
+    criteria = query
+    if position is not None:
+        value, last_id = position
+        op = "$gt" if sort_dir == 1 else "$lt"
+        if sort_field == "_id":
+            keyset = {"_id": {op: last_id}}
+        else:
+            keyset = {"$or": [
+                {sort_field: {op: value}},
+                {sort_field: value, "_id": {op: last_id}}
+            ]}
+        criteria = {"$and": [query, keyset]} if query else keyset
+
+    if sort_field == "_id":
+        sort = [("_id", sort_dir)]
+    else:
+        sort = [(sort_field, sort_dir), ("_id", sort_dir)]
+
+    if projection is not None and sort_field not in projection:
+        projection = dict(projection, **{sort_field: 1})
+
+    docs = list(collection.find(criteria, projection).sort(sort).limit(limit + 1))
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+
+    if backwards:
+        docs.reverse()
+        has_next, has_prev = position is not None, has_more
+    else:
+        has_next, has_prev = has_more, position is not None
+
+    return {
+        "items": docs,
+        "next_cursor": encode_cursor(docs[-1], sort_field) if docs and has_next else None,
+        "prev_cursor": encode_cursor(docs[0], sort_field) if docs and has_prev else None
+    }
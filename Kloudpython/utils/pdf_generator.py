@@ -4,9 +4,14 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.lib import colors
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app
 from datetime import datetime
+import copy
+import io
 import os
 import pytz
+from .metrics import PDF_RENDER_SECONDS
 
 
 def get_ist_time():
@@ -15,6 +20,251 @@ def get_ist_time():
     return datetime.now(ist)
 
 
+# Column widths shared by the items and total tables
+ITEM_COL_WIDTHS = [0.5*inch, 2.5*inch, 1.5*inch, 0.8*inch, 1.2*inch, 1.2*inch]
+
+
+class ReceiptRenderer:
+    """
+    Receipt PDF renderer with the styles and static flowables built once.
+
+    getSampleStyleSheet(), the ParagraphStyles, the TableStyles and the
+    parsed title/company/footer paragraphs are the same for every receipt,
+    so they are created in __init__ and only the order-specific tables are
+    built per receipt. ReportLab is pure Python and CPU-bound, so
+    render_many() can spread a batch over a process pool.
+    """
+
+    def __init__(self):
+        # Get styles
+        styles = getSampleStyleSheet()
+        
+        # Create custom styles
+        self.title_style = ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=24,
+            spaceAfter=30,
+            alignment=TA_CENTER,
+            textColor=colors.darkblue
+        )
+        
+        self.header_style = ParagraphStyle(
+            'Header',
+            parent=styles['Normal'],
+            fontSize=12,
+            spaceAfter=12,
+            alignment=TA_LEFT
+        )
+        
+        self.footer_style = ParagraphStyle(
+            'Footer',
+            parent=styles['Normal'],
+            fontSize=10,
+            alignment=TA_CENTER,
+            textColor=colors.grey
+        )
+        
+        self.order_table_style = TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ])
+        
+        self.items_table_style = TableStyle([
+            # Header row
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            
+            # Data rows
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 1), (-1, -1), 9),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
+        ])
+        
+        self.total_table_style = TableStyle([
+            ('ALIGN', (4, 0), (5, 0), 'RIGHT'),
+            ('FONTNAME', (4, 0), (5, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (4, 0), (5, 0), 12),
+            ('BACKGROUND', (4, 0), (5, 0), colors.lightblue),
+            ('TEXTCOLOR', (4, 0), (5, 0), colors.darkblue),
+            ('GRID', (4, 0), (5, 0), 1, colors.black),
+        ])
+        
+        # Static flowables (parsed once, copied per render because
+        # wrapping stores layout state on the paragraph)
+        self.title = Paragraph("KloudCart Receipt", self.title_style)
+        self.company_info = Paragraph(
+            "<b>KloudCart E-Commerce</b><br/>"
+            "Your Trusted Online Shopping Partner<br/>"
+            "Email: support@kloudcart.com",
+            self.header_style
+        )
+        self.footer = Paragraph(
+            "Thank you for shopping with KloudCart!<br/>"
+            "This is a computer-generated receipt.<br/>"
+            "For support, contact us at support@kloudcart.com",
+            self.footer_style
+        )
+        
+        self._executor = None
+        self._executor_pid = None
+
+    def build_elements(self, order_data):
+        """Build the flowables for one receipt"""
+        elements = [copy.copy(self.title), Spacer(1, 20), copy.copy(self.company_info), Spacer(1, 20)]
+        
+        # Order details
+        order_details = [
+            ["Order ID:", order_data.get('order_id', '')],
+            ["Customer:", order_data.get('user_email', '')],
+            ["Order Date:", order_data.get('current_date', get_ist_time().strftime("%B %d, %Y at %I:%M %p"))],
+            ["", ""]  # Empty row for spacing
+        ]
+        
+        order_table = Table(order_details, colWidths=[2*inch, 4*inch])
+        order_table.setStyle(self.order_table_style)
+        
+        elements.append(order_table)
+        elements.append(Spacer(1, 20))
+        
+        # Items table header
+        items_header = ["#", "Product Name", "Category", "Qty", "Unit Price (₹)", "Subtotal (₹)"]
+        
+        # Items data
+        items_data = [items_header]
+        for i, item in enumerate(order_data.get('items', []), 1):
+            items_data.append([
+                str(i),
+                item.get('name', ''),
+                item.get('category', 'N/A'),
+                str(item.get('quantity', 0)),
+                f"{float(item.get('price', 0)):.2f}",
+                f"{float(item.get('subtotal', 0)):.2f}"
+            ])
+        
+        # Create items table
+        items_table = Table(items_data, colWidths=ITEM_COL_WIDTHS)
+        items_table.setStyle(self.items_table_style)
+        
+        elements.append(items_table)
+        elements.append(Spacer(1, 20))
+        
+        # Total section
+        total_amount = float(order_data.get('total', 0))
+        total_data = [
+            ["", "", "", "", "Total Amount:", f"₹{total_amount:.2f}"]
+        ]
+        
+        total_table = Table(total_data, colWidths=ITEM_COL_WIDTHS)
+        total_table.setStyle(self.total_table_style)
+        
+        elements.append(total_table)
+        elements.append(Spacer(1, 30))
+        
+        # Footer
+        elements.append(copy.copy(self.footer))
+        return elements
+
+    def render(self, order_data, output_path):
+        """
+        Render one receipt
+
+        Args:
+            order_data (dict): Order information (see generate_receipt_pdf)
+            output_path (str): Path where PDF should be saved
+
+        Returns:
+            str: Path to the generated PDF file
+        """
+        # Ensure output directory exists
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+        # Create the PDF document
+        doc = SimpleDocTemplate(output_path, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18, invariant=True)
+        with PDF_RENDER_SECONDS.time():
+            doc.build(self.build_elements(order_data))
+        
+        return output_path
+
+    def render_bytes(self, order_data):
+        """
+        Render one receipt in memory
+
+        Output is deterministic (invariant mode), so the same order always
+        produces the same bytes and can be stored under its content hash.
+
+        Returns:
+            bytes: The PDF document
+        """
+        buffer = io.BytesIO()
+        doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18, invariant=True)
+        with PDF_RENDER_SECONDS.time():
+            doc.build(self.build_elements(order_data))
+        return buffer.getvalue()
+
+    def render_many(self, jobs, processes=None, chunksize=4):
+        """
+        Render many receipts in parallel on a process pool
+
+        Args:
+            jobs (list): (order_data, output_path) tuples
+            processes (int): Worker processes (default: CPU count); 1 renders
+                serially in this process
+            chunksize (int): Jobs handed to a worker at a time
+
+        Returns:
+            list: Paths of the generated PDF files, in job order
+        """
+        if processes == 1:
+            return [self.render(order_data, output_path) for order_data, output_path in jobs]
+
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ProcessPoolExecutor(max_workers=processes, initializer=_init_render_worker)
+            self._executor_pid = os.getpid()
+        return list(self._executor.map(_render_job, jobs, chunksize=chunksize))
+
+    def close(self):
+        """Shut down the rendering process pool, if one was started"""
+        if self._executor is not None and self._executor_pid == os.getpid():
+            self._executor.shutdown()
+        self._executor = None
+        self._executor_pid = None
+
+
+# Renderer owned by each process-pool worker
+_worker_renderer = None
+
+
+def _init_render_worker():
+    global _worker_renderer
+    _worker_renderer = ReceiptRenderer()
+
+
+def _render_job(job):
+    order_data, output_path = job
+    return _worker_renderer.render(order_data, output_path)
+
+
+_renderer = None
+
+
+def get_receipt_renderer():
+    """Get the shared renderer of this process, building it on first use"""
+    global _renderer
+    if _renderer is None:
+        _renderer = ReceiptRenderer()
+    return _renderer
+
+
 def generate_receipt_pdf(order_data, output_path):
     """
     Generate a PDF receipt for an order
@@ -31,153 +281,21 @@ def generate_receipt_pdf(order_data, output_path):
     Returns:
         str: Path to the generated PDF file
     """
-    
-    # Ensure output directory exists
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-
-    # Create the PDF document
-    doc = SimpleDocTemplate(output_path, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
-    
-    # Container for the 'Flowable' objects
-    elements = []
-    
-    # Get styles
-    styles = getSampleStyleSheet()
-    
-    # Create custom styles
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        spaceAfter=30,
-        alignment=TA_CENTER,
-        textColor=colors.darkblue
-    )
-    
-    header_style = ParagraphStyle(
-        'Header',
-        parent=styles['Normal'],
-        fontSize=12,
-        spaceAfter=12,
-        alignment=TA_LEFT
-    )
-    
-    # Title
-    title = Paragraph("KloudCart Receipt", title_style)
-    elements.append(title)
-    elements.append(Spacer(1, 20))
-    
-    # Company info
-    company_info = Paragraph(
-        "<b>KloudCart E-Commerce</b><br/>"
-        "Your Trusted Online Shopping Partner<br/>"
-        "Email: support@kloudcart.com",
-        header_style
-    )
-    elements.append(company_info)
-    elements.append(Spacer(1, 20))
-    
-    # Order details
-    order_details = [
-        ["Order ID:", order_data.get('order_id', '')],
-        ["Customer:", order_data.get('user_email', '')],
-        ["Order Date:", order_data.get('current_date', get_ist_time().strftime("%B %d, %Y at %I:%M %p"))],
-        ["", ""]  # Empty row for spacing
-    ]
-    
-    order_table = Table(order_details, colWidths=[2*inch, 4*inch])
-    order_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-    ]))
-    
-    elements.append(order_table)
-    elements.append(Spacer(1, 20))
-    
-    # Items table header
-    items_header = ["#", "Product Name", "Category", "Qty", "Unit Price (₹)", "Subtotal (₹)"]
-    
-    # Items data
-    items_data = [items_header]
-    for i, item in enumerate(order_data.get('items', []), 1):
-        items_data.append([
-            str(i),
-            item.get('name', ''),
-            item.get('category', 'N/A'),
-            str(item.get('quantity', 0)),
-            f"{float(item.get('price', 0)):.2f}",
-            f"{float(item.get('subtotal', 0)):.2f}"
-        ])
-    
-    # Create items table
-    items_table = Table(items_data, colWidths=[0.5*inch, 2.5*inch, 1.5*inch, 0.8*inch, 1.2*inch, 1.2*inch])
-    items_table.setStyle(TableStyle([
-        # Header row
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        
-        # Data rows
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 9),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
-    ]))
-    
-    elements.append(items_table)
-    elements.append(Spacer(1, 20))
-    
-    # Total section
-    total_amount = float(order_data.get('total', 0))
-    total_data = [
-        ["", "", "", "", "Total Amount:", f"₹{total_amount:.2f}"]
-    ]
-    
-    total_table = Table(total_data, colWidths=[0.5*inch, 2.5*inch, 1.5*inch, 0.8*inch, 1.2*inch, 1.2*inch])
-    total_table.setStyle(TableStyle([
-        ('ALIGN', (4, 0), (5, 0), 'RIGHT'),
-        ('FONTNAME', (4, 0), (5, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (4, 0), (5, 0), 12),
-        ('BACKGROUND', (4, 0), (5, 0), colors.lightblue),
-        ('TEXTCOLOR', (4, 0), (5, 0), colors.darkblue),
-        ('GRID', (4, 0), (5, 0), 1, colors.black),
-    ]))
-    
-    elements.append(total_table)
-    elements.append(Spacer(1, 30))
-    
-    # Footer
-    footer_style = ParagraphStyle(
-        'Footer',
-        parent=styles['Normal'],
-        fontSize=10,
-        alignment=TA_CENTER,
-        textColor=colors.grey
-    )
-    
-    footer = Paragraph(
-        "Thank you for shopping with KloudCart!<br/>"
-        "This is a computer-generated receipt.<br/>"
-        "For support, contact us at support@kloudcart.com",
-        footer_style
-    )
-    elements.append(footer)
-    
-    # Build PDF
-    doc.build(elements)
-    
-    return output_path
+    return get_receipt_renderer().render(order_data, output_path)
 
 
 def create_receipts_directory():
-    """Create the receipts directory if it doesn't exist"""
-    receipts_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static', 'receipts')
+    """
+    Create the receipt store directory (RECEIPT_STORE_DIR) if it doesn't exist
+
+    It lies outside the static folder: receipts are only served by
+    send_order_receipt, after checking the order belongs to the user.
+    """
+    receipts_dir = current_app.config['RECEIPT_STORE_DIR']
     os.makedirs(receipts_dir, exist_ok=True)
     return receipts_dir
+
+
+def legacy_receipts_directory():
+    """Where receipts used to be written, one flat receipt_*.pdf per download"""
+    return os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static', 'receipts')
@@ -0,0 +1,302 @@
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from datetime import datetime
+import csv
+import io
+import json
+from ..models.user import Product
+
+# Columns of a product file, in export order. "id" is the product's
+# ObjectId: rows with one update that product (or create it with that id),
+# rows without one create a new product.
+PRODUCT_FIELDS = ["id", "name", "price", "category", "description", "image_url", "stock"]
+PRODUCT_FORMATS = ["csv", "jsonl"]
+DEFAULT_IMAGE_URL = "/static/images/placeholder.svg"
+
+
+def detect_format(filename, default="csv"):
+    """File format from a filename extension (csv, jsonl/ndjson), else default"""
+    extension = (filename or "").rsplit(".", 1)[-1].lower()
+    if extension in ("jsonl", "ndjson"):
+        return "jsonl"
+    if extension == "csv":
+        return "csv"
+    return default
+
+
+def parse_stock(value):
+    """
+    Parse a stock value from a form or an import row
+
+    Returns:
+        int: Units available, or None if left empty (stock not tracked)
+
+    Raises:
+        ValueError: If the value is not a whole number of at least 0
+    """
+    if isinstance(value, bool):
+        raise ValueError("stock must be a whole number")
+    if not isinstance(value, int):
+        value = (value or "").strip()
+        if not value:
+            return None
+        value = int(value)
+    if value < 0:
+        raise ValueError("stock must not be negative")
+    return value
+
+
+def parse_price(value):
+    """Parse a price (whole rupees, at least 0)"""
+    if isinstance(value, bool) or value is None:
+        raise ValueError("price is required")
+    if not isinstance(value, int):
+        value = int(str(value).strip())
+    if value < 0:
+        raise ValueError("price must not be negative")
+    return value
+
+
+def product_from_row(row):
+    """
+    Validate an import row into a Product
+
+    Args:
+        row (dict): Column name -> value (strings from CSV, JSON values from JSONL)
+
+    Returns:
+        tuple: (Product, whether the row sets the stock)
+
+    Raises:
+        ValueError: With a message for the admin if the row is invalid
+    """
+    from ..db import str_to_objectid
+
+    product_id = None
+    if row.get("id"):
+        product_id = str_to_objectid(str(row["id"]))
+        if not product_id:
+            raise ValueError(f"invalid id {row['id']!r}")
+
+    name = str(row.get("name") or "").strip()
+    if not name:
+        raise ValueError("name is required")
+    try:
+        price = parse_price(row.get("price"))
+    except ValueError:
+        raise ValueError(f"price must be a whole number of 0 or more, got {row.get('price')!r}")
+    try:
+        stock = parse_stock(row.get("stock"))
+    except (TypeError, ValueError):
+        raise ValueError(f"stock must be a whole number of 0 or more or empty, got {row.get('stock')!r}")
+
+    product = Product(
+        name,
+        price,
+        str(row.get("category") or "").strip(),
+        str(row.get("description") or ""),
+        str(row.get("image_url") or "").strip() or DEFAULT_IMAGE_URL,
+        product_id,
+        stock
+    )
+    return product, "stock" in row
+
+
+def read_product_rows(stream, file_format):
+    """
+    Parse a product file one row at a time
+
+    Args:
+        stream: Binary file object (an upload or an open file)
+        file_format (str): "csv" (with a header row) or "jsonl"
+
+    Yields:
+        tuple: (line number, row dict or None, error message or None)
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    try:
+        if file_format == "csv":
+            reader = csv.DictReader(text)
+            while True:
+                try:
+                    row = next(reader)
+                except StopIteration:
+                    return
+                except csv.Error as e:
+                    yield reader.line_num, None, f"malformed CSV: {e}"
+                    continue
+                yield reader.line_num, {key: value for key, value in row.items() if key is not None}, None
+        else:
+            for line_number, line in enumerate(text, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    yield line_number, None, f"malformed JSON: {e}"
+                    continue
+                if not isinstance(row, dict):
+                    yield line_number, None, "expected a JSON object"
+                    continue
+                yield line_number, row, None
+    finally:
+        # Leave the underlying stream to its owner
+        text.detach()
+
+
+def import_products(stream, file_format, batch_size=1000, max_errors=100):
+    """
+    Create or update products from a CSV or JSONL file
+
+    The file is read incrementally and written in batches of unordered
+    bulk_write upserts keyed on _id, so memory use does not depend on the
+    file size. Invalid rows are skipped and reported; the rest are written.
+    Products whose image changed get their derivatives queued.
+
+    Args:
+        stream: Binary file object
+        file_format (str): "csv" or "jsonl"
+        batch_size (int): Rows per bulk_write
+        max_errors (int): Row errors kept for the report (all are counted)
+
+    Returns:
+        dict: rows, created, updated, error_count and errors
+            ((line number, message) tuples)
+    """
+    from ..db import get_products_collection
+    from .catalog_cache import bump_catalog_version
+    from .image_derivatives import queue_image_derivatives
+
+    products_collection = get_products_collection()
+    summary = {"rows": 0, "created": 0, "updated": 0, "error_count": 0, "errors": []}
+
+    def row_error(line_number, message):
+        summary["error_count"] += 1
+        if len(summary["errors"]) < max_errors:
+            summary["errors"].append((line_number, message))
+
+    def write_batch(batch):
+        # Existing images, so variants of a replaced image are dropped
+        existing = {
+            doc["_id"]: doc.get("image_url")
+            for doc in products_collection.find(
+                {"_id": {"$in": [product._id for _, product, _ in batch]}}, {"image_url": 1}
+            )
+        }
+        requests = []
+        new_images = []
+        for _, product, sets_stock in batch:
+            fields = product.to_dict()
+            del fields["_id"], fields["created_at"]
+            unset = {}
+            if sets_stock:
+                unset["sold_out"] = ""
+                if product.stock is None:
+                    unset["stock"] = ""
+            if existing.get(product._id) != product.image_url:
+                new_images.append((product._id, product.image_url))
+                if product._id in existing:
+                    unset["image_variants"] = ""
+            update = {"$set": fields, "$setOnInsert": {"created_at": product.created_at}}
+            if unset:
+                update["$unset"] = unset
+            requests.append(UpdateOne({"_id": product._id}, update, upsert=True))
+
+        try:
+            result = products_collection.bulk_write(requests, ordered=False)
+            details = result.bulk_api_result
+        except BulkWriteError as e:
+            details = e.details
+            for error in details.get("writeErrors", []):
+                row_error(batch[error["index"]][0], error.get("errmsg", "write failed"))
+        summary["created"] += details.get("nUpserted", 0)
+        summary["updated"] += details.get("nMatched", 0)
+
+        for product_id, image_url in new_images:
+            queue_image_derivatives(product_id, image_url)
+
+    batch = []
+    for line_number, row, error in read_product_rows(stream, file_format):
+        summary["rows"] += 1
+        if error:
+            row_error(line_number, error)
+            continue
+        try:
+            product, sets_stock = product_from_row(row)
+        except ValueError as e:
+            row_error(line_number, str(e))
+            continue
+        batch.append((line_number, product, sets_stock))
+        if len(batch) >= batch_size:
+            write_batch(batch)
+            batch = []
+    if batch:
+        write_batch(batch)
+
+    if summary["created"] or summary["updated"]:
+        bump_catalog_version()
+    return summary
+
+
+def export_row(product):
+    """Product document -> export row (PRODUCT_FIELDS)"""
+    return {
+        "id": str(product["_id"]),
+        "name": product.get("name", ""),
+        "price": product.get("price", 0),
+        "category": product.get("category", ""),
+        "description": product.get("description", ""),
+        "image_url": product.get("image_url", ""),
+        "stock": product.get("stock")
+    }
+
+
+def iter_product_pages(batch_size=1000):
+    """
+    Page through all products in _id order, one query per page
+
+    Yields:
+        list: Product documents
+    """
+    from ..db import get_products_collection
+
+    products_collection = get_products_collection()
+    projection = {field: 1 for field in PRODUCT_FIELDS if field != "id"}
+    last_id = None
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        page = list(products_collection.find(query, projection).sort("_id", 1).limit(batch_size))
+        if not page:
+            return
+        yield page
+        last_id = page[-1]["_id"]
+
+
+def export_products(file_format, batch_size=1000):
+    """
+    Stream the catalog as CSV or JSONL, a page of products at a time
+
+    The output reads back with import_products.
+
+    Yields:
+        str: Chunks of the file
+    """
+    if file_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=PRODUCT_FIELDS, lineterminator="\n")
+        writer.writeheader()
+        yield buffer.getvalue()
+
+        for page in iter_product_pages(batch_size):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(export_row(product) for product in page)
+            yield buffer.getvalue()
+    else:
+        for page in iter_product_pages(batch_size):
+            yield "".join(json.dumps(export_row(product), ensure_ascii=False) + "\n" for product in page)
+
+
+def export_filename(file_format):
+    """Download name of an export, e.g. kloudcart-products-20261018.csv"""
+    return f"kloudcart-products-{datetime.utcnow().strftime('%Y%m%d')}.{file_format}"
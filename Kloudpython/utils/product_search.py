@@ -0,0 +1,187 @@
+from flask import current_app
+from collections import defaultdict
+import heapq
+import math
+import re
+import time
+from pymongo.errors import OperationFailure
+from .catalog_cache import catalog_cache, serialize_product, PRODUCT_GRID_PROJECTION, DESCRIPTION_PREVIEW_LENGTH
+
+
+# Relevance weight of each searchable field (same as the product_text index)
+FIELD_WEIGHTS = {"name": 10, "category": 5, "description": 1}
+
+STOPWORDS = {"a", "an", "and", "are", "for", "in", "of", "on", "or", "the", "to", "with"}
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Server error codes meaning $text cannot run here: no text index
+# (IndexNotFound, or NoQueryExecutionPlans on older servers) or no $text
+# support at all (CommandNotSupported). Other failures are not a reason
+# to switch backends.
+TEXT_SEARCH_UNSUPPORTED_CODES = {27, 115, 291}
+
+# time.monotonic() until which "auto" uses the in-process index, set when
+# $text turns out to be unsupported; the text index is tried again after it
+_text_search_unavailable_until = 0.0
+
+# (catalog version, ProductSearchIndex) of the in-process index. Kept out of
+# the catalog cache's LRU so grid pages and search results cannot evict it.
+_search_index = (None, None)
+
+
+def tokenize(text):
+    """
+    Split text into lowercase search terms
+
+    Stopwords are dropped and a trailing plural "s" is removed, roughly like
+    the stemming of MongoDB's english text index.
+    """
+    terms = []
+    for token in _TOKEN_PATTERN.findall((text or "").lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        terms.append(token)
+    return terms
+
+
+class ProductSearchIndex:
+    """
+    In-process inverted index over the catalog, for deployments without
+    text index support (e.g. some MongoDB-compatible services).
+
+    Maps each term to the products containing it with a field-weighted
+    frequency. A query only visits the postings of its own terms, so its
+    cost depends on how many products match, not on the catalog size.
+    """
+
+    def __init__(self, products):
+        self.products = []
+        self.categories = []
+        self.postings = defaultdict(dict)
+        for position, product in enumerate(products):
+            for field, weight in FIELD_WEIGHTS.items():
+                for term in tokenize(product.get(field)):
+                    posting = self.postings[term]
+                    posting[position] = posting.get(position, 0) + weight
+
+            # Keep only what the grid renders
+            preview = dict(product)
+            preview["description"] = (product.get("description") or "")[:DESCRIPTION_PREVIEW_LENGTH + 1]
+            self.products.append(preview)
+            self.categories.append(product.get("category", ""))
+
+    def search(self, q, category=None, offset=0, limit=24):
+        """
+        Rank products by tf-idf over the query terms (any term may match)
+
+        Returns:
+            tuple: (products, has_more)
+        """
+        scores = defaultdict(float)
+        total = len(self.products)
+        for term in set(tokenize(q)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + total / len(posting))
+            for position, weight in posting.items():
+                if category and self.categories[position] != category:
+                    continue
+                scores[position] += weight * idf
+
+        ranked = heapq.nlargest(offset + limit + 1, scores.items(), key=lambda item: (item[1], -item[0]))
+        page = ranked[offset:offset + limit]
+        return [self.products[position] for position, _ in page], len(ranked) > offset + limit
+
+
+def build_search_index():
+    """Build the in-process index from every product in MongoDB"""
+    from ..db import get_products_collection
+
+    # What the grid renders (stock included), with the full description to index
+    fields = dict(PRODUCT_GRID_PROJECTION, category=1, description=1)
+    return ProductSearchIndex(serialize_product(product) for product in get_products_collection().find({}, fields))
+
+
+def text_search(q, category=None, offset=0, limit=24):
+    """
+    Rank products with the product_text index
+
+    Returns:
+        tuple: (products, has_more)
+    """
+    from ..db import get_products_collection
+
+    query = {"$text": {"$search": q}}
+    if category:
+        query["category"] = category
+    projection = dict(PRODUCT_GRID_PROJECTION, score={"$meta": "textScore"})
+    cursor = get_products_collection().find(query, projection).sort(
+        [("score", {"$meta": "textScore"}), ("_id", 1)]
+    ).skip(offset).limit(limit + 1)
+    docs = list(cursor)
+    return [serialize_product(doc) for doc in docs[:limit]], len(docs) > limit
+
+
+def memory_search(q, category=None, offset=0, limit=24):
+    """Rank products with the in-process index (rebuilt when the catalog changes)"""
+    global _search_index
+
+    version = catalog_cache.current_version()
+    built_for, index = _search_index
+    if index is None or built_for != version:
+        # Tagged with the version read before building: a catalog change
+        # during the build is picked up by the next search
+        index = build_search_index()
+        _search_index = (version, index)
+    return index.search(q, category, offset, limit)
+
+
+def search_products(q, category=None, page=1, per_page=24):
+    """
+    Relevance-ranked product search
+
+    PRODUCT_SEARCH_BACKEND selects the MongoDB text index ("text"), the
+    in-process inverted index ("memory"), or the text index with the
+    in-process index as fallback when $text is unsupported ("auto").
+    Results are cached per catalog version like the product grid.
+
+    Args:
+        q (str): Search terms
+        category (str): Only return products of this category
+        page (int): 1-based result page (offset paging: scores have no keyset)
+        per_page (int): Results per page
+
+    Returns:
+        dict: items, page, has_next and backend
+    """
+    global _text_search_unavailable_until
+
+    backend = current_app.config.get('PRODUCT_SEARCH_BACKEND', 'auto')
+    if backend == "auto":
+        backend = "memory" if time.monotonic() < _text_search_unavailable_until else "text"
+
+    offset = (page - 1) * per_page
+    key = ("search", backend, q, category, page, per_page)
+    try:
+        if backend == "text":
+            items, has_next = catalog_cache.get(key, lambda: text_search(q, category, offset, per_page))
+        else:
+            items, has_next = catalog_cache.get(key, lambda: memory_search(q, category, offset, per_page))
+    except (OperationFailure, NotImplementedError) as e:
+        if current_app.config.get('PRODUCT_SEARCH_BACKEND', 'auto') != "auto":
+            raise
+        if isinstance(e, OperationFailure) and e.code not in TEXT_SEARCH_UNSUPPORTED_CODES:
+            raise
+        retry_after = current_app.config.get('PRODUCT_SEARCH_TEXT_RETRY_SECONDS', 300)
+        current_app.logger.warning(
+            f"Text search unavailable, using the in-process index for {retry_after}s: {str(e)}"
+        )
+        _text_search_unavailable_until = time.monotonic() + retry_after
+        backend = "memory"
+        items, has_next = memory_search(q, category, offset, per_page)
+
+    return {"items": items, "page": page, "has_next": has_next, "backend": backend}
@@ -0,0 +1,250 @@
+from pymongo import monitoring
+from flask import current_app, g, request
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+# Per-route MongoDB command budgets: endpoint -> most commands one request
+# may issue. Requests over budget are logged, or fail with
+# QueryBudgetExceeded when QUERY_BUDGET_STRICT is set (e.g. in tests).
+QUERY_BUDGETS = {
+    # +1 where the catalog cache may check the catalog version
+    "products.list_products": 5,
+    "products.cart": 3,
+    "products.add_to_cart": 2,
+    "products.increase_quantity": 2,
+    "products.decrease_quantity": 3,
+    "products.checkout": 1,
+    "products.confirm_order": 11,
+    "admin.admin_dashboard": 3,
+    "admin.admin_receipts": 3,
+    "admin.admin_analytics": 3,
+    "auth.login": 1,
+    "auth.register": 2
+}
+
+# Commands that naturally repeat within one operation
+REPEATABLE_COMMANDS = {"getMore", "endSessions", "killCursors"}
+
+# Fields holding the filter of each command
+FILTER_FIELDS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query"
+}
+
+_current_profile = ContextVar("query_profile", default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    """A request issued more MongoDB commands than its route's budget"""
+
+
+def value_shape(value):
+    """
+    Shape of a filter: field names and operators, with every value replaced
+    by "?", so queries that differ only in their values compare equal
+    """
+    if isinstance(value, dict):
+        return "{" + ", ".join(f"{key}: {value_shape(item)}" for key, item in value.items()) + "}"
+    if isinstance(value, list) and value and all(isinstance(item, dict) for item in value):
+        # $or / $and clauses
+        return "[" + ", ".join(value_shape(item) for item in value) + "]"
+    return "?"
+
+
+def command_shape(command_name, command):
+    """
+    Describe a command by its name, collection and filter shape
+
+    Args:
+        command_name (str): Command name from the monitoring event
+        command (dict): Command document
+
+    Returns:
+        str: e.g. "find products {category: ?, _id: {$gt: ?}} sort (price, _id)"
+    """
+    target = command.get(command_name)
+    if command_name == "getMore":
+        target = command.get("collection")
+    parts = [command_name, target if isinstance(target, str) else ""]
+
+    if command_name in FILTER_FIELDS:
+        parts.append(value_shape(command.get(FILTER_FIELDS[command_name], {})))
+        if command.get("sort"):
+            parts.append("sort (" + ", ".join(command["sort"]) + ")")
+    elif command_name in ("update", "delete"):
+        statements = command.get("updates" if command_name == "update" else "deletes", [])
+        if statements:
+            parts.append(value_shape(statements[0].get("q", {})))
+        if len(statements) > 1:
+            parts.append(f"x{len(statements)}")
+    elif command_name == "aggregate":
+        stages = []
+        for stage in command.get("pipeline", []):
+            name = next(iter(stage), "")
+            stages.append(f"$match {value_shape(stage[name])}" if name == "$match" else name)
+        parts.append("[" + ", ".join(stages) + "]")
+    return " ".join(part for part in parts if part)
+
+
+def command_filters(command_name, command):
+    """
+    Filter shapes a command selects documents with
+
+    Used to check that every filter the app issues is registered in
+    QUERY_SHAPES. An aggregate counts through its leading $match
+    (count_documents runs as one).
+
+    Args:
+        command_name (str): Command name from the monitoring event
+        command (dict): Command document
+
+    Returns:
+        set: (collection, filter shape) tuples
+    """
+    collection = command.get(command_name)
+    if not isinstance(collection, str):
+        return set()
+    if command_name in FILTER_FIELDS:
+        filters = [command.get(FILTER_FIELDS[command_name], {})]
+    elif command_name in ("update", "delete"):
+        filters = [statement.get("q", {}) for statement in command.get("updates" if command_name == "update" else "deletes", [])]
+    elif command_name == "aggregate":
+        pipeline = command.get("pipeline", [])
+        filters = [pipeline[0]["$match"]] if pipeline and "$match" in pipeline[0] else []
+    else:
+        return set()
+    return {(collection, value_shape(query)) for query in filters}
+
+
+class QueryProfile:
+    """MongoDB commands issued while a profile is active"""
+
+    def __init__(self):
+        self.commands = 0
+        self.duration_ms = 0.0
+        self.shapes = Counter()
+        self.filters = set()
+        self.slow = []
+
+    def repeated(self, threshold):
+        """Shapes issued at least threshold times (likely N+1 loops)"""
+        return [
+            (shape, count) for shape, count in self.shapes.most_common()
+            if count >= threshold and shape.split(" ", 1)[0] not in REPEATABLE_COMMANDS
+        ]
+
+
+class QueryProfiler(monitoring.CommandListener):
+    """
+    Attribute every MongoDB command to the active QueryProfile
+
+    Commands issued with no active profile (e.g. in the job worker) are
+    ignored.
+    """
+
+    def __init__(self):
+        self.slow_ms = 100
+        self._pending = {}
+
+    def started(self, event):
+        profile = _current_profile.get()
+        if profile is None:
+            return
+        shape = command_shape(event.command_name, event.command)
+        profile.commands += 1
+        profile.shapes[shape] += 1
+        profile.filters.update(command_filters(event.command_name, event.command))
+        self._pending[(event.connection_id, event.request_id)] = (profile, shape)
+
+    def _finished(self, event):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        profile, shape = pending
+        duration_ms = event.duration_micros / 1000
+        profile.duration_ms += duration_ms
+        if duration_ms >= self.slow_ms:
+            profile.slow.append((shape, duration_ms))
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self._finished(event)
+
+
+query_profiler = QueryProfiler()
+
+
+@contextmanager
+def profile_queries():
+    """
+    Collect the MongoDB commands issued inside the block
+
+    Needs QUERY_PROFILER_ENABLED (the listener is only attached then).
+
+    Yields:
+        QueryProfile: Filled in as commands complete
+    """
+    profile = QueryProfile()
+    token = _current_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _current_profile.reset(token)
+
+
+def init_query_profiler(app):
+    """
+    Profile the MongoDB commands of every request (development and tests)
+
+    Logs each request's command count, repeated query shapes and slow
+    commands, adds a Server-Timing header and enforces QUERY_BUDGETS. Must
+    run before the MongoDB client is first used.
+    """
+    from ..db import db
+
+    query_profiler.slow_ms = app.config['QUERY_PROFILER_SLOW_MS']
+    db.add_listener(query_profiler)
+
+    @app.before_request
+    def start_query_profile():
+        g.query_profile = QueryProfile()
+        g.query_profile_token = _current_profile.set(g.query_profile)
+
+    @app.after_request
+    def report_query_profile(response):
+        profile = g.pop("query_profile", None)
+        if profile is None:
+            return response
+        _current_profile.reset(g.pop("query_profile_token"))
+
+        endpoint = request.endpoint or "unmatched"
+        logger = current_app.logger
+        response.headers.add("Server-Timing", f'mongo;dur={profile.duration_ms:.1f};desc="{profile.commands} commands"')
+        if profile.commands:
+            logger.info(f"{request.method} {request.path} ({endpoint}): {profile.commands} MongoDB commands, {profile.duration_ms:.1f} ms")
+        for shape, count in profile.repeated(current_app.config['QUERY_PROFILER_REPEAT_THRESHOLD']):
+            logger.warning(f"Possible N+1 in {endpoint}: {count}x {shape}")
+        for shape, duration_ms in profile.slow:
+            logger.warning(f"Slow MongoDB command in {endpoint} ({duration_ms:.1f} ms): {shape}")
+
+        budget = QUERY_BUDGETS.get(endpoint)
+        if budget is not None and profile.commands > budget:
+            message = f"{endpoint} issued {profile.commands} MongoDB commands (budget {budget}): " + \
+                "; ".join(f"{count}x {shape}" for shape, count in profile.shapes.most_common())
+            if current_app.config['QUERY_BUDGET_STRICT']:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    @app.teardown_request
+    def discard_query_profile(exc):
+        # after_request did not run (unhandled error); stop attributing commands
+        token = g.pop("query_profile_token", None)
+        if token is not None:
+            _current_profile.reset(token)
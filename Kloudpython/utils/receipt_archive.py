@@ -0,0 +1,361 @@
+from pymongo import UpdateOne
+from datetime import datetime, timedelta, timezone
+import io
+import os
+import shutil
+import struct
+import tempfile
+import uuid
+from .pdf_generator import create_receipts_directory, legacy_receipts_directory
+
+# An archive is a pair of files in <RECEIPT_STORE_DIR>/archives:
+#   <name>.pack  the receipt PDFs, concatenated
+#   <name>.idx   a header and one fixed-size record per PDF, sorted by hash:
+#                SHA-256 (32 bytes), offset and length in the pack (8 bytes each)
+# Names start with the month the orders were placed in (e.g. 2026-10-3f9a1c2e),
+# which is what the retention policy goes by.
+INDEX_MAGIC = b"KCRIDX01"
+INDEX_HEADER = struct.Struct(">8sQ")
+INDEX_RECORD = struct.Struct(">32sQQ")
+
+
+def archives_directory():
+    """Create the receipt archives directory if it doesn't exist"""
+    archives_dir = os.path.join(create_receipts_directory(), "archives")
+    os.makedirs(archives_dir, exist_ok=True)
+    return archives_dir
+
+
+def archive_path(name, extension):
+    return os.path.join(archives_directory(), f"{name}.{extension}")
+
+
+def _write_atomically(path, write):
+    """Write a file under a temporary name, then rename it into place"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as tmp_file:
+            write(tmp_file)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_archive(name, receipts):
+    """
+    Pack receipt PDFs into a new archive
+
+    Args:
+        name (str): Archive name
+        receipts (list): (sha256 hex, PDF path) tuples
+
+    Returns:
+        int: Size of the pack in bytes
+    """
+    records = []
+
+    def write_pack(pack_file):
+        offset = 0
+        for sha256, path in receipts:
+            with open(path, "rb") as pdf_file:
+                data = pdf_file.read()
+            pack_file.write(data)
+            records.append(INDEX_RECORD.pack(bytes.fromhex(sha256), offset, len(data)))
+            offset += len(data)
+
+    def write_index(index_file):
+        index_file.write(INDEX_HEADER.pack(INDEX_MAGIC, len(records)))
+        for record in sorted(records):
+            index_file.write(record)
+
+    # The index goes last: an archive without one is never read
+    _write_atomically(archive_path(name, "pack"), write_pack)
+    _write_atomically(archive_path(name, "idx"), write_index)
+    return os.path.getsize(archive_path(name, "pack"))
+
+
+def find_in_archive(name, sha256):
+    """
+    Look a receipt up in an archive index by binary search
+
+    Reads one record per probe, so lookups cost O(log n) small reads
+    whatever the size of the archive.
+
+    Returns:
+        tuple: (offset, length) in the pack
+
+    Raises:
+        LookupError: If the receipt is not in the archive
+        OSError: If the archive does not exist
+    """
+    key = bytes.fromhex(sha256)
+    with open(archive_path(name, "idx"), "rb") as index_file:
+        magic, count = INDEX_HEADER.unpack(index_file.read(INDEX_HEADER.size))
+        if magic != INDEX_MAGIC:
+            raise LookupError(f"{name}.idx is not a receipt archive index")
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            index_file.seek(INDEX_HEADER.size + middle * INDEX_RECORD.size)
+            record_key, offset, length = INDEX_RECORD.unpack(index_file.read(INDEX_RECORD.size))
+            if record_key == key:
+                return offset, length
+            if record_key < key:
+                low = middle + 1
+            else:
+                high = middle
+    raise LookupError(f"Receipt {sha256} is not in archive {name}")
+
+
+class ArchivedReceipt(io.RawIOBase):
+    """Read-only, seekable view of one receipt inside a pack file"""
+
+    def __init__(self, pack_file, offset, length):
+        self._file = pack_file
+        self._offset = offset
+        self._length = length
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, position, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            position += self._position
+        elif whence == io.SEEK_END:
+            position += self._length
+        self._position = max(0, min(position, self._length))
+        return self._position
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self._length - self._position)
+        if size <= 0:
+            return 0
+        self._file.seek(self._offset + self._position)
+        data = self._file.read(size)
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def open_archived_receipt(name, sha256):
+    """
+    Open a receipt stored in an archive, without unpacking it
+
+    Returns:
+        tuple: (file object positioned at the start of the PDF, size)
+    """
+    offset, length = find_in_archive(name, sha256)
+    return ArchivedReceipt(open(archive_path(name, "pack"), "rb"), offset, length), length
+
+
+def compact_receipts(older_than_days=30, max_pack_bytes=256 * 1024 * 1024, batch_size=1000):
+    """
+    Move receipts of orders older than the cutoff into archives
+
+    Orders are packed by the month they were placed in. Once an archive is
+    written, its orders point at it (receipt_archive) and the loose PDFs
+    are deleted. Loose PDFs older than the cutoff that no unarchived order
+    references (e.g. left by a download racing a previous run) are deleted
+    too. Orders whose loose PDF is missing are skipped; their receipt is
+    rendered again when it is next needed. Receipts left in static/receipts
+    by older releases are moved into the store first.
+
+    Args:
+        older_than_days (int): Only orders placed before this many days ago
+        max_pack_bytes (int): Start a new archive once a pack reaches this size
+        batch_size (int): Orders fetched per cursor batch
+
+    Returns:
+        dict: archives (names written), archived and deleted (loose PDFs)
+            counts, and migrated (legacy PDFs moved out of static/)
+    """
+    from ..db import get_orders_collection
+    from .receipt_store import receipt_object_path
+
+    orders_collection = get_orders_collection()
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    summary = {"archives": [], "archived": 0, "deleted": 0, "migrated": migrate_legacy_receipts()}
+
+    pending = {}
+    pending_bytes = {}
+
+    def flush(month):
+        receipts = pending.pop(month, [])
+        pending_bytes.pop(month, None)
+        if not receipts:
+            return
+        name = f"{month}-{uuid.uuid4().hex[:8]}"
+        write_archive(name, [(sha256, path) for _, sha256, path in receipts])
+        orders_collection.bulk_write([
+            UpdateOne({"_id": order_id, "receipt_sha256": sha256}, {"$set": {"receipt_archive": name}})
+            for order_id, sha256, _ in receipts
+        ], ordered=False)
+        summary["archives"].append(name)
+        summary["archived"] += len(receipts)
+
+    cursor = orders_collection.find(
+        {"receipt_archive": None, "created_at": {"$lt": cutoff}, "receipt_sha256": {"$type": "string"}},
+        {"receipt_sha256": 1, "created_at": 1},
+        batch_size=batch_size
+    ).sort("created_at", 1)
+    for order in cursor:
+        path = receipt_object_path(order["receipt_sha256"])
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            continue
+        month = order["created_at"].strftime("%Y-%m")
+        pending.setdefault(month, []).append((order["_id"], order["receipt_sha256"], path))
+        pending_bytes[month] = pending_bytes.get(month, 0) + size
+        if pending_bytes[month] >= max_pack_bytes:
+            flush(month)
+    for month in list(pending):
+        flush(month)
+
+    summary["deleted"] = sweep_loose_receipts(cutoff, batch_size)
+    return summary
+
+
+def sweep_loose_receipts(cutoff, batch_size=1000):
+    """
+    Delete loose receipt PDFs older than the cutoff that no unarchived order needs
+
+    Returns:
+        int: Number of PDFs deleted
+    """
+    from ..db import get_orders_collection
+
+    objects_dir = os.path.join(create_receipts_directory(), "objects")
+    if not os.path.isdir(objects_dir):
+        return 0
+    cutoff_timestamp = cutoff.replace(tzinfo=timezone.utc).timestamp()
+    deleted = 0
+
+    def delete_unreferenced(candidates):
+        nonlocal deleted
+        still_needed = set(get_orders_collection().distinct(
+            "receipt_sha256",
+            {"receipt_sha256": {"$in": list(candidates)}, "receipt_archive": None}
+        ))
+        for sha256, path in candidates.items():
+            if sha256 not in still_needed:
+                os.remove(path)
+                deleted += 1
+
+    candidates = {}
+    for shard in sorted(os.listdir(objects_dir)):
+        shard_dir = os.path.join(objects_dir, shard)
+        if not os.path.isdir(shard_dir):
+            continue
+        for filename in os.listdir(shard_dir):
+            path = os.path.join(shard_dir, filename)
+            if not filename.endswith(".pdf") or os.path.getmtime(path) >= cutoff_timestamp:
+                continue
+            candidates[filename[:-len(".pdf")]] = path
+            if len(candidates) >= batch_size:
+                delete_unreferenced(candidates)
+                candidates = {}
+    if candidates:
+        delete_unreferenced(candidates)
+    return deleted
+
+
+def legacy_store_directory():
+    """Private home of the flat receipt_*.pdf files from older releases"""
+    legacy_dir = os.path.join(create_receipts_directory(), "legacy")
+    os.makedirs(legacy_dir, exist_ok=True)
+    return legacy_dir
+
+
+def migrate_legacy_receipts():
+    """
+    Move flat receipt_*.pdf files out of static/receipts into the store
+
+    Nothing references them any more (receipts are re-rendered from their
+    orders), but they keep their modification time so the retention
+    policy ages them out like everything else.
+
+    Returns:
+        int: Number of files moved
+    """
+    source_dir = legacy_receipts_directory()
+    if not os.path.isdir(source_dir):
+        return 0
+    moved = 0
+    for filename in os.listdir(source_dir):
+        if filename.startswith("receipt_") and filename.endswith(".pdf"):
+            # copy2 + delete across filesystems, so the mtime survives
+            shutil.move(os.path.join(source_dir, filename), os.path.join(legacy_store_directory(), filename))
+            moved += 1
+    return moved
+
+
+def sweep_legacy_receipts(retention_days):
+    """
+    Delete migrated legacy receipts older than the retention period
+
+    Returns:
+        int: Number of files deleted
+    """
+    legacy_dir = os.path.join(create_receipts_directory(), "legacy")
+    if not os.path.isdir(legacy_dir):
+        return 0
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    cutoff_timestamp = cutoff.replace(tzinfo=timezone.utc).timestamp()
+    deleted = 0
+    for filename in os.listdir(legacy_dir):
+        path = os.path.join(legacy_dir, filename)
+        if os.path.getmtime(path) < cutoff_timestamp:
+            os.remove(path)
+            deleted += 1
+    return deleted
+
+
+def apply_receipt_retention(retention_days):
+    """
+    Delete archives of months that are entirely older than the retention period
+
+    The orders keep everything a receipt is rendered from, so an order
+    whose archive was deleted gets its receipt rendered again (identically)
+    if it is ever downloaded.
+
+    Args:
+        retention_days (int): Keep receipts of orders placed in the last this many days
+
+    Returns:
+        list: Names of the deleted archives
+    """
+    from ..db import get_orders_collection
+
+    # Months strictly before the one containing the cutoff
+    cutoff_month = (datetime.utcnow() - timedelta(days=retention_days)).strftime("%Y-%m")
+    deleted = []
+    for filename in sorted(os.listdir(archives_directory())):
+        if not filename.endswith(".idx") or filename[:7] >= cutoff_month:
+            continue
+        name = filename[:-len(".idx")]
+        get_orders_collection().update_many(
+            {"receipt_archive": name},
+            {"$unset": {"receipt_archive": "", "receipt_sha256": "", "receipt_size": ""}}
+        )
+        # Index first, so a half-deleted archive is never read
+        os.remove(archive_path(name, "idx"))
+        if os.path.exists(archive_path(name, "pack")):
+            os.remove(archive_path(name, "pack"))
+        deleted.append(name)
+    return deleted
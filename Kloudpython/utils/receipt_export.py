@@ -0,0 +1,124 @@
+from datetime import datetime, timezone
+import csv
+import io
+import json
+
+RECEIPT_EXPORT_FIELDS = [
+    "receipt_id", "order_id", "timestamp", "user_email", "username",
+    "items", "units", "total_amount", "email_status"
+]
+RECEIPT_EXPORT_FORMATS = ["csv", "jsonl"]
+RECEIPT_EXPORT_PROJECTION = {
+    "order_id": 1, "timestamp": 1, "user_email": 1, "username": 1,
+    "items": 1, "total_amount": 1, "email_status": 1
+}
+
+
+def format_timestamp(value):
+    """ISO 8601 UTC timestamp of a stored datetime (naive values are UTC)"""
+    if not isinstance(value, datetime):
+        return ""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat() + "Z"
+
+
+def export_record(receipt):
+    """Receipt log document -> export record (RECEIPT_EXPORT_FIELDS)"""
+    items = [
+        {
+            "product_id": item.get("product_id"),
+            "name": item.get("name"),
+            "category": item.get("category"),
+            "quantity": item.get("quantity", 0),
+            "price": item.get("price"),
+            "subtotal": item.get("subtotal")
+        }
+        for item in receipt.get("items", [])
+    ]
+    return {
+        "receipt_id": str(receipt["_id"]),
+        "order_id": receipt.get("order_id", ""),
+        "timestamp": format_timestamp(receipt.get("timestamp")),
+        "user_email": receipt.get("user_email", ""),
+        "username": receipt.get("username", ""),
+        "items": items,
+        "units": sum(item["quantity"] or 0 for item in items),
+        "total_amount": receipt.get("total_amount", 0),
+        "email_status": receipt.get("email_status", "")
+    }
+
+
+def iter_receipt_batches(query, batch_size=1000):
+    """
+    Read the matching receipt logs oldest first, one cursor batch at a time
+
+    One cursor fetches batch_size documents per round trip and each batch
+    is handed on as soon as it is read, so at most one batch is held in
+    memory. Sorting on timestamp alone keeps the sort on an index (no
+    blocking in-memory sort before the first batch).
+
+    Yields:
+        list: Receipt log documents
+    """
+    from ..db import get_receipts_collection
+
+    cursor = get_receipts_collection().find(
+        query, RECEIPT_EXPORT_PROJECTION, batch_size=batch_size
+    ).sort("timestamp", 1)
+    batch = []
+    try:
+        for receipt in cursor:
+            batch.append(receipt)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        cursor.close()
+
+
+def export_receipts(query, file_format, batch_size=1000):
+    """
+    Stream the matching receipt logs as CSV or JSONL
+
+    In CSV the items of a receipt are one cell ("2 x Apples; 1 x Milk");
+    JSONL keeps them as a list with prices and subtotals.
+
+    Args:
+        query (dict): Receipts filter (see admin.build_receipt_filter)
+        file_format (str): "csv" or "jsonl"
+        batch_size (int): Receipts per cursor batch
+
+    Yields:
+        str: Chunks of the file, one per batch (the CSV header first)
+    """
+    if file_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=RECEIPT_EXPORT_FIELDS, lineterminator="\n")
+        writer.writeheader()
+        yield buffer.getvalue()
+
+        for batch in iter_receipt_batches(query, batch_size):
+            buffer.seek(0)
+            buffer.truncate()
+            for receipt in batch:
+                record = export_record(receipt)
+                record["items"] = "; ".join(f"{item['quantity']} x {item['name']}" for item in record["items"])
+                writer.writerow(record)
+            yield buffer.getvalue()
+    else:
+        for batch in iter_receipt_batches(query, batch_size):
+            yield "".join(
+                json.dumps(export_record(receipt), ensure_ascii=False, default=str) + "\n" for receipt in batch
+            )
+
+
+def receipt_export_filename(filters, file_format):
+    """Download name of an export, e.g. kloudcart-receipts-2026-09-01-to-2026-09-30.csv"""
+    if filters.get("date_from") or filters.get("date_to"):
+        period = f"-{filters.get('date_from', 'start')}-to-{filters.get('date_to', 'now')}"
+    else:
+        period = f"-{datetime.utcnow().strftime('%Y%m%d')}"
+    return f"kloudcart-receipts{period}.{file_format}"
@@ -0,0 +1,82 @@
+from flask import current_app
+import os
+from .job_queue import job_handler, job_failure_handler, enqueue_job
+from .email_helper import send_receipt_email
+from .receipt_store import ensure_order_receipt
+from ..models.user import Order
+
+
+RECEIPT_JOB = "send_receipt"
+
+
+def update_receipt_log(receipt_id, **fields):
+    """Update fields (e.g. email_status) of a logged receipt"""
+    from ..db import get_receipts_collection
+
+    get_receipts_collection().update_one({"_id": receipt_id}, {"$set": fields})
+
+
+@job_handler(RECEIPT_JOB)
+def process_receipt(payload, final_attempt=True):
+    """
+    Render (once) and email the receipt of a persisted order
+
+    Args:
+        payload (dict): receipt_id and order_id
+        final_attempt (bool): Unused; a job that gives up is recorded by
+            receipt_failed, whatever the error
+
+    Raises:
+        LookupError: If the order does not exist
+        RuntimeError: If the email could not be sent (the job is retried)
+    """
+    from ..db import get_orders_collection
+
+    order_doc = get_orders_collection().find_one({"_id": payload["order_id"]})
+    if not order_doc:
+        raise LookupError(f"Order {payload['order_id']} not found")
+    order = Order.from_dict(order_doc)
+
+    # The PDF is stored on the first attempt, so retries only redo the SMTP part
+    pdf_path = ensure_order_receipt(order)
+    update_receipt_log(payload["receipt_id"], receipt_filename=os.path.basename(pdf_path))
+
+    if send_receipt_email(order.user_email, order.to_order_data(), pdf_path):
+        update_receipt_log(payload["receipt_id"], email_status="sent")
+        return
+
+    raise RuntimeError(f"Email receipt for order {order.order_id} could not be sent")
+
+
+@job_failure_handler(RECEIPT_JOB)
+def receipt_failed(payload, error):
+    """Mark the receipt failed once its job gives up (missing order, IO or SMTP errors)"""
+    update_receipt_log(payload["receipt_id"], email_status="failed")
+
+
+def queue_receipt(receipt_id, order_id):
+    """
+    Schedule the receipt for an order to be rendered and emailed
+
+    With RECEIPT_QUEUE_ENABLED off the receipt is processed inline instead,
+    which is useful for development setups without a worker process.
+
+    Returns:
+        str: The resulting email_status ("queued", "sent" or "failed")
+    """
+    payload = {
+        "receipt_id": receipt_id,
+        "order_id": order_id
+    }
+
+    if not current_app.config.get('RECEIPT_QUEUE_ENABLED', True):
+        try:
+            process_receipt(payload)
+            return "sent"
+        except Exception as e:
+            current_app.logger.error(f"Failed to send email receipt: {str(e)}")
+            receipt_failed(payload, e)
+            return "failed"
+
+    enqueue_job(RECEIPT_JOB, payload, max_attempts=current_app.config.get('JOB_MAX_ATTEMPTS', 5))
+    return "queued"
@@ -0,0 +1,96 @@
+import hashlib
+import os
+import tempfile
+from .pdf_generator import create_receipts_directory, get_receipt_renderer
+from .receipt_archive import open_archived_receipt
+
+
+def receipt_object_path(sha256):
+    """
+    Path of a stored receipt PDF, sharded by the first two hex digits
+
+    Args:
+        sha256 (str): Hex SHA-256 of the PDF bytes
+
+    Returns:
+        str: Absolute path of the PDF in the receipt store
+    """
+    return os.path.join(create_receipts_directory(), "objects", sha256[:2], f"{sha256}.pdf")
+
+
+def store_receipt_pdf(pdf_bytes):
+    """
+    Write PDF bytes into the content-addressed receipt store
+
+    The file is written to a temporary name and renamed into place, so
+    readers never see a partial PDF. Identical content is stored once.
+
+    Returns:
+        str: Hex SHA-256 of the PDF
+    """
+    sha256 = hashlib.sha256(pdf_bytes).hexdigest()
+    path = receipt_object_path(sha256)
+    if os.path.exists(path):
+        return sha256
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as tmp_file:
+            tmp_file.write(pdf_bytes)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return sha256
+
+
+def ensure_order_receipt(order):
+    """
+    Get the stored receipt of an order, rendering and storing it only once
+
+    Args:
+        order (Order): Persisted order
+
+    Returns:
+        str: Path of the stored receipt PDF
+    """
+    from ..db import get_orders_collection
+
+    if order.receipt_sha256:
+        path = receipt_object_path(order.receipt_sha256)
+        if os.path.exists(path):
+            return path
+
+    pdf_bytes = get_receipt_renderer().render_bytes(order.to_order_data())
+    order.receipt_sha256 = store_receipt_pdf(pdf_bytes)
+    get_orders_collection().update_one(
+        {"_id": order.order_id},
+        {"$set": {"receipt_sha256": order.receipt_sha256, "receipt_size": len(pdf_bytes)}}
+    )
+    return receipt_object_path(order.receipt_sha256)
+
+
+def open_order_receipt(order):
+    """
+    Open the receipt PDF of an order for streaming
+
+    Archived receipts are read straight out of their pack file; otherwise
+    the loose PDF is used, rendered first if needed (e.g. after its
+    archive was deleted by the retention policy).
+
+    Args:
+        order (Order): Persisted order
+
+    Returns:
+        tuple: (binary file object, size in bytes); the caller closes it
+    """
+    if order.receipt_archive and order.receipt_sha256:
+        try:
+            return open_archived_receipt(order.receipt_archive, order.receipt_sha256)
+        except (OSError, LookupError):
+            pass
+
+    receipt_file = open(ensure_order_receipt(order), "rb")
+    return receipt_file, os.fstat(receipt_file.fileno()).st_size
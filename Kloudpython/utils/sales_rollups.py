@@ -0,0 +1,195 @@
+from collections import defaultdict
+from datetime import datetime
+from pymongo import UpdateOne, InsertOne
+import pytz
+
+
+# Rollup collections maintained from the receipts log
+DAILY_ROLLUP = "sales_daily"
+CATEGORY_ROLLUP = "sales_by_category"
+PRODUCT_ROLLUP = "sales_by_product"
+ROLLUP_COLLECTIONS = [DAILY_ROLLUP, CATEGORY_ROLLUP, PRODUCT_ROLLUP]
+
+UNCATEGORIZED = "Uncategorized"
+
+
+def sales_day(timestamp):
+    """IST calendar day (YYYY-MM-DD) of a receipt timestamp"""
+    if timestamp.tzinfo is None:
+        # PyMongo returns naive UTC datetimes
+        timestamp = pytz.utc.localize(timestamp)
+    return timestamp.astimezone(pytz.timezone('Asia/Kolkata')).strftime("%Y-%m-%d")
+
+
+def product_key(item):
+    """Rollup key of a receipt item (older receipts only carry the name)"""
+    return item.get("product_id") or f"name:{item.get('name', '')}"
+
+
+class SalesTally:
+    """In-memory sales totals for a set of receipts, in rollup shape"""
+
+    def __init__(self):
+        self.daily = defaultdict(lambda: {"revenue": 0, "orders": 0, "units": 0})
+        self.categories = defaultdict(lambda: {"revenue": 0, "orders": 0, "units": 0})
+        self.products = defaultdict(lambda: {"revenue": 0, "orders": 0, "units": 0})
+        self.product_info = {}
+
+    def add_receipt(self, items, total, timestamp):
+        """Tally one receipt"""
+        day = self.daily[sales_day(timestamp)]
+        day["revenue"] += total
+        day["orders"] += 1
+        day["units"] += sum(item.get("quantity", 0) for item in items)
+
+        categories_seen = set()
+        for item in items:
+            category = item.get("category") or UNCATEGORIZED
+            stats = self.categories[category]
+            stats["revenue"] += item.get("subtotal", 0)
+            stats["units"] += item.get("quantity", 0)
+            if category not in categories_seen:
+                stats["orders"] += 1
+                categories_seen.add(category)
+
+            key = product_key(item)
+            stats = self.products[key]
+            stats["revenue"] += item.get("subtotal", 0)
+            stats["units"] += item.get("quantity", 0)
+            stats["orders"] += 1
+            self.product_info[key] = {"name": item.get("name", ""), "category": category}
+
+    def increments(self):
+        """
+        $inc upserts that add this tally to the rollup collections
+
+        Returns:
+            dict: collection name -> list of UpdateOne operations
+        """
+        now = datetime.utcnow()
+        operations = {
+            DAILY_ROLLUP: [
+                UpdateOne({"_id": day}, {"$inc": stats, "$set": {"updated_at": now}}, upsert=True)
+                for day, stats in self.daily.items()
+            ],
+            CATEGORY_ROLLUP: [
+                UpdateOne({"_id": category}, {"$inc": stats, "$set": {"updated_at": now}}, upsert=True)
+                for category, stats in self.categories.items()
+            ],
+            PRODUCT_ROLLUP: [
+                UpdateOne({"_id": key}, {"$inc": stats, "$set": dict(self.product_info[key], updated_at=now)}, upsert=True)
+                for key, stats in self.products.items()
+            ]
+        }
+        return {name: ops for name, ops in operations.items() if ops}
+
+    def documents(self):
+        """
+        Full rollup documents for this tally
+
+        Returns:
+            dict: collection name -> list of InsertOne operations
+        """
+        now = datetime.utcnow()
+        return {
+            DAILY_ROLLUP: [InsertOne(dict(stats, _id=day, updated_at=now)) for day, stats in self.daily.items()],
+            CATEGORY_ROLLUP: [InsertOne(dict(stats, _id=category, updated_at=now)) for category, stats in self.categories.items()],
+            PRODUCT_ROLLUP: [
+                InsertOne(dict(stats, _id=key, updated_at=now, **self.product_info[key]))
+                for key, stats in self.products.items()
+            ]
+        }
+
+
+def record_order_sales(items, total, timestamp):
+    """
+    Add one confirmed order to the rollups with $inc upserts
+
+    Args:
+        items (list): Receipt items (product_id, name, category, quantity, subtotal)
+        total (float): Order total
+        timestamp (datetime): Order time
+    """
+    from ..db import db
+
+    tally = SalesTally()
+    tally.add_receipt(items, total, timestamp)
+    # One bulk_write per rollup collection
+    for collection_name, operations in tally.increments().items():
+        db.get_collection(collection_name).bulk_write(operations, ordered=False)
+
+
+def rebuild_sales_rollups(batch_size=1000):
+    """
+    Recompute every rollup from the receipts collection
+
+    Receipts are read in batches into an in-memory tally (its size depends
+    on the number of days, categories and products, not on orders) and
+    written to scratch collections that replace the live ones by rename.
+    Receipts logged while the scan runs are folded in by a catch-up pass
+    before the swap; only orders confirmed between that pass and the rename
+    can be missed, so run it off-peak.
+
+    Args:
+        batch_size (int): Cursor batch size and bulk write size
+
+    Returns:
+        int: Number of receipts processed
+    """
+    from ..db import db, get_receipts_collection, INDEXES
+
+    receipts_collection = get_receipts_collection()
+    projection = {"items": 1, "total_amount": 1, "timestamp": 1}
+    tally = SalesTally()
+    processed = 0
+    seen_until = None
+
+    def scan(query):
+        nonlocal processed, seen_until
+        cursor = receipts_collection.find(query, projection, batch_size=batch_size).sort("timestamp", 1)
+        for receipt in cursor:
+            if not receipt.get("timestamp"):
+                continue
+            tally.add_receipt(receipt.get("items", []), receipt.get("total_amount", 0), receipt["timestamp"])
+            seen_until = receipt["timestamp"]
+            processed += 1
+
+    scan({"timestamp": {"$ne": None}})
+    # Catch up with receipts logged during the scan
+    if seen_until is not None:
+        scan({"timestamp": {"$gt": seen_until}})
+
+    for collection_name, operations in tally.documents().items():
+        scratch = db.get_collection(f"{collection_name}_rebuild")
+        scratch.drop()
+        for start in range(0, len(operations), batch_size):
+            scratch.bulk_write(operations[start:start + batch_size], ordered=False)
+        if operations:
+            # Atomic swap; the dropped target takes its indexes with it
+            scratch.rename(collection_name, dropTarget=True)
+        else:
+            db.get_collection(collection_name).drop()
+        if collection_name in INDEXES:
+            db.get_collection(collection_name).create_indexes(INDEXES[collection_name])
+
+    return processed
+
+
+def get_sales_analytics(days=30, top=10):
+    """
+    Read the dashboard figures from the rollups only
+
+    Args:
+        days (int): Number of most recent days to return
+        top (int): Number of best-selling products to return
+
+    Returns:
+        dict: daily (most recent first), categories and top_products
+    """
+    from ..db import get_sales_daily_collection, get_sales_by_category_collection, get_sales_by_product_collection
+
+    return {
+        "daily": list(get_sales_daily_collection().find().sort("_id", -1).limit(days)),
+        "categories": list(get_sales_by_category_collection().find().sort("revenue", -1)),
+        "top_products": list(get_sales_by_product_collection().find().sort("units", -1).limit(top))
+    }
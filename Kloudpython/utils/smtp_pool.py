@@ -0,0 +1,173 @@
+from flask_mail import Connection
+import os
+import smtplib
+import socket
+import threading
+import time
+
+
+# Errors after which an SMTP connection is discarded and the send retried.
+# Not every OSError: smtplib.SMTPException subclasses it, and a refusal
+# (5xx reply) leaves the session usable - smtplib resets it.
+SMTP_CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, socket.timeout)
+
+
+class PooledConnection:
+    """A Flask-Mail connection plus the bookkeeping the pool needs"""
+
+    def __init__(self, mail_state):
+        self.connection = Connection(mail_state).__enter__()
+        self.created_at = self.last_used = time.monotonic()
+        self.sent = 0
+
+    def send(self, message):
+        self.connection.send(message)
+        self.sent += 1
+        self.last_used = time.monotonic()
+
+    def is_alive(self):
+        """Check the session with a NOOP"""
+        host = self.connection.host
+        if host is None:
+            # Sending is suppressed (TESTING / MAIL_SUPPRESS_SEND)
+            return True
+        try:
+            return host.noop()[0] == 250
+        except OSError:
+            # Includes SMTPException
+            return False
+
+    def close(self):
+        host = self.connection.host
+        if host is None:
+            return
+        try:
+            host.quit()
+        except OSError:
+            host.close()
+
+
+class SMTPConnectionPool:
+    """
+    Pool of authenticated SMTP sessions reused across messages.
+
+    Opening a session costs a TCP connect, STARTTLS and AUTH; the pool keeps
+    up to `size` idle sessions open instead. Sessions idle for longer than
+    `keepalive_interval` seconds are checked with NOOP before reuse, sessions
+    idle for longer than `max_idle` are closed, and a session is retired after
+    `max_messages` messages. A send that fails because the server dropped the
+    session is retried once on a fresh connection; a message the server
+    refuses fails on its own and the session is kept.
+    """
+
+    def __init__(self, mail_state, size=2, max_messages=100, keepalive_interval=30, max_idle=300):
+        self.mail_state = mail_state
+        self.size = size
+        self.max_messages = max_messages
+        self.keepalive_interval = keepalive_interval
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def acquire(self):
+        """Take an idle session from the pool, or open a new one"""
+        with self._lock:
+            if self._pid != os.getpid():
+                # Sessions inherited across fork belong to the parent process
+                self._idle = []
+                self._pid = os.getpid()
+            idle = self._idle
+            self._idle = []
+
+        pooled = None
+        now = time.monotonic()
+        while idle:
+            candidate = idle.pop()
+            idle_for = now - candidate.last_used
+            if idle_for < self.max_idle and (idle_for < self.keepalive_interval or candidate.is_alive()):
+                pooled = candidate
+                break
+            candidate.close()
+
+        if idle:
+            with self._lock:
+                self._idle.extend(idle)
+
+        return pooled or PooledConnection(self.mail_state)
+
+    def release(self, pooled, broken=False):
+        """Return a session to the pool, closing it if it should be retired"""
+        if not broken and pooled.sent < self.max_messages:
+            with self._lock:
+                if len(self._idle) < self.size:
+                    self._idle.append(pooled)
+                    return
+        if broken:
+            if pooled.connection.host is not None:
+                pooled.connection.host.close()
+        else:
+            pooled.close()
+
+    def send(self, message):
+        """Send one message over a pooled session"""
+        self.send_many([message], raise_errors=True)
+
+    def send_many(self, messages, raise_errors=False):
+        """
+        Send many messages over as few sessions as possible
+
+        Args:
+            messages (list): Flask-Mail Message instances
+            raise_errors (bool): Re-raise the first send error instead of
+                recording it
+
+        Returns:
+            list: None for each message sent, or the exception it failed with
+        """
+        results = []
+        pooled = self.acquire()
+        try:
+            for message in messages:
+                if pooled is not None and pooled.sent >= self.max_messages:
+                    pooled.close()
+                    pooled = None
+                try:
+                    if pooled is None:
+                        pooled = PooledConnection(self.mail_state)
+                    try:
+                        pooled.send(message)
+                    except SMTP_CONNECTION_ERRORS:
+                        # Session dropped by the server - reconnect and retry once
+                        self.release(pooled, broken=True)
+                        pooled = None
+                        pooled = PooledConnection(self.mail_state)
+                        pooled.send(message)
+                    results.append(None)
+                except Exception as e:
+                    if isinstance(e, SMTP_CONNECTION_ERRORS) and pooled is not None:
+                        self.release(pooled, broken=True)
+                        pooled = None
+                    # Anything else (e.g. a refused recipient) fails this message only
+                    if raise_errors:
+                        raise
+                    results.append(e)
+        except Exception:
+            if pooled is not None:
+                self.release(pooled)
+            raise
+        except BaseException:
+            if pooled is not None:
+                self.release(pooled, broken=True)
+            raise
+        if pooled is not None:
+            self.release(pooled)
+        return results
+
+    def close_all(self):
+        """Close every idle session"""
+        with self._lock:
+            idle = self._idle
+            self._idle = []
+        for pooled in idle:
+            pooled.close()
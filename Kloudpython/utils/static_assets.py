@@ -0,0 +1,191 @@
+from flask import current_app, request, send_from_directory, abort
+import gzip
+import hashlib
+import mimetypes
+import os
+import tempfile
+
+try:
+    import brotli
+except ImportError:  # optional - only gzip siblings are written without it
+    brotli = None
+
+
+# Directories under static/ that are never fingerprinted or precompressed
+# (receipts are private PDFs, uploads are named uniquely when saved)
+UNVERSIONED_DIRS = ("receipts", "uploads")
+
+# Directories under static/ that are never served: receipts written there
+# before the private receipt store are moved out by compact-receipts
+PRIVATE_DIRS = ("receipts",)
+
+# Files worth precompressing; images other than SVG are already compressed
+COMPRESSIBLE_EXTENSIONS = {".css", ".js", ".svg", ".json", ".txt", ".xml", ".html", ".map"}
+
+# Accept-Encoding token -> sibling file suffix, in order of preference
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+HASH_LENGTH = 12
+
+
+def _write_atomic(path, data):
+    """Write bytes to a temporary name and rename them into place"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as tmp_file:
+            tmp_file.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _is_stale(sibling_path, source_path):
+    return not os.path.exists(sibling_path) or os.path.getmtime(sibling_path) < os.path.getmtime(source_path)
+
+
+def precompress(path, data):
+    """
+    Write .gz (and .br when brotli is installed) siblings of a static file
+
+    Siblings are only rewritten when older than the source, so re-running
+    the build does not redo the work.
+
+    Returns:
+        list: Suffixes of the siblings that were written
+    """
+    written = []
+    gz_path = path + ".gz"
+    if _is_stale(gz_path, path):
+        # mtime=0 keeps the output byte-identical across builds
+        _write_atomic(gz_path, gzip.compress(data, compresslevel=9, mtime=0))
+        written.append(".gz")
+    br_path = path + ".br"
+    if brotli is not None and _is_stale(br_path, path):
+        _write_atomic(br_path, brotli.compress(data, quality=11))
+        written.append(".br")
+    return written
+
+
+def build_asset_manifest(static_folder, compress=False):
+    """
+    Content-hash every static file and optionally precompress it
+
+    Precompressing writes into the package tree, so it is a build step
+    (flask build-static-assets), never done by a running app.
+
+    Args:
+        static_folder (str): The app's static folder
+        compress (bool): Write .gz/.br siblings of compressible files
+
+    Returns:
+        dict: filename relative to static_folder -> short SHA-256 of its contents
+    """
+    manifest = {}
+    for root, dirs, files in os.walk(static_folder):
+        if root == static_folder:
+            dirs[:] = [name for name in dirs if name not in UNVERSIONED_DIRS]
+        for name in files:
+            if name.endswith((".gz", ".br", ".tmp")):
+                continue
+            path = os.path.join(root, name)
+            with open(path, "rb") as asset_file:
+                data = asset_file.read()
+            filename = os.path.relpath(path, static_folder).replace(os.sep, "/")
+            manifest[filename] = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+            if compress and os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS:
+                precompress(path, data)
+    return manifest
+
+
+def find_precompressed(static_folder, manifest):
+    """
+    Precompressed siblings already on disk for each fingerprinted file
+
+    Siblings older than their source (left from an earlier build) are
+    ignored, so an edited file is never answered with its old contents.
+
+    Returns:
+        dict: filename -> [(encoding, suffix)] in order of preference
+    """
+    siblings = {}
+    for filename in manifest:
+        path = os.path.join(static_folder, *filename.split("/"))
+        found = [
+            (encoding, suffix) for encoding, suffix in ENCODINGS
+            if not _is_stale(path + suffix, path)
+        ]
+        if found:
+            siblings[filename] = found
+    return siblings
+
+
+def _preferred_encoding(filename):
+    """Best precompressed sibling of filename the client accepts, or (None, None)"""
+    for encoding, suffix in current_app.extensions.get('static_precompressed', {}).get(filename, []):
+        if request.accept_encodings[encoding]:
+            return encoding, suffix
+    return None, None
+
+
+def serve_static(filename):
+    """
+    Static file view with versioned caching and precompressed responses
+
+    URLs built with url_for('static', ...) carry ?v=<content hash>; when
+    the hash matches, the response is cacheable forever. Uploads have
+    unique names and are cached forever too. Anything else keeps Flask's
+    default revalidation.
+    """
+    if filename.split("/", 1)[0] in PRIVATE_DIRS:
+        abort(404)
+
+    static_folder = current_app.static_folder
+    manifest = current_app.extensions.get('static_assets', {})
+    immutable = (
+        (filename in manifest and request.args.get("v") == manifest[filename])
+        or filename.startswith("uploads/")
+    )
+
+    encoding, suffix = _preferred_encoding(filename)
+
+    if encoding:
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        response = send_from_directory(static_folder, filename + suffix, mimetype=mimetype)
+        response.headers["Content-Encoding"] = encoding
+    else:
+        response = current_app.send_static_file(filename)
+    if filename in manifest and os.path.splitext(filename)[1].lower() in COMPRESSIBLE_EXTENSIONS:
+        response.vary.add("Accept-Encoding")
+
+    if immutable and response.status_code in (200, 206, 304):
+        response.cache_control.public = True
+        response.cache_control.max_age = current_app.config.get('STATIC_IMMUTABLE_MAX_AGE', 31536000)
+        response.cache_control.immutable = True
+        response.cache_control.no_cache = None
+    return response
+
+
+def init_static_assets(app):
+    """
+    Fingerprint the static folder and route /static through serve_static
+
+    Only reads the static folder: .gz/.br siblings written at build time
+    (flask build-static-assets) are served where present, and nothing is
+    written, so read-only images and concurrent workers are fine.
+
+    Args:
+        app (Flask): Application to set up
+    """
+    app.extensions['static_assets'] = build_asset_manifest(app.static_folder)
+    app.extensions['static_precompressed'] = find_precompressed(app.static_folder, app.extensions['static_assets'])
+    app.view_functions['static'] = serve_static
+
+    @app.url_defaults
+    def add_static_version(endpoint, values):
+        # url_for('static', filename=...) -> /static/<filename>?v=<hash>
+        if endpoint == 'static' and 'filename' in values:
+            version = app.extensions['static_assets'].get(values['filename'])
+            if version:
+                values.setdefault('v', version)
@@ -0,0 +1,28 @@
+from Kloudpython import create_app
+from Kloudpython.utils.job_queue import run_worker
+from Kloudpython.utils.metrics import metrics_registry
+from prometheus_client import start_http_server
+import logging
+from Kloudpython.utils import receipt_jobs, image_derivatives  # noqa: F401 - registers job handlers
+
+
+app = create_app()
+
+
+def main():
+    """Run the background job worker (receipts, image derivatives)"""
+    # Receipt PDF and SMTP timings of queued jobs are recorded here, not in the web workers
+    if app.config['WORKER_METRICS_PORT']:
+        start_http_server(app.config['WORKER_METRICS_PORT'], registry=metrics_registry())
+    # Job failures are logged as warnings and errors, the worker start as info
+    app.logger.setLevel(logging.INFO)
+    with app.app_context():
+        run_worker(
+            poll_interval=app.config['JOB_POLL_INTERVAL'],
+            lock_timeout=app.config['JOB_LOCK_TIMEOUT'],
+            retry_base_delay=app.config['JOB_RETRY_BASE_DELAY']
+        )
+
+
+if __name__ == "__main__":
+    main()
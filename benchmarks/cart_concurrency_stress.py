@@ -0,0 +1,108 @@
+"""
+Cart mutation concurrency stress test
+
+Hammers add_cart_item / remove_cart_item for one synthetic user and product
+from many threads against the MongoDB in MONGO_URI, then checks that:
+  - concurrent adds produce exactly one cart line with the summed quantity
+  - concurrent removes of every unit leave no cart line behind
+  - mixed adds/removes end at the expected quantity
+
+Exits non-zero on any inconsistency. The synthetic cart lines are removed
+afterwards. Requires the unique (user_email, product_id) index
+(flask --app Kloudpython.app ensure-indexes).
+
+Usage:
+    python benchmarks/cart_concurrency_stress.py [--threads 16] [--ops 50] [--json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+from Kloudpython.db import get_cart_collection, ensure_indexes
+from Kloudpython.utils.cart_ops import add_cart_item, remove_cart_item
+
+
+def hammer(threads, ops, func):
+    """Run func ops times on each of threads threads; return elapsed seconds"""
+    def worker(_):
+        for _ in range(ops):
+            func()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(worker, range(threads)))
+    return time.perf_counter() - start
+
+
+def cart_lines(user_email, product_id):
+    return list(get_cart_collection().find({"user_email": user_email, "product_id": product_id}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--ops", type=int, default=50, help="operations per thread per phase")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    ensure_indexes()
+    user_email = f"stress-{uuid.uuid4().hex[:8]}@example.com"
+    product_id = ObjectId()
+    total = args.threads * args.ops
+    failures = []
+    timings = {}
+
+    try:
+        # Phase 1: concurrent adds
+        timings["add"] = hammer(args.threads, args.ops, lambda: add_cart_item(user_email, product_id))
+        lines = cart_lines(user_email, product_id)
+        if len(lines) != 1 or lines[0]["quantity"] != total:
+            failures.append(f"after adds: expected 1 line with quantity {total}, got {[l['quantity'] for l in lines]}")
+
+        # Phase 2: concurrent removes of every unit
+        timings["remove"] = hammer(args.threads, args.ops, lambda: remove_cart_item(user_email, product_id))
+        lines = cart_lines(user_email, product_id)
+        if lines:
+            failures.append(f"after removes: expected no line, got {[l['quantity'] for l in lines]}")
+
+        # Phase 3: adds and removes racing around a small quantity
+        add_cart_item(user_email, product_id, quantity=1)
+
+        def mixed():
+            add_cart_item(user_email, product_id)
+            remove_cart_item(user_email, product_id)
+
+        timings["mixed"] = hammer(args.threads, args.ops, mixed)
+        lines = cart_lines(user_email, product_id)
+        if len(lines) != 1 or lines[0]["quantity"] != 1:
+            failures.append(f"after mixed: expected 1 line with quantity 1, got {[l['quantity'] for l in lines]}")
+    finally:
+        get_cart_collection().delete_many({"user_email": user_email})
+
+    ops_per_phase = {"add": total, "remove": total, "mixed": total * 2}
+    report = {
+        "threads": args.threads,
+        "ops_per_thread": args.ops,
+        "ops_per_sec": {phase: round(ops_per_phase[phase] / seconds, 1) for phase, seconds in timings.items()},
+        "failures": failures
+    }
+    if args.json:
+        print(json.dumps(report))
+    else:
+        for phase, rate in report["ops_per_sec"].items():
+            print(f"  {phase:<7} {rate:>9.1f} ops/sec")
+        for failure in failures:
+            print(f"FAIL {failure}")
+        print("OK" if not failures else f"{len(failures)} check(s) failed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
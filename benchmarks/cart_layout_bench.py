@@ -0,0 +1,101 @@
+"""
+Cart storage layout benchmark: line documents vs embedded document
+
+For each layout, seeds --users carts of --lines products each against the
+MongoDB in MONGO_URI (use a non-production database: temporary products
+and carts are written and removed afterwards), then times per operation:
+  - add:         add one unit of a product already in the cart
+  - quantities:  read the product id -> quantity map (product grid)
+  - price:       join the cart to its products (cart / checkout)
+  - clear:       empty the cart (order confirmation)
+
+Usage:
+    python benchmarks/cart_layout_bench.py [--users 200] [--lines 10] [--json]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+from flask import Flask
+from Kloudpython.db import get_products_collection, get_cart_collection, get_carts_collection, ensure_indexes
+from Kloudpython.utils.cart_ops import CART_STORES
+
+
+def timed_ms(func, args_list):
+    """Run func for each args tuple; return per-call latencies in ms"""
+    latencies = []
+    for args in args_list:
+        start = time.perf_counter()
+        func(*args)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def summarize(latencies):
+    latencies = sorted(latencies)
+    return {
+        "mean_ms": round(statistics.mean(latencies), 3),
+        "p50_ms": round(latencies[len(latencies) // 2], 3),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--lines", type=int, default=10, help="products per cart")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    # Measure the steady state, without the line-document migration fallback
+    app = Flask(__name__)
+    app.config['CART_MIGRATION_FALLBACK'] = False
+    app.app_context().push()
+
+    ensure_indexes()
+    run_id = uuid.uuid4().hex[:8]
+    product_ids = [ObjectId() for _ in range(args.lines)]
+    get_products_collection().insert_many([
+        {"_id": product_id, "name": f"bench-{run_id}-{n}", "price": 10 + n, "category": "bench", "image_url": ""}
+        for n, product_id in enumerate(product_ids)
+    ])
+    users = [f"bench-{run_id}-{n}@example.com" for n in range(args.users)]
+
+    report = {"users": args.users, "lines": args.lines, "layouts": {}}
+    try:
+        for layout, store in CART_STORES.items():
+            for user_email in users:
+                for product_id in product_ids:
+                    store.add(user_email, product_id)
+
+            report["layouts"][layout] = {
+                "add": summarize(timed_ms(store.add, [(user_email, product_ids[0]) for user_email in users])),
+                "quantities": summarize(timed_ms(store.quantities, [(user_email,) for user_email in users])),
+                "price": summarize(timed_ms(store.price, [(user_email,) for user_email in users])),
+                "clear": summarize(timed_ms(store.clear, [(user_email,) for user_email in users]))
+            }
+    finally:
+        get_products_collection().delete_many({"_id": {"$in": product_ids}})
+        get_cart_collection().delete_many({"user_email": {"$in": users}})
+        get_carts_collection().delete_many({"_id": {"$in": users}})
+
+    if args.json:
+        print(json.dumps(report))
+        return
+
+    print(f"{args.users} carts x {args.lines} lines")
+    for layout, operations in report["layouts"].items():
+        print(f"{layout}:")
+        for operation, stats in operations.items():
+            print(f"  {operation:<11} mean {stats['mean_ms']:>8.3f} ms  p50 {stats['p50_ms']:>8.3f} ms  p95 {stats['p95_ms']:>8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,415 @@
+"""
+End-to-end HTTP load benchmark of the main shopping flows
+
+Boots create_app() in-process behind a threaded HTTP/1.1 server, with:
+  - MongoDB: mongomock in memory (--backend mongomock, the default) or the
+    mongod in MONGO_URI (--backend mongod; use a throwaway database, the
+    seeded data is not removed)
+  - SMTP: a local sink server that accepts and discards every message
+
+It seeds --products products and --users users, then runs one virtual
+user per --concurrency thread for --duration seconds. Each one loops over
+the shopping flow:
+    GET  /products                    (first page, random sort)
+    GET  /products?q=<term>           (search)
+    POST /add-to-cart/<id>            (x --cart-lines)
+    POST /increase-quantity/<id>
+    POST /decrease-quantity/<id>
+    GET  /cart
+    GET  /checkout
+    POST /confirm-order
+
+It reports requests/s and p50/p95/p99 latency per route as JSON, tagged
+with the current git commit, so runs can be compared across commits.
+mongomock numbers are only comparable with other mongomock runs: it is
+single-process Python and does not model server-side costs.
+
+Usage:
+    python benchmarks/http_load_bench.py [--backend mongomock|mongod] [--products 500]
+        [--users 50] [--concurrency 8] [--duration 20] [--receipts queued|inline]
+        [--output results.json] [--json]
+"""
+import argparse
+import asyncio
+import contextlib
+import http.client
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORDS = ["fresh", "organic", "apple", "banana", "mango", "rice", "flour", "milk", "bread",
+         "cheese", "coffee", "tea", "juice", "soap", "honey", "spicy", "sweet", "roasted"]
+CATEGORIES = ["Fruits", "Vegetables", "Dairy", "Bakery", "Snacks", "Beverages", "Staples", "Household"]
+SORTS = ["default", "newest", "price_asc", "price_desc"]
+
+
+def start_smtp_sink():
+    """Minimal SMTP server on 127.0.0.1 that accepts and drops every message"""
+    received = [0]
+    ready = threading.Event()
+    address = {}
+
+    async def handle(reader, writer):
+        writer.write(b"220 sink ESMTP\r\n")
+        in_data = False
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if in_data:
+                if line in (b".\r\n", b".\n"):
+                    in_data = False
+                    received[0] += 1
+                    writer.write(b"250 OK queued\r\n")
+                continue
+            verb = line[:4].upper()
+            if verb == b"EHLO":
+                writer.write(b"250-sink\r\n250 SIZE 52428800\r\n")
+            elif verb == b"DATA":
+                in_data = True
+                writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+            elif verb == b"QUIT":
+                writer.write(b"221 Bye\r\n")
+                await writer.drain()
+                break
+            else:
+                # HELO, MAIL, RCPT, RSET, NOOP
+                writer.write(b"250 OK\r\n")
+            await writer.drain()
+        writer.close()
+
+    def run():
+        loop = asyncio.new_event_loop()
+        server = loop.run_until_complete(asyncio.start_server(handle, "127.0.0.1", 0))
+        address["port"] = server.sockets[0].getsockname()[1]
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return address["port"], received
+
+
+def use_mongomock():
+    """
+    Point the app's MongoDB client at mongomock
+
+    mongomock lacks a few features the app uses; the gaps are bridged here:
+    $substrCP in the grid projection (full descriptions are returned
+    instead) and pymongo 4.9+ bulk operations (applied one by one, under a
+    lock standing in for the server's per-document atomicity, with write
+    errors reported like the server does).
+    $text is missing too; product search falls back to its in-process index.
+    """
+    try:
+        import mongomock
+    except ImportError:
+        raise SystemExit("--backend mongomock needs the mongomock package (pip install mongomock)")
+    from types import SimpleNamespace
+    from pymongo import InsertOne, UpdateOne, UpdateMany, DeleteOne, DeleteMany
+    from pymongo.errors import BulkWriteError, DuplicateKeyError
+    import Kloudpython.db as db_module
+    import Kloudpython.utils.catalog_cache as catalog_cache_module
+
+    db_module.MongoClient = mongomock.MongoClient
+    catalog_cache_module.PRODUCT_GRID_PROJECTION = dict(catalog_cache_module.PRODUCT_GRID_PROJECTION, description=1)
+
+    lock = threading.Lock()
+
+    def apply(collection, request):
+        if isinstance(request, InsertOne):
+            collection.insert_one(request._doc)
+        elif isinstance(request, UpdateMany):
+            return collection.update_many(request._filter, request._doc, upsert=request._upsert).upserted_id
+        elif isinstance(request, UpdateOne):
+            return collection.update_one(request._filter, request._doc, upsert=request._upsert).upserted_id
+        elif isinstance(request, DeleteMany):
+            collection.delete_many(request._filter)
+        elif isinstance(request, DeleteOne):
+            collection.delete_one(request._filter)
+
+    def bulk_write(collection, requests, ordered=True, **kwargs):
+        upserted = []
+        errors = []
+        with lock:
+            for index, request in enumerate(requests):
+                try:
+                    upserted_id = apply(collection, request)
+                except DuplicateKeyError as e:
+                    errors.append({"index": index, "code": 11000, "errmsg": str(e)})
+                    if ordered:
+                        break
+                    continue
+                if upserted_id is not None:
+                    upserted.append({"index": index, "_id": upserted_id})
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "upserted": upserted})
+        return SimpleNamespace(upserted_ids={upsert["index"]: upsert["_id"] for upsert in upserted})
+
+    mongomock.collection.Collection.bulk_write = bulk_write
+
+
+def boot_app(backend, receipts):
+    """
+    create_app() against the chosen MongoDB backend and a local SMTP sink
+
+    Args:
+        backend (str): "mongomock" or "mongod" (MONGO_URI)
+        receipts (str): "queued" (no worker runs) or "inline"
+
+    Returns:
+        tuple: (app, one-item list holding the count of emails received)
+    """
+    smtp_port, smtp_received = start_smtp_sink()
+    os.environ.update({
+        "MAIL_SERVER": "127.0.0.1",
+        "MAIL_PORT": str(smtp_port),
+        "MAIL_USE_TLS": "False",
+        "MAIL_USERNAME": "bench@example.com",
+        "MAIL_PASSWORD": "",
+        "RECEIPT_QUEUE_ENABLED": str(receipts == "queued"),
+        "CATALOG_CACHE_WARM": "False"
+    })
+    if backend == "mongomock":
+        os.environ["MONGO_URI"] = "mongodb://localhost/kloudcart"
+        os.environ["MONGO_ENSURE_INDEXES"] = "True"
+        use_mongomock()
+    elif not os.getenv("MONGO_URI"):
+        from dotenv import load_dotenv
+        load_dotenv(os.path.join(ROOT, ".env"))
+
+    from Kloudpython import create_app
+
+    # Keep startup messages out of the JSON report on stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        app = create_app()
+    return app, smtp_received
+
+
+def session_cookie(app, email):
+    """Signed Flask session cookie of a logged-in user"""
+    from flask.sessions import SecureCookieSessionInterface
+
+    return SecureCookieSessionInterface().get_signing_serializer(app).dumps({"user": email})
+
+
+def seed(products, users):
+    """Insert the synthetic catalog and users; return (product ids, emails)"""
+    from Kloudpython.db import get_products_collection, get_users_collection
+    from Kloudpython.utils.catalog_cache import bump_catalog_version
+
+    rng = random.Random(5)
+    now = datetime.utcnow()
+    documents = [{
+        "name": f"{rng.choice(WORDS)} {rng.choice(WORDS)} {n}",
+        "price": rng.randint(10, 500),
+        "category": rng.choice(CATEGORIES),
+        "description": " ".join(rng.choice(WORDS) for _ in range(12)),
+        "image_url": "/static/images/placeholder.svg",
+        "created_at": now - timedelta(minutes=n)
+    } for n in range(products)]
+    product_ids = get_products_collection().insert_many(documents).inserted_ids
+
+    run_id = os.urandom(3).hex()
+    emails = [f"load-{run_id}-{n}@example.com" for n in range(users)]
+    # Sessions are signed directly, so no password hashes are needed
+    get_users_collection().insert_many([{"name": f"Load User {n}", "email": email} for n, email in enumerate(emails)])
+    bump_catalog_version()
+    return [str(product_id) for product_id in product_ids], emails
+
+
+def start_server(app):
+    """Serve app on a free local port from a threaded HTTP/1.1 server"""
+    from werkzeug.serving import make_server, WSGIRequestHandler
+
+    class KeepAliveHandler(WSGIRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=KeepAliveHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class VirtualUser:
+    """One logged-in shopper with a keep-alive connection and a cookie"""
+
+    def __init__(self, port, session_cookie, product_ids, cart_lines, rng, record):
+        self.port = port
+        self.cookie = session_cookie
+        self.product_ids = product_ids
+        self.cart_lines = cart_lines
+        self.rng = rng
+        self.record = record
+        self.connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+
+    def request(self, route, method, path):
+        headers = {"Cookie": f"session={self.cookie}"}
+        if method == "POST":
+            headers["Content-Length"] = "0"
+        start = time.perf_counter()
+        try:
+            self.connection.request(method, path, headers=headers)
+            response = self.connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+            self.record(route, None, (time.perf_counter() - start) * 1000)
+            return
+        self.record(route, response.status, (time.perf_counter() - start) * 1000)
+        # Keep the session (flash messages live in it)
+        for header, value in response.getheaders():
+            if header.lower() == "set-cookie" and value.startswith("session="):
+                self.cookie = value.split(";", 1)[0][len("session="):]
+
+    def shop(self):
+        rng = self.rng
+        self.request("GET /products", "GET", f"/products?sort={rng.choice(SORTS)}")
+        self.request("GET /products?q", "GET", f"/products?q={rng.choice(WORDS)}")
+        picks = rng.sample(self.product_ids, min(self.cart_lines, len(self.product_ids)))
+        for product_id in picks:
+            self.request("POST /add-to-cart/<id>", "POST", f"/add-to-cart/{product_id}")
+        self.request("POST /increase-quantity/<id>", "POST", f"/increase-quantity/{picks[0]}")
+        self.request("POST /decrease-quantity/<id>", "POST", f"/decrease-quantity/{picks[0]}")
+        self.request("GET /cart", "GET", "/cart")
+        self.request("GET /checkout", "GET", "/checkout")
+        self.request("POST /confirm-order", "POST", "/confirm-order")
+
+
+def percentile(latencies, p):
+    return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 2)
+
+
+def summarize(latencies, errors, duration):
+    latencies = sorted(latencies)
+    if not latencies:
+        return {"requests": 0, "errors": errors, "rps": 0}
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / duration, 1),
+        "mean_ms": round(statistics.mean(latencies), 2),
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99)
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["mongomock", "mongod"], default="mongomock")
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=20, help="seconds of load")
+    parser.add_argument("--cart-lines", type=int, default=3, help="products added per flow")
+    parser.add_argument("--receipts", choices=["queued", "inline"], default="queued",
+                        help="queue receipt jobs (no worker runs) or render and email them in the request")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    app, smtp_received = boot_app(args.backend, args.receipts)
+    with app.app_context():
+        product_ids, emails = seed(args.products, args.users)
+
+    server = start_server(app)
+    port = server.server_port
+
+    results = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+
+    def record(route, status, latency_ms):
+        with lock:
+            if status is None or status >= 500:
+                errors[route] += 1
+            else:
+                results[route].append(latency_ms)
+
+    stop_at = [None]
+
+    def run_user(n):
+        rng = random.Random(args.seed * 1000 + n)
+        email = emails[n % len(emails)]
+        user = VirtualUser(port, session_cookie(app, email), product_ids, args.cart_lines, rng, record)
+        while time.monotonic() < stop_at[0]:
+            user.shop()
+        user.connection.close()
+
+    # Warm-up pass (template compilation, caches), not measured
+    stop_at[0] = time.monotonic()
+    warm = VirtualUser(port, session_cookie(app, emails[0]), product_ids, args.cart_lines, random.Random(0), lambda *a: None)
+    warm.shop()
+
+    stop_at[0] = time.monotonic() + args.duration
+    started = time.monotonic()
+    threads = [threading.Thread(target=run_user, args=(n,)) for n in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    server.shutdown()
+
+    all_latencies = [latency for latencies in results.values() for latency in latencies]
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "backend": args.backend,
+        "receipts": args.receipts,
+        "products": args.products,
+        "users": args.users,
+        "concurrency": args.concurrency,
+        "duration_s": round(elapsed, 2),
+        "emails_received": smtp_received[0],
+        "total": summarize(all_latencies, sum(errors.values()), elapsed),
+        "routes": {
+            route: summarize(results[route], errors[route], elapsed)
+            for route in sorted(set(results) | set(errors))
+        }
+    }
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+
+    if args.json:
+        print(json.dumps(report))
+        return
+
+    print(f"{args.backend}  {args.products} products  {args.concurrency} users  {elapsed:.1f}s  commit {report['commit']}")
+    for route, stats in list(report["routes"].items()) + [("TOTAL", report["total"])]:
+        if not stats["requests"]:
+            print(f"  {route:<30} no successful requests ({stats['errors']} errors)")
+            continue
+        print(f"  {route:<30} {stats['rps']:>8.1f} req/s  p50 {stats['p50_ms']:>8.2f}  p95 {stats['p95_ms']:>8.2f}"
+              f"  p99 {stats['p99_ms']:>8.2f} ms  errors {stats['errors']}")
+    if args.receipts == "inline":
+        print(f"  {smtp_received[0]} receipt emails delivered to the sink")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Product search benchmark over a synthetic catalog
+
+Builds synthetic catalogs of growing size (up to --products, 100k by
+default) and times search queries against them:
+  - memory: the in-process inverted index (ProductSearchIndex), build time
+            and query latency; needs no database
+  - text:   the product_text MongoDB text index, with --text; products are
+            written to a temporary collection in MONGO_URI's database
+            (use a non-production database) that is dropped afterwards
+
+Query kinds:
+  - brand:  a term matching ~100 products at every catalog size
+  - brand+category: the same, filtered to one category
+  - noun:   a term matching a fixed share (1/40) of the catalog
+
+Brand latency should stay flat as the catalog grows. Noun latency grows with
+the number of matches, which ranking has to look at.
+
+Usage:
+    python benchmarks/product_search_bench.py [--products 100000] [--queries 200] [--text] [--json]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Kloudpython.utils.product_search import ProductSearchIndex
+
+ADJECTIVES = ["fresh", "organic", "crunchy", "ripe", "frozen", "smoked", "spicy", "sweet", "salted", "roasted"]
+NOUNS = ["apple", "banana", "mango", "carrot", "tomato", "potato", "onion", "garlic", "ginger", "spinach",
+         "lentil", "rice", "flour", "sugar", "butter", "cheese", "paneer", "yogurt", "milk", "bread",
+         "biscuit", "cookie", "chips", "noodle", "pasta", "sauce", "pickle", "honey", "jam", "tea",
+         "coffee", "juice", "soda", "water", "soap", "shampoo", "detergent", "toothpaste", "tissue", "candle"]
+CATEGORIES = ["Fruits", "Vegetables", "Dairy", "Bakery", "Snacks", "Beverages", "Staples", "Household"]
+
+
+def synthetic_catalog(size, seed=7):
+    """size products with ~100 products per brand and 1/40 per noun"""
+    rng = random.Random(seed)
+    brands = [f"brand{n}" for n in range(max(1, size // 100))]
+    products = []
+    for n in range(size):
+        noun = NOUNS[n % len(NOUNS)]
+        products.append({
+            "id": str(n),
+            "name": f"{rng.choice(brands)} {rng.choice(ADJECTIVES)} {noun}",
+            "price": rng.randint(10, 500),
+            "category": rng.choice(CATEGORIES),
+            "description": f"{rng.choice(ADJECTIVES)} {noun} packed for daily use",
+            "image_url": ""
+        })
+    return products, brands
+
+
+def query_mix(brands, count, seed=11):
+    rng = random.Random(seed)
+    return {
+        "brand": [(rng.choice(brands), None) for _ in range(count)],
+        "brand+category": [(rng.choice(brands), rng.choice(CATEGORIES)) for _ in range(count)],
+        "noun": [(rng.choice(NOUNS), None) for _ in range(count)]
+    }
+
+
+def timed_ms(search, queries):
+    latencies = []
+    for q, category in queries:
+        start = time.perf_counter()
+        search(q, category)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def summarize(latencies):
+    latencies = sorted(latencies)
+    return {
+        "mean_ms": round(statistics.mean(latencies), 3),
+        "p50_ms": round(latencies[len(latencies) // 2], 3),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 3)
+    }
+
+
+def bench_memory(products, queries):
+    start = time.perf_counter()
+    index = ProductSearchIndex(products)
+    build_ms = (time.perf_counter() - start) * 1000
+    results = {"build_ms": round(build_ms, 1)}
+    for kind, kind_queries in queries.items():
+        results[kind] = summarize(timed_ms(lambda q, category: index.search(q, category, 0, 24), kind_queries))
+    return results
+
+
+def bench_text(products, queries):
+    from pymongo import InsertOne
+    from Kloudpython.db import db, INDEXES
+
+    collection = db.get_collection(f"bench_products_{uuid.uuid4().hex[:8]}")
+    try:
+        for start in range(0, len(products), 10000):
+            collection.bulk_write([
+                InsertOne({key: value for key, value in product.items() if key != "id"})
+                for product in products[start:start + 10000]
+            ], ordered=False)
+        text_index = [index for index in INDEXES["products"] if index.document["name"] == "product_text"]
+        start = time.perf_counter()
+        collection.create_indexes(text_index)
+        results = {"build_ms": round((time.perf_counter() - start) * 1000, 1)}
+
+        def search(q, category):
+            query = {"$text": {"$search": q}}
+            if category:
+                query["category"] = category
+            return list(collection.find(query, {"name": 1, "score": {"$meta": "textScore"}})
+                        .sort([("score", {"$meta": "textScore"}), ("_id", 1)]).limit(25))
+
+        for kind, kind_queries in queries.items():
+            results[kind] = summarize(timed_ms(search, kind_queries))
+        return results
+    finally:
+        collection.drop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=100000, help="largest catalog size")
+    parser.add_argument("--queries", type=int, default=200, help="queries per kind and size")
+    parser.add_argument("--text", action="store_true", help="also benchmark the MongoDB text index")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    sizes = sorted({size for size in (args.products // 100, args.products // 10, args.products) if size > 0})
+    report = {"queries": args.queries, "sizes": {}}
+    for size in sizes:
+        products, brands = synthetic_catalog(size)
+        queries = query_mix(brands, args.queries)
+        report["sizes"][size] = {"memory": bench_memory(products, queries)}
+        if args.text:
+            report["sizes"][size]["text"] = bench_text(products, queries)
+
+    if args.json:
+        print(json.dumps(report))
+        return
+
+    print(f"{args.queries} queries per kind")
+    for size, backends in report["sizes"].items():
+        for backend, results in backends.items():
+            print(f"{size:>7} products  {backend:<6} build {results['build_ms']:>9.1f} ms")
+            for kind, stats in results.items():
+                if kind == "build_ms":
+                    continue
+                print(f"    {kind:<15} mean {stats['mean_ms']:>8.3f} ms  p50 {stats['p50_ms']:>8.3f} ms  p95 {stats['p95_ms']:>8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Drive every route in QUERY_BUDGETS and fail if one goes over its budget
+
+Boots create_app() with QUERY_PROFILER_ENABLED and QUERY_BUDGET_STRICT
+against the mongod in MONGO_URI (use a throwaway database, the seeded data
+is not removed), seeds a small catalog, then walks one shopper and the
+admin through the budgeted routes in the order a real session would:
+    POST /register, POST /login
+    GET  /products                    (cold and warm catalog cache)
+    POST /add-to-cart/<id>            (x2)
+    POST /increase-quantity/<id>
+    POST /decrease-quantity/<id>      (last unit of a line)
+    GET  /cart, GET /checkout, POST /confirm-order
+    GET  /admin/dashboard, /admin/receipts, /admin/analytics
+
+It prints the MongoDB commands of each request next to the route's budget
+and exits with status 1 if any request went over it, if a budgeted route
+was not driven (add it to FLOW when adding a budget), or if a request used
+a filter missing from QUERY_SHAPES in Kloudpython/db.py (register it there
+so `flask check-query-plans` explains it).
+
+mongomock does not emit command monitoring events, so a real server is
+required.
+
+Usage:
+    MONGO_URI=mongodb://localhost/kloudcart_budgets python benchmarks/query_budget_check.py [--products 50] [--json]
+"""
+import argparse
+import contextlib
+import json
+import os
+import re
+import sys
+
+from http_load_bench import ROOT, boot_app, seed, git_commit
+
+ADMIN_EMAIL = "niteshyrai43@gmail.com"
+
+# (endpoint, method, path); "{p0}"/"{p1}" are product ids. Logged in as the
+# shopper until the first admin route.
+FLOW = [
+    ("auth.register", "POST", "/register"),
+    ("auth.login", "POST", "/login"),
+    ("products.list_products", "GET", "/products"),
+    ("products.add_to_cart", "POST", "/add-to-cart/{p0}"),
+    ("products.add_to_cart", "POST", "/add-to-cart/{p1}"),
+    ("products.increase_quantity", "POST", "/increase-quantity/{p0}"),
+    ("products.decrease_quantity", "POST", "/decrease-quantity/{p1}"),
+    ("products.list_products", "GET", "/products?sort=price_asc"),
+    ("products.cart", "GET", "/cart"),
+    ("products.checkout", "GET", "/checkout"),
+    ("products.confirm_order", "POST", "/confirm-order"),
+    ("admin.admin_dashboard", "GET", "/admin/dashboard"),
+    ("admin.admin_receipts", "GET", "/admin/receipts"),
+    ("admin.admin_analytics", "GET", "/admin/analytics")
+]
+
+_SERVER_TIMING = re.compile(r'desc="(\d+) commands"')
+
+
+def run_flow(app, product_ids, filters=None):
+    """
+    Issue FLOW against app with the profiler in strict mode
+
+    Args:
+        filters (dict): If given, filled with (collection, filter shape) ->
+            endpoints that issued it
+
+    Returns:
+        list: (endpoint, method, path, commands or None, error or None) per request
+    """
+    from flask import g, request
+    from Kloudpython.utils.query_profiler import QueryBudgetExceeded
+
+    if filters is not None:
+        # Runs before the profiler's own after_request pops the profile
+        @app.after_request
+        def collect_filters(response):
+            profile = g.get("query_profile")
+            if profile is not None:
+                for shape in profile.filters:
+                    filters.setdefault(shape, set()).add(request.endpoint)
+            return response
+
+    email = f"budget-{os.urandom(3).hex()}@example.com"
+    client = app.test_client()
+    results = []
+    for endpoint, method, path in FLOW:
+        path = path.format(p0=product_ids[0], p1=product_ids[1])
+        if endpoint.startswith("admin."):
+            with client.session_transaction() as session:
+                session["user"] = ADMIN_EMAIL
+        data = {"name": "Budget Check", "email": email, "password": "budget"} if endpoint.startswith("auth.") else None
+
+        try:
+            response = client.open(path, method=method, data=data)
+        except QueryBudgetExceeded as e:
+            results.append((endpoint, method, path, None, str(e)))
+            continue
+        match = _SERVER_TIMING.search(response.headers.get("Server-Timing", ""))
+        error = None if response.status_code < 500 else f"HTTP {response.status_code}"
+        results.append((endpoint, method, path, int(match.group(1)) if match else 0, error))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=50)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    if not os.getenv("MONGO_URI"):
+        from dotenv import load_dotenv
+        load_dotenv(os.path.join(ROOT, ".env"))
+    if not os.getenv("MONGO_URI"):
+        raise SystemExit("Set MONGO_URI to a throwaway database (mongomock does not report commands)")
+
+    os.environ.update({"QUERY_PROFILER_ENABLED": "True", "QUERY_BUDGET_STRICT": "True"})
+    app, _ = boot_app("mongod", "queued")
+    # Let QueryBudgetExceeded reach the client call instead of a 500 page
+    app.testing = True
+
+    from Kloudpython.db import QUERY_SHAPES
+    from Kloudpython.utils.query_profiler import QUERY_BUDGETS, value_shape
+
+    with app.app_context():
+        product_ids, _ = seed(args.products, 1)
+    filters = {}
+    with contextlib.redirect_stdout(sys.stderr):
+        results = run_flow(app, product_ids, filters)
+
+    failures = [result for result in results if result[4]]
+    missing = sorted(set(QUERY_BUDGETS) - {result[0] for result in results})
+    registered = {(collection, value_shape(query)) for collection, query, _ in QUERY_SHAPES}
+    unregistered = sorted(shape for shape in filters if shape not in registered)
+
+    if args.json:
+        print(json.dumps({
+            "commit": git_commit(),
+            "requests": [
+                {"endpoint": endpoint, "method": method, "path": path, "commands": commands,
+                 "budget": QUERY_BUDGETS.get(endpoint), "error": error}
+                for endpoint, method, path, commands, error in results
+            ],
+            "not_driven": missing,
+            "unregistered_filters": [
+                {"collection": collection, "filter": shape, "endpoints": sorted(filters[(collection, shape)])}
+                for collection, shape in unregistered
+            ]
+        }, indent=2))
+    else:
+        for endpoint, method, path, commands, error in results:
+            status = "FAIL" if error else "ok  "
+            used = "?" if commands is None else commands
+            print(f"{status} {endpoint:28} {used:>2}/{QUERY_BUDGETS.get(endpoint, '-')}  {method} {path}")
+            if error:
+                print(f"     {error}")
+        for endpoint in missing:
+            print(f"FAIL {endpoint:28} not driven (add it to FLOW)")
+        for collection, shape in unregistered:
+            print(f"FAIL {collection} {shape} not in QUERY_SHAPES ({', '.join(sorted(filters[(collection, shape)]))})")
+
+    if failures or missing or unregistered:
+        if not args.json:
+            print(f"{len(failures)} request(s) over budget or failed, {len(missing)} budgeted route(s) not driven, "
+                  f"{len(unregistered)} filter(s) missing from QUERY_SHAPES.")
+        sys.exit(1)
+    if not args.json:
+        print("Every budgeted route stays within its budget and uses registered query shapes.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Receipt rendering micro-benchmark
+
+Reports receipts/sec for:
+  - cold:   a new ReceiptRenderer per receipt (styles rebuilt every call)
+  - single: one precompiled renderer in this process
+  - pooled: ReceiptRenderer.render_many on a process pool
+
+Usage:
+    python benchmarks/receipt_render_bench.py [--count 200] [--items 5] [--processes N] [--json]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Kloudpython.utils.pdf_generator import ReceiptRenderer
+
+
+def sample_order(i, item_count):
+    items = [{
+        "name": f"Product {n}",
+        "category": "Groceries",
+        "quantity": n + 1,
+        "price": 49.5,
+        "subtotal": 49.5 * (n + 1)
+    } for n in range(item_count)]
+    return {
+        "order_id": f"BENCH{i:06d}",
+        "user_email": f"user{i}@example.com",
+        "items": items,
+        "total": sum(item["subtotal"] for item in items),
+        "current_date": "January 01, 2025 at 10:00 AM"
+    }
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=200, help="receipts per mode")
+    parser.add_argument("--items", type=int, default=5, help="line items per receipt")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="process pool size")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        jobs = [(sample_order(i, args.items), os.path.join(out_dir, f"r{i}.pdf")) for i in range(args.count)]
+        renderer = ReceiptRenderer()
+
+        # Start the pool before timing so worker start-up is not measured
+        renderer.render_many(jobs[:args.processes], processes=args.processes)
+
+        results = {
+            "cold": timed(lambda: [ReceiptRenderer().render(*job) for job in jobs]),
+            "single": timed(lambda: [renderer.render(*job) for job in jobs]),
+            "pooled": timed(lambda: renderer.render_many(jobs, processes=args.processes))
+        }
+        renderer.close()
+
+    report = {
+        "count": args.count,
+        "items": args.items,
+        "processes": args.processes,
+        "receipts_per_sec": {mode: round(args.count / seconds, 1) for mode, seconds in results.items()}
+    }
+    if args.json:
+        print(json.dumps(report))
+    else:
+        print(f"{args.count} receipts, {args.items} items each, {args.processes} processes")
+        for mode, rate in report["receipts_per_sec"].items():
+            print(f"  {mode:<7} {rate:>8.1f} receipts/sec")
+
+
+if __name__ == "__main__":
+    main()
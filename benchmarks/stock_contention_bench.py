@@ -0,0 +1,175 @@
+"""
+Checkout throughput and correctness on a single hot product
+
+Boots the app like http_load_bench.py (mongomock or the mongod in
+MONGO_URI, local SMTP sink) and seeds one product with --stock units.
+--concurrency shoppers then race for it over HTTP for --duration seconds,
+each looping: POST /add-to-cart/<hot> (x --quantity), POST /confirm-order.
+
+Reports confirmed checkouts/s, sold-out rejections/s and confirm-order
+latency, and checks the outcome: units sold (from the orders) must equal
+the stock taken, and never exceed --stock. Use a small --stock (e.g. 100)
+to watch the product sell out under contention, and a large one to
+measure steady-state throughput.
+
+Usage:
+    python benchmarks/stock_contention_bench.py [--backend mongomock|mongod] [--stock 1000]
+        [--concurrency 16] [--duration 10] [--quantity 1] [--output results.json] [--json]
+"""
+import argparse
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http_load_bench import boot_app, session_cookie, start_server, summarize, git_commit
+
+
+def seed_hot_product(stock, users):
+    """Insert the hot product and the shoppers; return (product id, emails)"""
+    from Kloudpython.db import get_products_collection, get_users_collection
+    from Kloudpython.utils.catalog_cache import bump_catalog_version
+
+    product_id = get_products_collection().insert_one({
+        "name": "Flash sale mangoes",
+        "price": 99,
+        "category": "Fruits",
+        "description": "One crate per customer",
+        "image_url": "/static/images/placeholder.svg",
+        "stock": stock,
+        "created_at": datetime.utcnow()
+    }).inserted_id
+
+    run_id = os.urandom(3).hex()
+    emails = [f"hot-{run_id}-{n}@example.com" for n in range(users)]
+    get_users_collection().insert_many([{"name": f"Shopper {n}", "email": email} for n, email in enumerate(emails)])
+    bump_catalog_version()
+    return product_id, emails
+
+
+def units_sold(product_id):
+    """Units of the product in placed orders"""
+    from Kloudpython.db import get_orders_collection
+
+    sold = 0
+    for order in get_orders_collection().find({"items.product_id": str(product_id)}, {"items": 1}):
+        sold += sum(item["quantity"] for item in order["items"] if item["product_id"] == str(product_id))
+    return sold
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["mongomock", "mongod"], default="mongomock")
+    parser.add_argument("--stock", type=int, default=1000, help="units of the hot product")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent shoppers")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of load")
+    parser.add_argument("--quantity", type=int, default=1, help="units per checkout")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    app, _ = boot_app(args.backend, "queued")
+    with app.app_context():
+        product_id, emails = seed_hot_product(args.stock, args.concurrency)
+    server = start_server(app)
+    port = server.server_port
+
+    confirmed = []
+    rejected = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.duration
+
+    def shopper(email):
+        cookie = session_cookie(app, email)
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        local_confirmed, local_rejected, failed = [], [], 0
+
+        def post(path):
+            connection.request("POST", path, headers={"Cookie": f"session={cookie}", "Content-Length": "0"})
+            response = connection.getresponse()
+            response.read()
+            return response
+
+        while time.monotonic() < deadline:
+            try:
+                for _ in range(args.quantity):
+                    post(f"/add-to-cart/{product_id}")
+                start = time.perf_counter()
+                response = post("/confirm-order")
+                latency_ms = (time.perf_counter() - start) * 1000
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                connection.close()
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+                continue
+            if response.status == 200:
+                local_confirmed.append(latency_ms)
+            elif response.status == 302:
+                # Sold out: sent back to the cart, which still holds the product
+                local_rejected.append(latency_ms)
+                post(f"/decrease-quantity/{product_id}")
+            else:
+                failed += 1
+        connection.close()
+        with lock:
+            confirmed.extend(local_confirmed)
+            rejected.extend(local_rejected)
+            errors[0] += failed
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=shopper, args=(email,)) for email in emails]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    server.shutdown()
+
+    from Kloudpython.db import get_products_collection
+    with app.app_context():
+        remaining = get_products_collection().find_one({"_id": product_id}, {"stock": 1})["stock"]
+        sold = units_sold(product_id)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "backend": args.backend,
+        "stock": args.stock,
+        "quantity": args.quantity,
+        "concurrency": args.concurrency,
+        "duration_s": round(elapsed, 2),
+        "checkouts": summarize(confirmed, errors[0], elapsed),
+        "sold_out_rejections": summarize(rejected, 0, elapsed),
+        "units_sold": sold,
+        "stock_remaining": remaining,
+        # Every unit taken from stock belongs to exactly one order
+        "consistent": remaining >= 0 and sold + remaining == args.stock
+    }
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+
+    if args.json:
+        print(json.dumps(report))
+        return
+
+    print(f"{args.backend}  stock {args.stock}  {args.concurrency} shoppers  {elapsed:.1f}s  commit {report['commit']}")
+    for label, stats in (("checkouts", report["checkouts"]), ("sold out", report["sold_out_rejections"])):
+        if not stats["requests"]:
+            print(f"  {label:<10} none")
+            continue
+        print(f"  {label:<10} {stats['rps']:>8.1f} /s  p50 {stats['p50_ms']:>8.2f}  p95 {stats['p95_ms']:>8.2f}"
+              f"  p99 {stats['p99_ms']:>8.2f} ms")
+    print(f"  {sold} units sold, {remaining} left, errors {errors[0]}: "
+          f"{'consistent' if report['consistent'] else 'INCONSISTENT (oversold or lost stock)'}")
+
+
+if __name__ == "__main__":
+    main()
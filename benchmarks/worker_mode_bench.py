@@ -0,0 +1,235 @@
+"""
+Concurrent-request throughput: sync gunicorn workers vs gevent workers
+
+Starts the app under gunicorn once per mode on a local port, drives it
+with --concurrency keep-alive clients for --duration seconds, and reports
+requests/s and latency percentiles:
+  - sync:   the Dockerfile setup (--workers sync workers)
+  - gevent: gunicorn_gevent.conf.py (--workers gevent workers)
+
+The app uses MONGO_URI from the environment / .env (use a non-production
+database). By default the catalog cache is disabled (CATALOG_CACHE_MAX_AGE=0,
+CATALOG_VERSION_CHECK_INTERVAL=0) so every /products request waits on
+MongoDB; pass --cache to measure the cached path instead.
+
+--mongo-latency-ms N puts a TCP proxy adding N ms per round trip in front
+of a mongodb:// (non-SRV) MONGO_URI, to emulate a remote Atlas cluster
+when benchmarking against a local mongod.
+
+Usage:
+    python benchmarks/worker_mode_bench.py [--path /products] [--concurrency 50]
+        [--duration 10] [--workers 3] [--mongo-latency-ms 20] [--cache] [--json]
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from dotenv import load_dotenv
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_latency_proxy(target_host, target_port, latency_ms):
+    """Forward 127.0.0.1:<port> to the target, delaying each chunk by half the latency"""
+    delay = latency_ms / 2000
+    port = free_port()
+    ready = threading.Event()
+
+    async def pipe(reader, writer):
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                await asyncio.sleep(delay)
+                writer.write(data)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle(client_reader, client_writer):
+        try:
+            server_reader, server_writer = await asyncio.open_connection(target_host, target_port)
+        except OSError:
+            client_writer.close()
+            return
+        await asyncio.gather(pipe(client_reader, server_writer), pipe(server_reader, client_writer))
+
+    def run():
+        loop = asyncio.new_event_loop()
+        server = loop.run_until_complete(asyncio.start_server(handle, "127.0.0.1", port))
+        ready.set()
+        with server:
+            loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return port
+
+
+def proxied_uri(mongo_uri, latency_ms):
+    """Point a single-host mongodb:// URI at a latency proxy"""
+    parts = urlsplit(mongo_uri)
+    if parts.scheme != "mongodb" or "," in parts.netloc:
+        raise SystemExit("--mongo-latency-ms needs a single-host mongodb:// MONGO_URI")
+    credentials, _, hostport = parts.netloc.rpartition("@")
+    host, _, port = hostport.partition(":")
+    proxy_port = start_latency_proxy(host, int(port or 27017), latency_ms)
+    netloc = f"{credentials}@127.0.0.1:{proxy_port}" if credentials else f"127.0.0.1:{proxy_port}"
+    query = "&".join(filter(None, [parts.query, "directConnection=true"]))
+    return urlunsplit((parts.scheme, netloc, parts.path or "/", query, ""))
+
+
+def start_server(mode, port, workers, env):
+    bind = f"127.0.0.1:{port}"
+    if mode == "sync":
+        command = ["gunicorn", "--bind", bind, "--workers", str(workers), "--timeout", "120", "Kloudpython.app:app"]
+    else:
+        command = ["gunicorn", "-c", "gunicorn_gevent.conf.py", "--bind", bind, "--workers", str(workers),
+                   "--access-logfile", "/dev/null", "Kloudpython.app:app"]
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"{mode} server exited:\n{process.stderr.read().decode()[-2000:]}")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            connection.request("GET", "/healthz")
+            if connection.getresponse().status == 200:
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise SystemExit(f"{mode} server did not start within 60s")
+
+
+def drive(port, path, concurrency, duration):
+    """Run keep-alive clients until the deadline; return latencies (ms) and error count"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client():
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        local = []
+        failed = 0
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                connection.request("GET", path)
+                response = connection.getresponse()
+                response.read()
+                if response.status >= 500:
+                    failed += 1
+                else:
+                    local.append((time.perf_counter() - start) * 1000)
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                connection.close()
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        connection.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0]
+
+
+def summarize(latencies, errors, duration):
+    latencies = sorted(latencies)
+    if not latencies:
+        return {"requests": 0, "errors": errors, "rps": 0}
+
+    def percentile(p):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 2)
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / duration, 1),
+        "mean_ms": round(statistics.mean(latencies), 2),
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default="/products")
+    parser.add_argument("--concurrency", type=int, default=50, help="concurrent keep-alive clients")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per mode")
+    parser.add_argument("--workers", type=int, default=3, help="gunicorn workers in both modes")
+    parser.add_argument("--modes", default="sync,gevent")
+    parser.add_argument("--mongo-latency-ms", type=float, default=0)
+    parser.add_argument("--cache", action="store_true", help="keep the catalog cache enabled")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    load_dotenv(os.path.join(ROOT, ".env"))
+    env = dict(os.environ, CATALOG_CACHE_WARM="False", MONGO_ENSURE_INDEXES="False")
+    if not args.cache:
+        env.update(CATALOG_CACHE_MAX_AGE="0", CATALOG_VERSION_CHECK_INTERVAL="0")
+    if args.mongo_latency_ms:
+        env["MONGO_URI"] = proxied_uri(env.get("MONGO_URI", ""), args.mongo_latency_ms)
+
+    report = {
+        "path": args.path,
+        "concurrency": args.concurrency,
+        "duration_s": args.duration,
+        "workers": args.workers,
+        "mongo_latency_ms": args.mongo_latency_ms,
+        "modes": {}
+    }
+    for mode in args.modes.split(","):
+        port = free_port()
+        process = start_server(mode, port, args.workers, env)
+        try:
+            drive(port, args.path, min(args.concurrency, 4), 1)  # warm up connections and imports
+            latencies, errors = drive(port, args.path, args.concurrency, args.duration)
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+        report["modes"][mode] = summarize(latencies, errors, args.duration)
+
+    if args.json:
+        print(json.dumps(report))
+        return
+
+    print(f"GET {args.path}  {args.concurrency} clients  {args.duration:g}s  {args.workers} workers"
+          f"  +{args.mongo_latency_ms:g} ms MongoDB latency")
+    for mode, stats in report["modes"].items():
+        if not stats["requests"]:
+            print(f"  {mode:<7} no successful requests ({stats['errors']} errors)")
+            continue
+        print(f"  {mode:<7} {stats['rps']:>8.1f} req/s  p50 {stats['p50_ms']:>8.2f} ms  p95 {stats['p95_ms']:>8.2f} ms"
+              f"  p99 {stats['p99_ms']:>8.2f} ms  errors {stats['errors']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+"""
+Gunicorn profile for sync workers (the Dockerfile default)
+
+Worker count, bind address and timeouts are given on the command line;
+this file adds the metrics directory hooks (see gunicorn_hooks.py).
+
+Usage:
+    gunicorn -c gunicorn.conf.py Kloudpython.app:app
+"""
+import os
+import sys
+
+# Config files are loaded by path: make gunicorn_hooks.py next to them importable
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from gunicorn_hooks import use_multiprocess_metrics, on_starting, child_exit  # noqa: E402,F401
+
+use_multiprocess_metrics()
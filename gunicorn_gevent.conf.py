@@ -0,0 +1,49 @@
+"""
+Gunicorn profile for cooperative (gevent) workers
+
+Each worker serves up to GUNICORN_WORKER_CONNECTIONS requests concurrently,
+switching between them while they wait on MongoDB or SMTP, instead of one
+request per sync worker. Size MONGO_MAX_POOL_SIZE to the concurrency you
+expect per worker.
+
+Usage:
+    gunicorn -c gunicorn_gevent.conf.py Kloudpython.app:app
+or, with Docker:
+    docker compose -f docker-compose.yml -f docker-compose.gevent.yml up -d --build
+"""
+import os
+import sys
+
+# Config files are loaded by path: make gunicorn_hooks.py next to them importable
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Metrics directory hooks shared with the default profile
+from gunicorn_hooks import use_multiprocess_metrics, on_starting, child_exit  # noqa: E402,F401
+
+use_multiprocess_metrics()
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("GUNICORN_WORKERS", 3))
+worker_class = "gevent"
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 100))
+timeout = 120
+accesslog = "-"
+errorlog = "-"
+
+# The app must be imported in each worker after gevent has patched the
+# standard library; preloading it in the master would import pymongo and
+# create the app's locks unpatched.
+preload_app = False
+
+
+def post_worker_init(worker):
+    """Refuse to serve from a worker that would block on MongoDB or SMTP"""
+    from Kloudpython.utils.cooperative import cooperative_problems
+
+    problems = cooperative_problems()
+    if problems:
+        for problem in problems:
+            worker.log.error(f"gevent worker is not cooperative: {problem}")
+        # Exit code 3 (worker boot error) makes the master shut down
+        sys.exit(3)
+    worker.log.info("gevent worker verified: socket, ssl and app locks are cooperative")
@@ -0,0 +1,35 @@
+"""
+Gunicorn server hooks shared by every worker profile
+
+Imported by gunicorn.conf.py and gunicorn_gevent.conf.py. Gunicorn workers
+share their Prometheus metrics through files in PROMETHEUS_MULTIPROC_DIR
+and /metrics sums them. The variable is set here, when gunicorn loads its
+config, so flask CLI commands and the job worker running from the same
+image keep the in-process registry. The master empties the directory at
+startup, so samples of a previous run are not counted again, and marks
+workers that exit as dead.
+"""
+import os
+import shutil
+
+DEFAULT_METRICS_DIR = "/tmp/prometheus"
+
+
+def use_multiprocess_metrics():
+    """Put the master and the workers it forks in Prometheus multiprocess mode"""
+    os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", DEFAULT_METRICS_DIR)
+
+
+def on_starting(server):
+    """Start with an empty metrics directory"""
+    metrics_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        os.makedirs(metrics_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    """Drop the live-process samples of a worker that exited"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)